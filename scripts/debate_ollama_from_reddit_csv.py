@@ -2,6 +2,7 @@
 Safe-to_ignore warnings from Tensorflow: https://github.com/tensorflow/tensorflow/issues/62075
 """
 
+import asyncio
 import json
 import os
 import sys
@@ -15,12 +16,12 @@ from hydra.utils import instantiate
 from natsort import natsorted
 from omegaconf import OmegaConf
 
-from llm_mediator_simulation.models.gpt_models import GPTModel
+from llm_mediator_simulation.models.gpt_models import AsyncGPTModel
 from llm_mediator_simulation.models.hf_local_server_model import (
-    HFLocalServerModel,
+    AsyncHFLocalServerModel,
 )
-from llm_mediator_simulation.simulation.debate.handler import DebateHandler
-from llm_mediator_simulation.visualization.transcript import debate_transcript
+from llm_mediator_simulation.simulation.experiment.config import DebateJob
+from llm_mediator_simulation.simulation.experiment.runner import ExperimentRunner
 
 PORT = 8000
 
@@ -68,7 +69,7 @@ def main(config):
     # + Combined
 
     gpt_key = os.getenv("GPT_API_KEY") or ""
-    mediator_model = GPTModel(api_key=gpt_key, model_name="gpt-4o")
+    mediator_model = AsyncGPTModel(api_key=gpt_key, model_name="gpt-4o")
 
     # OlMo2 post-trained (SFT, DPO, and Instruct) were fine-tuned with safety filters so let's stay with the pretrained model
 
@@ -77,7 +78,7 @@ def main(config):
     else:
         stop_strings = None
 
-    debater_model = HFLocalServerModel(
+    debater_model = AsyncHFLocalServerModel(
         port=PORT,
         max_new_tokens=config.max_new_tokens,
         debug=True,
@@ -85,8 +86,6 @@ def main(config):
         stop_strings=stop_strings,  # ["\n-", "\n -"],
     )
 
-    debaters = []
-
     # The conversation summary handler (keep track of the general history and of the n latest messages)
     summary_config = instantiate(config.summary_config)
 
@@ -103,6 +102,8 @@ def main(config):
     else:
         few_shot_samples = None
 
+    jobs: list[DebateJob] = []
+
     for truncated_chat_path in natsorted(os.listdir(conversations_path)):
         assert truncated_chat_path.endswith(".csv")
         submission_id = truncated_chat_path.split("-")[0].split("_")[1]
@@ -120,66 +121,46 @@ def main(config):
         # The debate configuration (which topic to discuss, and customisable instructions)
         debate_config = instantiate(config.debate_config, statement=statement)
 
-        mediator_config = None  # MediatorConfig()
-
-        metrics = None
-
-        # The debate runner
-        debate = DebateHandler(
-            debater_model=debater_model,
-            mediator_model=mediator_model,
-            debaters=debaters,
-            config=debate_config,
-            summary_config=summary_config,
-            metrics_handler=metrics,
-            mediator_config=mediator_config,
-            seed=seed,
-            json_debater_reponse=config.json_debater_reponse,
-            few_shot_samples=few_shot_samples,
-        )
-
-        debate.preload_csv_chat(
-            f"data/reddit/cmv/{split}/{truncated_chat_path}",
-            app="reddit",
-            truncated_num=2,
-            load_debater_profiles=config.load_debater_profiles,
-            debater_profiles_path="data/reddit/cmv/reddit_user_profiles.json",
-            prune_debaters=config.prune_debaters,
+        jobs.append(
+            DebateJob.from_csv(
+                f"sub_{submission_id}-comment_{comment_id}",
+                f"data/reddit/cmv/{split}/{truncated_chat_path}",
+                debate_config,
+                app="reddit",
+                truncated_num=2,
+                load_debater_profiles=config.load_debater_profiles,
+                debater_profiles_path="data/reddit/cmv/reddit_user_profiles.json",
+                prune_debaters=config.prune_debaters,
+            )
         )
 
-        debate.run(rounds=1)
-
-        data = debate.to_debate_pickle()
-        transcript = debate_transcript(data)
-        print(transcript)
-
-        output_path = HydraConfig.get().runtime.output_dir
-
-        # save the debate to a file
-        debate_path = os.path.join(output_path, "debates")
-
-        if not os.path.exists(debate_path):
-            os.makedirs(debate_path)
-
-        debate_file = os.path.join(
-            debate_path,
-            f"sub_{submission_id}-comment_{comment_id}",
-        )
-
-        debate.pickle(debate_file)
-
-        # save the transcript to a file
-        transcript_path = os.path.join(output_path, "transcripts")
-        if not os.path.exists(transcript_path):
-            os.makedirs(transcript_path)
-
-        transcript_file = os.path.join(
-            transcript_path,
-            f"sub_{submission_id}-comment_{comment_id}.txt",
-        )
+    mediator_config = None  # MediatorConfig()
+
+    metrics = None
+
+    # Every launch writes to a new timestamped directory: the manifest of the finished conversations
+    # is kept in the parent directory, shared by the launches with the same configuration,
+    # so that a restarted sweep skips them
+    output_dir = HydraConfig.get().runtime.output_dir
+    manifest_path = os.path.join(os.path.dirname(output_dir), "manifest.json")
+
+    # The experiment runner: advances all conversations together, and batches their model calls.
+    # Debates and transcripts are saved to the output directory as soon as each one is finished.
+    runner = ExperimentRunner(
+        debater_model=debater_model,
+        mediator_model=mediator_model,
+        summary_config=summary_config,
+        metrics_handler=metrics,
+        mediator_config=mediator_config,
+        seed=seed,
+        json_debater_reponse=config.json_debater_reponse,
+        few_shot_samples=few_shot_samples,
+        max_in_flight=config.max_in_flight,
+        output_dir=output_dir,
+        manifest_path=manifest_path,
+    )
 
-        with open(transcript_file, "w", encoding="utf-8") as f:
-            f.write(transcript)
+    asyncio.run(runner.run(jobs, rounds=1))
 
 
 if __name__ == "__main__":
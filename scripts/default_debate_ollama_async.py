@@ -24,7 +24,10 @@ gpt_key = os.getenv("GPT_API_KEY") or ""
 mediator_model = AsyncGPTModel(api_key=gpt_key, model_name="gpt-4o")
 
 PARALLEL_DEBATES = 3
-debater_model = AsyncOllamaLocalModel(model_name="mistral-nemo")
+# Keep at most as many requests in flight as the server processes in parallel (OLLAMA_NUM_PARALLEL)
+debater_model = AsyncOllamaLocalModel(
+    model_name="mistral-nemo", max_concurrency=4, keep_alive="1h", num_predict=300
+)
 
 # The conversation summary handler (keep track of the general history and of the n latest messages)
 summary_config = SummaryConfig(latest_messages_limit=3, debaters=debaters, ignore=True)
@@ -53,6 +56,7 @@ debate = AsyncDebateHandler(
 
 # debate.run(rounds=10)
 asyncio.run(debate.run(rounds=2))
+print(debater_model.stats())  # Ollama call latencies
 
 name_timestamp = time.strftime("%Y%m%d-%H%M%S")
 output_path = "debates_sandbox"
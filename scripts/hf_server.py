@@ -42,9 +42,31 @@ python examples/example_server.py call -p "Hello, how are you ?"
 ```bash
 python examples/example_server.py call -f prompt.txt
 ```
+
+## Batching
+
+Concurrent requests are queued and micro-batched into shared `generate` calls
+(see the `--max_batch_size` and `--max_wait` options).
+Several prompts can also be sent at once to the `/call_batch` endpoint, and `/stats` reports
+the queue depth, batch sizes and generation throughput:
+
+```bash
+curl -X POST localhost:8000/call_batch -H "Content-Type: application/json" -d '{"texts": ["Hello", "Hi"], "seed": 42}'
+curl localhost:8000/stats
+```
+
+## Assisted generation
+
+A small draft model, ideally sharing the tokenizer of the main model, speeds up decoding
+(`--draft_model_name`). Assistance only applies to requests generated alone (batches of one):
+keep `--max_batch_size` low to favor it. `/stats` reports the draft acceptance rate.
+
+```bash
+python -m scripts.hf_server server -m allenai/OLMo-2-1124-13B-Instruct -d allenai/OLMo-2-0425-1B-Instruct
+```
 """
 
-from typing import Literal
+from typing import Any, Literal
 
 import click
 import httpx
@@ -144,36 +166,18 @@ def main():
 ###################################################################################################
 
 
-@click.command("server")
-@click.option(
-    "--model_name",
-    "-m",
-    default="/mnt/datastore/models/mistralai/Mistral-7B-Instruct-v0.2",
-    help="The model name to load.",
-)
-@click.option(
-    "--quantization",
-    "-q",
-    default=None,
-    help="The quantization to use.",
-)
-def server(
-    model_name: str = "/mnt/datastore/models/mistralai/Mistral-7B-Instruct-v0.2",
-    quantization: Literal["4_bits"] | None = None,
-):
-    """Start a Flask server to keep the LLM loaded"""
-    from llm_mediator_simulation.models.hf_local_model import HFLocalModel
+def create_app(model: Any, max_batch_size: int = 8, max_wait: float = 0.05) -> Any:
+    """Create the Flask app serving a loaded model.
 
-    # Load the model
+    Requests are handled concurrently: they are queued into a coalescer whose worker
+    micro-batches them into shared `generate` calls."""
+    from flask import Flask, jsonify, request
 
-    model = HFLocalModel(
-        model_name=model_name,
-        max_new_tokens=200,
-        json=True,
-        quantization=quantization,
-        # torch_dtype=torch.float16,  # Potentially for large models (like Olmo2 32B)
+    from llm_mediator_simulation.models.coalescing_model import CoalescingHFLocalModel
+
+    coalescer = CoalescingHFLocalModel(
+        model=model, max_batch_size=max_batch_size, max_wait=max_wait
     )
-    from flask import Flask, request
 
     app = Flask("LLM Server")
 
@@ -187,7 +191,40 @@ def server(
         text = data.pop("text")
         seed = data.pop("seed")
 
-        return model.sample(text, seed=seed, **data)
+        return coalescer.sample(text, seed=seed, **data)
+
+    @app.route("/call_batch", methods=["POST"])
+    def call_batch():  # type: ignore
+        """Generate texts for a list of prompts sharing the same parameters"""
+        data = request.get_json()
+        texts = data.pop("texts")
+        seed = data.pop("seed", None)
+
+        futures = [coalescer.submit(text, seed=seed, **data) for text in texts]
+
+        return jsonify([future.result() for future in futures])
+
+    @app.route("/stats", methods=["GET"])
+    def stats():  # type: ignore
+        """Return the queue depth, batch sizes and generation throughput"""
+        coalescer_stats = coalescer.stats()
+
+        return jsonify(
+            {
+                "queue_depth": coalescer.queue_depth,
+                "requests": coalescer_stats.requests,
+                "batches": coalescer_stats.batches,
+                "mean_batch_size": coalescer_stats.mean_batch_size,
+                "batch_sizes": dict(coalescer_stats.batch_sizes),
+                "generated_tokens": getattr(model, "generated_tokens", 0),
+                "tokens_per_second": getattr(model, "tokens_per_second", 0.0),
+                "assisted_decoding": (
+                    model.assisted_stats.summary()
+                    if getattr(model, "draft_model", None) is not None
+                    else None
+                ),
+            }
+        )
 
     @app.route("/model_name", methods=["GET"])
     def model_name() -> str:  # type: ignore
@@ -207,7 +244,62 @@ def server(
 
         os._exit(0)
 
-    app.run(port=PORT)
+    return app
+
+
+@click.command("server")
+@click.option(
+    "--model_name",
+    "-m",
+    default="/mnt/datastore/models/mistralai/Mistral-7B-Instruct-v0.2",
+    help="The model name to load.",
+)
+@click.option(
+    "--quantization",
+    "-q",
+    default=None,
+    help="The quantization to use.",
+)
+@click.option(
+    "--max_batch_size",
+    default=8,
+    help="The maximum number of queued requests batched into one generation.",
+)
+@click.option(
+    "--max_wait",
+    default=0.05,
+    help="The maximum time (in seconds) a request waits for others to join its batch.",
+)
+@click.option(
+    "--draft_model_name",
+    "-d",
+    default=None,
+    help="A small model drafting tokens for the main model (assisted generation).",
+)
+def server(
+    model_name: str = "/mnt/datastore/models/mistralai/Mistral-7B-Instruct-v0.2",
+    quantization: Literal["4_bits"] | None = None,
+    max_batch_size: int = 8,
+    max_wait: float = 0.05,
+    draft_model_name: str | None = None,
+):
+    """Start a Flask server to keep the LLM loaded"""
+    from llm_mediator_simulation.models.hf_local_model import HFLocalModel
+
+    # Load the model
+
+    model = HFLocalModel(
+        model_name=model_name,
+        max_new_tokens=200,
+        json=True,
+        quantization=quantization,
+        draft_model_name=draft_model_name,
+        # torch_dtype=torch.float16,  # Potentially for large models (like Olmo2 32B)
+    )
+
+    app = create_app(model, max_batch_size=max_batch_size, max_wait=max_wait)
+    # One thread per request, so that concurrent requests can be batched together
+    app.run(port=PORT, threaded=True)
 
 
 main.add_command(start)
@@ -1,15 +1,19 @@
 """Async handler class to compute metrics for given input texts."""
 
 from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING
 
 from llm_mediator_simulation.metrics.criteria import (
     ArgumentQuality,
     async_measure_argument_qualities,
 )
-from llm_mediator_simulation.metrics.perspective_api import PerspectiveScorer
 from llm_mediator_simulation.models.language_model import AsyncLanguageModel
 from llm_mediator_simulation.utils.types import Intervention, Metrics
 
+if TYPE_CHECKING:
+    # The Perspective API client is only needed when a scorer is given
+    from llm_mediator_simulation.metrics.perspective_api import PerspectiveScorer
+
 
 class AsyncMetricsHandler:
     """Handler class to compute metrics for given input texts asynchronously."""
@@ -17,7 +21,7 @@ class AsyncMetricsHandler:
     def __init__(
         self,
         *,
-        perspective: PerspectiveScorer | None = None,
+        perspective: "PerspectiveScorer | None" = None,
         model: AsyncLanguageModel | None = None,
         argument_qualities: list[ArgumentQuality] | None = None,
     ) -> None:
@@ -5,11 +5,13 @@
 """
 
 from enum import Enum
+from typing import cast
 
 from llm_mediator_simulation.models.language_model import (
     AsyncLanguageModel,
     LanguageModel,
 )
+from llm_mediator_simulation.models.routed_model import tag_purpose
 from llm_mediator_simulation.utils.decorators import benchmark, retry
 from llm_mediator_simulation.utils.json import (
     json_prompt,
@@ -72,6 +74,7 @@ class ArgumentQuality(Enum):
 
 @retry(attempts=5, verbose=True)
 @benchmark(name="Argument Qualities", verbose=False)
+@tag_purpose("argument_quality")
 def measure_argument_qualities(
     model: LanguageModel,
     text: str,
@@ -107,6 +110,61 @@ def measure_argument_qualities(
     return parsed_response
 
 
+@tag_purpose("argument_quality")
+def measure_argument_qualities_many(
+    model: LanguageModel,
+    texts: list[str],
+    argument_qualities: list[ArgumentQuality],
+    seed: int | None = None,
+    attempts: int = 5,
+) -> list[dict[ArgumentQuality, Agreement]]:
+    """Measure the argument quality of independent texts based on the given criteria,
+    with concurrent model calls. Only the responses that fail to parse are sampled again.
+    """
+
+    if len(argument_qualities) == 0:
+        return [{} for _ in texts]
+
+    json_format: dict[str, str] = {}
+
+    for quality in argument_qualities:
+        json_format[quality.name] = quality.value[1]
+
+    prompts = [f"""{text}
+
+    Judge the text above based on the following qualities:
+
+    {json_prompt(json_format)}
+
+    Each JSON value should be on a scale from 0 to 4, where: {", ".join(scale_description())}
+    """ for text in texts]
+
+    results: list[dict[ArgumentQuality, Agreement] | None] = [None] * len(texts)
+    pending = list(range(len(texts)))
+
+    for _ in range(attempts):
+        responses = model.sample_many([prompts[i] for i in pending], seed)
+        failed: list[int] = []
+
+        for i, response in zip(pending, responses):
+            try:
+                results[i] = {
+                    ArgumentQuality[key]: Agreement(value)
+                    for key, value in parse_llm_json(response).items()
+                }
+            except (ValueError, KeyError):
+                failed.append(i)
+
+        pending = failed
+        if not pending:
+            return cast(list[dict[ArgumentQuality, Agreement]], results)
+
+    raise RuntimeError(
+        f"Argument quality measurement failed {attempts} times for {len(pending)} texts."
+    )
+
+
+@tag_purpose("argument_quality")
 async def async_measure_argument_qualities(
     model: AsyncLanguageModel,
     texts: list[str],
@@ -1,13 +1,21 @@
 """Handler class to compute metrics for given input texts."""
 
+import contextvars
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import TYPE_CHECKING
+
 from llm_mediator_simulation.metrics.criteria import (
     ArgumentQuality,
     measure_argument_qualities,
+    measure_argument_qualities_many,
 )
-from llm_mediator_simulation.metrics.perspective_api import PerspectiveScorer
 from llm_mediator_simulation.models.language_model import LanguageModel
 from llm_mediator_simulation.utils.types import Intervention, Metrics
 
+if TYPE_CHECKING:
+    # The Perspective API client is only needed when a scorer is given
+    from llm_mediator_simulation.metrics.perspective_api import PerspectiveScorer
+
 
 class MetricsHandler:
     """Handler class to compute metrics for given input texts."""
@@ -15,9 +23,10 @@ class MetricsHandler:
     def __init__(
         self,
         *,
-        perspective: PerspectiveScorer | None = None,
+        perspective: "PerspectiveScorer | None" = None,
         model: LanguageModel | None = None,
         argument_qualities: list[ArgumentQuality] | None = None,
+        max_workers: int = 4,
     ) -> None:
         """Initialize the metrics handler instance.
 
@@ -25,6 +34,7 @@ class MetricsHandler:
             perspective (PerspectiveScorer | None, optional): The Perspective API scorer. Computes the Perspective API toxicity score. Defaults to None.
             model (LanguageModel | None, optional): The language model to use for custom LLM-based metrics. Requires `argument_qualitites to be set`. Defaults to None.
             argument_qualities (list[ArgumentQuality] | None, optional): The argument qualities to evaluate. Requires `model` to be set. Defaults to None.
+            max_workers (int, optional): The number of background workers computing the metrics submitted with `submit`. Defaults to 4.
         """
 
         assert (model is None and argument_qualities is None) or (
@@ -34,6 +44,11 @@ class MetricsHandler:
         self.perspective = perspective
         self.model = model
         self.argument_qualities = argument_qualities
+        self.max_workers = max_workers
+
+        # Background pipeline, created on the first submission
+        self._executor: ThreadPoolExecutor | None = None
+        self._pending: list[Future[None]] = []
 
     def compute_metrics(self, text: str, seed: int | None = None) -> Metrics:
         """Compute the metrics for the given text.
@@ -66,3 +81,98 @@ class MetricsHandler:
         """Inject metrics in place into a given intervention."""
         if intervention.text is not None:
             intervention.metrics = self.compute_metrics(intervention.text, seed)
+
+    def compute_metrics_many(
+        self, texts: list[str], seed: int | None = None
+    ) -> list[Metrics]:
+        """Compute the metrics for independent texts, with concurrent model calls.
+
+        Args:
+            texts (list[str]): The texts to compute the metrics for.
+            seed (int | None, optional): The seed to use for the language model. Defaults to None.
+
+        Returns:
+            list[Metrics]: The computed metrics, in the order of the texts.
+        """
+
+        metrics = [Metrics() for _ in texts]
+
+        # Measure Perspective API toxicity
+        if self.perspective is not None:
+            for text, text_metrics in zip(texts, metrics):
+                text_metrics.perspective = self.perspective.score(text)
+
+        # Measure custom LLM-based metrics
+        if self.model is not None and self.argument_qualities is not None:
+            qualities = measure_argument_qualities_many(
+                self.model, texts, self.argument_qualities, seed
+            )
+            for text_metrics, text_qualities in zip(metrics, qualities):
+                text_metrics.argument_qualities = text_qualities
+
+        return metrics
+
+    def inject_metrics_many(
+        self, interventions: list[Intervention], seed: int | None = None
+    ) -> None:
+        """Inject metrics in place into the given interventions, with concurrent model calls."""
+
+        with_text = [
+            intervention
+            for intervention in interventions
+            if intervention.text is not None
+        ]
+        metrics = self.compute_metrics_many(
+            [intervention.text for intervention in with_text], seed  # type: ignore
+        )
+        for intervention, intervention_metrics in zip(with_text, metrics):
+            intervention.metrics = intervention_metrics
+
+    def submit(self, intervention: Intervention, seed: int | None = None) -> Future:
+        """Inject metrics into a given intervention in the background.
+
+        The metrics are filled in place by a worker thread. Call `wait` before reading them.
+        """
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                self.max_workers, thread_name_prefix="metrics"
+            )
+
+        # Keep the call purpose tags of the submitting context
+        context = contextvars.copy_context()
+        future = self._executor.submit(
+            context.run, self.inject_metrics, intervention, seed
+        )
+        self._pending.append(future)
+        return future
+
+    def wait(self) -> None:
+        """Wait for the metrics submitted in the background.
+
+        Throws:
+            Exception: The first error raised by a background computation, once all are done.
+        """
+
+        pending, self._pending = self._pending, []
+        errors = [future.exception() for future in pending]
+        for error in errors:
+            if error is not None:
+                raise error
+
+    def close(self) -> None:
+        """Wait for the pending metrics and stop the background workers."""
+
+        try:
+            self.wait()
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+    def __getstate__(self) -> dict:
+        # Worker threads cannot be pickled
+        state = self.__dict__.copy()
+        state["_executor"] = None
+        state["_pending"] = []
+        return state
@@ -1,5 +1,6 @@
 """Calls to Perspective API for toxicity anaysis."""
 
+import threading
 import time
 from datetime import datetime
 
@@ -19,16 +20,29 @@ class PerspectiveScorer:
         self.client = PerspectiveAPI(api_key=api_key)
         self.last_call: datetime | None = None
         self.rate_limit = rate_limit
+        # Serializes the calls of the background metrics workers to respect the rate limit
+        self._lock = threading.Lock()
 
     def score(self, text: str) -> float:
-        """Score the toxicity of a text."""
-
-        if self.last_call is not None and self.rate_limit is not None:
-            time_since_last_call = (datetime.now() - self.last_call).total_seconds()
-            if time_since_last_call < self.rate_limit:
-                time_to_sleep = self.rate_limit - time_since_last_call
-                time.sleep(time_to_sleep)
-
-        score = self.client.score(text)["TOXICITY"]
-        self.last_call = datetime.now()
-        return score
+        """Score the toxicity of a text. Safe to call from several threads."""
+
+        with self._lock:
+            if self.last_call is not None and self.rate_limit is not None:
+                time_since_last_call = (datetime.now() - self.last_call).total_seconds()
+                if time_since_last_call < self.rate_limit:
+                    time_to_sleep = self.rate_limit - time_since_last_call
+                    time.sleep(time_to_sleep)
+
+            score = self.client.score(text)["TOXICITY"]
+            self.last_call = datetime.now()
+            return score
+
+    def __getstate__(self) -> dict:
+        # Locks cannot be pickled (e.g. to score in worker processes)
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
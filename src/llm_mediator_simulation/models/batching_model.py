@@ -0,0 +1,142 @@
+"""Batching wrapper that merges the concurrent calls of many coroutines to an async language model
+into shared batches."""
+
+import asyncio
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, override
+
+from llm_mediator_simulation.models.coalescing_model import CoalescerStats, batch_key
+from llm_mediator_simulation.models.language_model import AsyncLanguageModel
+
+
+@dataclass
+class _PendingBatch:
+    call: Callable[[list[str]], Awaitable[list[Any]]]
+    loop: asyncio.AbstractEventLoop
+    prompts: list[str] = field(default_factory=list)
+    futures: list[asyncio.Future[Any]] = field(default_factory=list)
+
+
+class BatchingAsyncLanguageModel(AsyncLanguageModel):
+    """Async language model wrapper that collects the calls issued by concurrent coroutines
+    (e.g. many debates advanced together) during a short window, and sends them to the wrapped
+    model as one batch per group of identical generation parameters.
+
+    Each caller gets the completions of its own prompts, in order."""
+
+    def __init__(
+        self,
+        *,
+        model: AsyncLanguageModel,
+        max_batch_size: int = 64,
+        max_wait: float = 0.01,
+    ) -> None:
+        """Initialize the batching wrapper.
+
+        Args:
+            model: The async model to send the merged batches to.
+            max_batch_size: The number of pending prompts that triggers sending a batch early.
+            max_wait: The maximum time (in seconds) a call waits for other calls to join its batch.
+        """
+
+        assert max_batch_size >= 1, "max_batch_size must be at least 1."
+
+        self.model = model
+        # Only forward a real model name, as the cached wrappers key responses by it
+        self.model_name: str | None = getattr(model, "model_name", None)
+
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+
+        self._pending: dict[str, _PendingBatch] = {}
+        self._sending: set[asyncio.Task[None]] = set()
+
+        self.stats = CoalescerStats()
+
+    @property
+    @override
+    def structured_output(self) -> bool:
+        return self.model.structured_output
+
+    @override
+    async def sample(
+        self, prompts: list[str], seed: int | None = None, **kwargs: Any
+    ) -> list[str]:
+        return await self._batched(
+            prompts,
+            batch_key(seed, kwargs),
+            lambda batch: self.model.sample(batch, seed, **kwargs),
+        )
+
+    @override
+    async def sample_json(
+        self,
+        prompts: list[str],
+        json_format: dict[str, str],
+        seed: int | None = None,
+        **kwargs: Any,
+    ) -> list[dict[str, Any] | None]:
+        return await self._batched(
+            prompts,
+            batch_key(seed, {**kwargs, "sample_json": json_format}),
+            lambda batch: self.model.sample_json(batch, json_format, seed, **kwargs),
+        )
+
+    async def _batched(
+        self,
+        prompts: list[str],
+        key: str,
+        call: Callable[[list[str]], Awaitable[list[Any]]],
+    ) -> list[Any]:
+        """Add the prompts to the pending batch of their generation parameters,
+        and wait for their completions."""
+
+        if not prompts:
+            return []
+
+        loop = asyncio.get_running_loop()
+
+        pending = self._pending.get(key)
+        if pending is None or pending.loop is not loop:
+            pending = self._pending[key] = _PendingBatch(call=call, loop=loop)
+            loop.call_later(self.max_wait, self._send, key, pending)
+
+        self.stats.queue_depths[len(pending.prompts)] += 1
+
+        futures = [loop.create_future() for _ in prompts]
+        pending.prompts.extend(prompts)
+        pending.futures.extend(futures)
+
+        if len(pending.prompts) >= self.max_batch_size:
+            self._send(key, pending)
+
+        return list(await asyncio.gather(*futures))
+
+    def _send(self, key: str, pending: _PendingBatch) -> None:
+        """Send a pending batch to the model, unless it was already sent."""
+
+        if self._pending.get(key) is not pending:
+            return
+
+        del self._pending[key]
+        self.stats.batch_sizes[len(pending.prompts)] += 1
+
+        # Keep a reference to the task until it is done
+        task = pending.loop.create_task(self._complete(pending))
+        self._sending.add(task)
+        task.add_done_callback(self._sending.discard)
+
+    @staticmethod
+    async def _complete(pending: _PendingBatch) -> None:
+        """Generate the completions of a batch and hand them to their callers."""
+
+        try:
+            completions = await pending.call(pending.prompts)
+        except Exception as e:
+            for future in pending.futures:
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            for future, completion in zip(pending.futures, completions):
+                if not future.done():  # The caller may have been cancelled
+                    future.set_result(completion)
@@ -0,0 +1,407 @@
+"""Persistent on-disk cache of language model responses, as model wrappers."""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Literal, override
+
+from llm_mediator_simulation.models.language_model import (
+    AsyncLanguageModel,
+    LanguageModel,
+)
+
+CacheMode = Literal["read_write", "refresh", "read_only"]
+
+
+class ResponseCache:
+    """SQLite store of model responses, safe to share between threads and processes.
+
+    The database runs in WAL mode so that readers never block, and concurrent writers
+    wait on each other instead of failing. A read-only cache never writes to the database,
+    so that it can read a shared or write-protected file."""
+
+    def __init__(
+        self,
+        path: str,
+        *,
+        max_entries: int | None = None,
+        timeout: float = 30,
+        read_only: bool = False,
+    ) -> None:
+        """Open (or create) a response cache.
+
+        Args:
+            path: The SQLite database file.
+            max_entries: The maximum number of cached responses. The least recently used ones are evicted first.
+            timeout: How long to wait for a lock held by another process, in seconds.
+            read_only: Whether to open an existing database read-only. Lookups then do not update the eviction order.
+        """
+
+        self.path = path
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.read_only = read_only
+        # SQLite connections cannot be shared between threads
+        self._local = threading.local()
+
+        if read_only:
+            if not Path(path).exists():
+                raise FileNotFoundError(f"No response cache at {path}.")
+            return
+
+        with self._connection() as connection:
+            connection.execute("""CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    model_name TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )""")
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)"
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            if self.read_only:
+                connection = sqlite3.connect(
+                    f"{Path(self.path).absolute().as_uri()}?mode=ro",
+                    uri=True,
+                    timeout=self.timeout,
+                )
+            else:
+                connection = sqlite3.connect(self.path, timeout=self.timeout)
+                connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(f"PRAGMA busy_timeout={int(self.timeout * 1000)}")
+            self._local.connection = connection
+        return connection
+
+    @staticmethod
+    def key(
+        model_name: str, prompt: str, seed: int | None, kwargs: dict[str, Any]
+    ) -> str:
+        """Cache key of a call: model name, prompt hash, seed and generation kwargs."""
+
+        prompt_hash = hashlib.sha256(prompt.encode()).hexdigest()
+        call = json.dumps(
+            {
+                "model": model_name,
+                "prompt": prompt_hash,
+                "seed": seed,
+                "kwargs": kwargs,
+            },
+            sort_keys=True,
+            default=repr,
+        )
+        return hashlib.sha256(call.encode()).hexdigest()
+
+    def get(self, key: str) -> str | None:
+        """Return the cached response of a key, or None if it is not cached."""
+
+        with self._connection() as connection:
+            row = connection.execute(
+                "SELECT response FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if not self.read_only:
+                connection.execute(
+                    "UPDATE responses SET accessed_at = ? WHERE key = ?",
+                    (time.time(), key),
+                )
+        return row[0]
+
+    def put(self, key: str, model_name: str, response: str) -> None:
+        """Cache a response, evicting the least recently used ones beyond `max_entries`."""
+
+        now = time.time()
+        with self._connection() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                (key, model_name, response, now, now),
+            )
+            if self.max_entries is not None:
+                connection.execute(
+                    """DELETE FROM responses WHERE key IN (
+                        SELECT key FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+                    )""",
+                    (self.max_entries,),
+                )
+
+    def __len__(self) -> int:
+        return (
+            self._connection().execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        )
+
+    def close(self) -> None:
+        """Close the connection of the current thread."""
+
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+
+class _CachedModelBase:
+    """Cache lookups shared by the cached model wrappers."""
+
+    def __init__(
+        self,
+        *,
+        model: Any,
+        path: str,
+        mode: CacheMode = "read_write",
+        max_entries: int | None = None,
+        cache_unseeded: bool = False,
+        model_name: str | None = None,
+    ) -> None:
+        model_name = model_name or getattr(model, "model_name", None)
+        if model_name is None:
+            # A default such as the class name would mix up the responses
+            # of different servers or checkpoints
+            raise ValueError(
+                f"{type(model).__name__} has no model name: "
+                "pass the `model_name` to cache its responses under."
+            )
+
+        self.model = model
+        self.model_name = model_name
+        self.mode = mode
+        self.cache_unseeded = cache_unseeded
+        self.cache = ResponseCache(
+            path, max_entries=max_entries, read_only=mode == "read_only"
+        )
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def structured_output(self) -> bool:
+        return getattr(self.model, "structured_output", False)
+
+    def _cacheable(self, seed: int | None) -> bool:
+        return seed is not None or self.cache_unseeded
+
+    def _lookup(self, key: str) -> str | None:
+        if self.mode == "refresh":
+            return None
+
+        response = self.cache.get(key)
+        if response is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return response
+
+    def _key(
+        self,
+        prompt: str,
+        seed: int | None,
+        kwargs: dict[str, Any],
+        json_format: dict[str, str] | None = None,
+    ) -> str:
+        if json_format is not None:
+            # JSON objects are cached separately from the text responses
+            kwargs = {**kwargs, "sample_json": json_format}
+        return ResponseCache.key(self.model_name, prompt, seed, kwargs)
+
+    def _store(self, key: str, response: str) -> None:
+        # Empty responses are failed requests: do not replay them
+        if response and self.mode != "read_only":
+            self.cache.put(key, self.model_name, response)
+
+
+class CachedLanguageModel(_CachedModelBase, LanguageModel):
+    """Language model wrapper that stores its completions on disk, so that replaying
+    a seeded simulation does not call the model again.
+
+    Modes:
+        read_write: Read cached responses, and cache new ones.
+        refresh: Always call the model, and overwrite the cached responses.
+        read_only: Read cached responses from an existing cache, but never write to it.
+
+    Unseeded calls are not cached by default, as retry loops rely on them
+    to get a different response."""
+
+    def __init__(
+        self,
+        *,
+        model: LanguageModel,
+        path: str,
+        mode: CacheMode = "read_write",
+        max_entries: int | None = None,
+        cache_unseeded: bool = False,
+        model_name: str | None = None,
+    ) -> None:
+        """Initialize the cached model.
+
+        Args:
+            model: The model to cache the responses of.
+            path: The SQLite cache file. It can be shared between processes.
+            mode: The cache mode ("read_write", "refresh" or "read_only").
+            max_entries: The maximum number of cached responses (least recently used ones are evicted).
+            cache_unseeded: Whether to also cache calls without a seed.
+            model_name: The name to cache the responses under, required for models without a `model_name`
+                (e.g. local servers and pools, where it should identify the served checkpoint).
+                Defaults to the `model_name` of the model.
+        """
+        super().__init__(
+            model=model,
+            path=path,
+            mode=mode,
+            max_entries=max_entries,
+            cache_unseeded=cache_unseeded,
+            model_name=model_name,
+        )
+
+    @override
+    def sample(self, prompt: str, seed: int | None = None, **kwargs: Any) -> str:
+        if not self._cacheable(seed):
+            return self.model.sample(prompt, seed, **kwargs)
+
+        key = self._key(prompt, seed, kwargs)
+        response = self._lookup(key)
+
+        if response is None:
+            response = self.model.sample(prompt, seed, **kwargs)
+            self._store(key, response)
+
+        return response
+
+    @override
+    def sample_many(
+        self, prompts: list[str], seed: int | None = None, **kwargs: Any
+    ) -> list[str]:
+        """Only the prompts missing from the cache are sent to the model, in a single call."""
+
+        if not self._cacheable(seed):
+            return self.model.sample_many(prompts, seed, **kwargs)
+
+        keys = [self._key(prompt, seed, kwargs) for prompt in prompts]
+        responses = [self._lookup(key) for key in keys]
+        missing = [i for i, response in enumerate(responses) if response is None]
+
+        if missing:
+            completions = self.model.sample_many(
+                [prompts[i] for i in missing], seed, **kwargs
+            )
+            for i, completion in zip(missing, completions):
+                responses[i] = completion
+                self._store(keys[i], completion)
+
+        return [response or "" for response in responses]
+
+    @override
+    def sample_json(
+        self,
+        prompt: str,
+        json_format: dict[str, str],
+        seed: int | None = None,
+        **kwargs: Any,
+    ) -> dict[str, Any]:
+        if not self._cacheable(seed):
+            return self.model.sample_json(prompt, json_format, seed, **kwargs)
+
+        key = self._key(prompt, seed, kwargs, json_format)
+        response = self._lookup(key)
+        if response is not None:
+            return json.loads(response)
+
+        data = self.model.sample_json(prompt, json_format, seed, **kwargs)
+        self._store(key, json.dumps(data))
+        return data
+
+
+class CachedAsyncLanguageModel(_CachedModelBase, AsyncLanguageModel):
+    """Async language model wrapper that stores its completions on disk.
+    Only the prompts missing from the cache are sent to the model, in a single call.
+
+    See `CachedLanguageModel` for the cache modes."""
+
+    def __init__(
+        self,
+        *,
+        model: AsyncLanguageModel,
+        path: str,
+        mode: CacheMode = "read_write",
+        max_entries: int | None = None,
+        cache_unseeded: bool = False,
+        model_name: str | None = None,
+    ) -> None:
+        """Initialize the cached async model.
+
+        Args:
+            model: The async model to cache the responses of.
+            path: The SQLite cache file. It can be shared between processes.
+            mode: The cache mode ("read_write", "refresh" or "read_only").
+            max_entries: The maximum number of cached responses (least recently used ones are evicted).
+            cache_unseeded: Whether to also cache calls without a seed.
+            model_name: The name to cache the responses under, required for models without a `model_name`
+                (e.g. local servers and pools, where it should identify the served checkpoint).
+                Defaults to the `model_name` of the model.
+        """
+        super().__init__(
+            model=model,
+            path=path,
+            mode=mode,
+            max_entries=max_entries,
+            cache_unseeded=cache_unseeded,
+            model_name=model_name,
+        )
+
+    @override
+    async def sample(
+        self, prompts: list[str], seed: int | None = None, **kwargs: Any
+    ) -> list[str]:
+        if not self._cacheable(seed):
+            return await self.model.sample(prompts, seed, **kwargs)
+
+        keys = [self._key(prompt, seed, kwargs) for prompt in prompts]
+        responses = [self._lookup(key) for key in keys]
+        missing = [i for i, response in enumerate(responses) if response is None]
+
+        if missing:
+            completions = await self.model.sample(
+                [prompts[i] for i in missing], seed, **kwargs
+            )
+            for i, completion in zip(missing, completions):
+                responses[i] = completion
+                self._store(keys[i], completion)
+
+        return [response or "" for response in responses]
+
+    @override
+    async def sample_json(
+        self,
+        prompts: list[str],
+        json_format: dict[str, str],
+        seed: int | None = None,
+        **kwargs: Any,
+    ) -> list[dict[str, Any] | None]:
+        if not self._cacheable(seed):
+            return await self.model.sample_json(prompts, json_format, seed, **kwargs)
+
+        keys = [self._key(prompt, seed, kwargs, json_format) for prompt in prompts]
+        responses = [self._lookup(key) for key in keys]
+        objects = [
+            json.loads(response) if response is not None else None
+            for response in responses
+        ]
+        missing = [i for i, response in enumerate(responses) if response is None]
+
+        if missing:
+            new_objects = await self.model.sample_json(
+                [prompts[i] for i in missing], json_format, seed, **kwargs
+            )
+            for i, data in zip(missing, new_objects):
+                objects[i] = data
+                # Failed answers are not cached
+                if data is not None:
+                    self._store(keys[i], json.dumps(data))
+
+        return objects
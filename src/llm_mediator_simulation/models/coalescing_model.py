@@ -0,0 +1,207 @@
+"""Micro-batching wrapper that coalesces concurrent `sample` calls to a local HuggingFace model
+into shared padded `generate` calls."""
+
+import json
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, override
+
+from llm_mediator_simulation.models.language_model import LanguageModel
+
+if TYPE_CHECKING:
+    from llm_mediator_simulation.models.hf_local_model import HFLocalModel
+
+
+def batch_key(seed: int | None, kwargs: dict[str, Any]) -> str:
+    """Hashable key of the generation parameters of a call.
+    Only calls sharing the same key can be batched together."""
+
+    return json.dumps({"seed": seed, **kwargs}, sort_keys=True, default=repr)
+
+
+@dataclass
+class CoalescerStats:
+    """Statistics of a request coalescer, to tune its batch size and waiting time.
+
+    Attributes:
+        queue_depths: Histogram of the number of pending requests seen by each new request.
+        batch_sizes: Histogram of the sizes of the batches sent to the model.
+    """
+
+    queue_depths: Counter[int] = field(default_factory=Counter)
+    batch_sizes: Counter[int] = field(default_factory=Counter)
+
+    @property
+    def requests(self) -> int:
+        """Total number of requests served."""
+        return sum(size * count for size, count in self.batch_sizes.items())
+
+    @property
+    def batches(self) -> int:
+        """Total number of batches sent to the model."""
+        return sum(self.batch_sizes.values())
+
+    @property
+    def mean_batch_size(self) -> float:
+        """Average batch size."""
+        return self.requests / self.batches if self.batches else 0.0
+
+
+@dataclass
+class _PendingRequest:
+    prompt: str
+    future: Future[str]
+    arrival: float
+
+
+class CoalescingHFLocalModel(LanguageModel):
+    """Collects `sample` calls issued concurrently from several threads or debates during a short
+    window, and serves them with one padded `generate` call per group of identical generation kwargs.
+
+    The wrapped model is only ever called from the coalescer worker thread."""
+
+    def __init__(
+        self,
+        *,
+        model: "HFLocalModel",
+        max_batch_size: int = 8,
+        max_wait: float = 0.05,
+    ) -> None:
+        """Initialize the coalescer.
+
+        Args:
+            model: The local HuggingFace model to batch calls for.
+            max_batch_size: The maximum number of prompts per `generate` call.
+            max_wait: The maximum time (in seconds) a request waits for other requests to join its batch.
+        """
+
+        assert max_batch_size >= 1, "max_batch_size must be at least 1."
+
+        self.model = model
+        self.model_name = getattr(model, "model_name", type(model).__name__)
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+
+        self._pending: dict[str, list[_PendingRequest]] = {}
+        self._group_kwargs: dict[str, tuple[int | None, dict[str, Any]]] = {}
+        self._condition = threading.Condition()
+        self._stats = CoalescerStats()
+        self._closed = False
+
+        self._worker = threading.Thread(
+            target=self._run, name="hf-coalescer", daemon=True
+        )
+        self._worker.start()
+
+    @override
+    def sample(self, prompt: str, seed: int | None = None, **kwargs: Any) -> str:
+        return self.submit(prompt, seed=seed, **kwargs).result()
+
+    @override
+    def sample_many(
+        self, prompts: list[str], seed: int | None = None, **kwargs: Any
+    ) -> list[str]:
+        """Queue all the prompts at once, so that they share batches."""
+        futures = [self.submit(prompt, seed=seed, **kwargs) for prompt in prompts]
+        return [future.result() for future in futures]
+
+    def submit(
+        self, prompt: str, seed: int | None = None, **kwargs: Any
+    ) -> Future[str]:
+        """Queue a prompt for generation without waiting for the result."""
+
+        future: Future[str] = Future()
+        key = batch_key(seed, kwargs)
+
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("The coalescer has been closed.")
+
+            self._stats.queue_depths[self.queue_depth] += 1
+            self._pending.setdefault(key, []).append(
+                _PendingRequest(prompt, future, time.monotonic())
+            )
+            self._group_kwargs[key] = (seed, kwargs)
+            self._condition.notify()
+
+        return future
+
+    @property
+    def queue_depth(self) -> int:
+        """The current number of requests waiting for a batch."""
+        return sum(len(requests) for requests in self._pending.values())
+
+    def stats(self) -> CoalescerStats:
+        """Return a snapshot of the queue depth and batch size histograms."""
+
+        with self._condition:
+            return CoalescerStats(
+                queue_depths=Counter(self._stats.queue_depths),
+                batch_sizes=Counter(self._stats.batch_sizes),
+            )
+
+    def close(self) -> None:
+        """Serve the pending requests, then stop the worker thread."""
+
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._worker.join()
+
+    def _next_batch(
+        self,
+    ) -> tuple[list[_PendingRequest], int | None, dict[str, Any]] | None:
+        """Wait for the oldest group of requests to be full or to time out, and pop it.
+        Returns None once the coalescer is closed and drained."""
+
+        with self._condition:
+            while not self._pending:
+                if self._closed:
+                    return None
+                self._condition.wait()
+
+            # Groups are kept in insertion order: the first one holds the oldest request
+            key = next(iter(self._pending))
+            deadline = self._pending[key][0].arrival + self.max_wait
+
+            while (
+                len(self._pending[key]) < self.max_batch_size
+                and not self._closed
+                and (remaining := deadline - time.monotonic()) > 0
+            ):
+                self._condition.wait(remaining)
+
+            requests = self._pending[key]
+            batch = requests[: self.max_batch_size]
+            seed, kwargs = self._group_kwargs[key]
+
+            if len(requests) > self.max_batch_size:
+                # Move the leftover requests to the back of the queue
+                del self._pending[key]
+                self._pending[key] = requests[self.max_batch_size :]
+            else:
+                del self._pending[key]
+                del self._group_kwargs[key]
+
+            self._stats.batch_sizes[len(batch)] += 1
+
+        return batch, seed, kwargs
+
+    def _run(self) -> None:
+        while (next_batch := self._next_batch()) is not None:
+            batch, seed, kwargs = next_batch
+
+            try:
+                texts = self.model.sample_batch(
+                    [request.prompt for request in batch], seed=seed, **kwargs
+                )
+            except Exception as e:
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+
+            for request, text in zip(batch, texts):
+                request.future.set_result(text)
@@ -0,0 +1,317 @@
+"""JSON-schema-constrained decoding for local HuggingFace models.
+
+A character-level state machine accepts the flat JSON objects described by a schema
+(see `utils.json.json_schema`): keys in order, and boolean, number, integer, string or
+string enum values. At each generation step, the tokens whose text cannot continue a valid
+object are masked out, so that the generated object always parses.
+
+Allowed tokens are found by walking a trie of the token strings alongside the state machine,
+and the resulting masks are cached per state, as most steps (e.g. inside free text) share one.
+"""
+
+import json
+from typing import Any, Hashable
+
+import torch
+from transformers import LogitsProcessor
+
+WHITESPACE = " \n\t"
+# Per whitespace run, to leave room for indentation but not loop on it
+MAX_WHITESPACE = 16
+MAX_NUMBER_LENGTH = 16
+
+State = tuple[Hashable, ...]
+DONE: State = ("done",)
+
+# Token string trie: characters lead to child nodes, and the None key lists the tokens ending at a node
+TrieNode = dict[str | None, Any]
+
+
+class JSONSchemaMachine:
+    """Character-level acceptor of the flat JSON objects described by a schema.
+
+    States are hashable tuples. `advance` returns the next state, or None if the character
+    cannot continue a valid object."""
+
+    def __init__(self, schema: dict[str, Any]) -> None:
+        properties: dict[str, dict[str, Any]] = schema.get("properties", {})
+        self.fields = list(properties.values())
+
+        # Literal segments before each value, and after the last one: whitespace is `None`
+        keys = [json.dumps(key) for key in properties]
+        self.segments: list[list[str | None]] = [
+            [None, "{" if i == 0 else ",", None, key, None, ":", None]
+            for i, key in enumerate(keys)
+        ]
+        self.segments.append([None, "{", None, "}"] if not keys else [None, "}"])
+
+    @property
+    def initial_state(self) -> State:
+        return ("literal", 0, 0, 0, 0)
+
+    def advance(self, state: State, char: str) -> State | None:
+        match state:
+            case ("literal", int(segment), int(piece), int(offset), int(whitespace)):
+                return self._advance_literal(segment, piece, offset, whitespace, char)
+            case ("value", int(field), tuple(value)):
+                return self._advance_value(field, value, char)
+        return None
+
+    def _advance_literal(
+        self, segment: int, piece: int, offset: int, whitespace: int, char: str
+    ) -> State | None:
+        pieces = self.segments[segment]
+
+        while piece < len(pieces):
+            expected = pieces[piece]
+            if expected is None:
+                if char in WHITESPACE and whitespace < MAX_WHITESPACE:
+                    return ("literal", segment, piece, 0, whitespace + 1)
+                piece, offset, whitespace = piece + 1, 0, 0
+                continue
+
+            if expected[offset] != char:
+                return None
+            offset += 1
+            if offset == len(expected):
+                piece, offset = piece + 1, 0
+                if piece == len(pieces) and segment == len(self.fields):
+                    return DONE
+            return ("literal", segment, piece, offset, 0)
+
+        # End of the literal segment: start the value
+        return self._advance_value(segment, self._start_value(segment), char)
+
+    def _start_value(self, field: int) -> tuple:
+        value_type = self.fields[field].get("type")
+        if "enum" in self.fields[field]:
+            return ("enum", "start")
+        if value_type == "boolean":
+            return ("boolean", "")
+        if value_type in ("number", "integer"):
+            return ("number", "start", 0)
+        return ("string", "start")
+
+    def _advance_value(self, field: int, value: tuple, char: str) -> State | None:
+        next_value = self._value_step(self.fields[field], value, char)
+        if next_value is not None:
+            return ("value", field, next_value)
+
+        if self._value_complete(self.fields[field], value):
+            # The value ended: the character belongs to the next literal segment
+            return self.advance(("literal", field + 1, 0, 0, 0), char)
+
+        return None
+
+    @staticmethod
+    def _value_complete(field: dict[str, Any], value: tuple) -> bool:
+        match value:
+            case ("boolean", text):
+                return text in ("true", "false")
+            case ("number", substate, _):
+                if field.get("type") == "integer":
+                    return substate in ("zero", "integer")
+                # Numbers need a fractional part, so that they parse as floats
+                return substate in ("fraction", "exponent")
+            case ("string", "closed") | ("enum", "closed"):
+                return True
+        return False
+
+    @staticmethod
+    def _value_step(field: dict[str, Any], value: tuple, char: str) -> tuple | None:
+        match value:
+            case ("boolean", text):
+                text = f"{text}{char}"
+                return (
+                    ("boolean", text)
+                    if "true".startswith(text) or "false".startswith(text)
+                    else None
+                )
+
+            case ("enum", "start"):
+                return ("enum", "open", "") if char == '"' else None
+            case ("enum", "open", text):
+                options: list[str] = field["enum"]
+                if char == '"' and text in options:
+                    return ("enum", "closed")
+                text = f"{text}{char}"
+                if any(option.startswith(text) for option in options):
+                    return ("enum", "open", text)
+                return None
+
+            case ("string", "start"):
+                return ("string", "in") if char == '"' else None
+            case ("string", "in"):
+                if char == '"':
+                    return ("string", "closed")
+                if char == "\\":
+                    return ("string", "escape")
+                return ("string", "in") if ord(char) >= 0x20 else None
+            case ("string", "escape"):
+                if char in '"\\/bfnrt':
+                    return ("string", "in")
+                return ("string", 4) if char == "u" else None
+            case ("string", int(remaining)):
+                if char not in "0123456789abcdefABCDEF":
+                    return None
+                return ("string", remaining - 1) if remaining > 1 else ("string", "in")
+
+            case ("number", substate, length):
+                next_substate = _number_step(
+                    substate, char, field.get("type") == "integer"
+                )
+                if next_substate is None or (
+                    # Past the length limit, only move on towards the end of the number
+                    length >= MAX_NUMBER_LENGTH
+                    and next_substate == substate
+                ):
+                    return None
+                return ("number", next_substate, length + 1)
+
+        return None
+
+
+def _number_step(substate: str, char: str, integer: bool) -> str | None:
+    """JSON number grammar: -?(0|[1-9][0-9]*)(.[0-9]+)?([eE][+-]?[0-9]+)?"""
+
+    digit = char.isdigit() and char.isascii()
+
+    match substate:
+        case "start" if char == "-":
+            return "minus"
+        case "start" | "minus" if digit:
+            return "zero" if char == "0" else "integer"
+        case "integer" if digit:
+            return "integer"
+        case "zero" | "integer" if char == "." and not integer:
+            return "dot"
+        case "dot" | "fraction" if digit:
+            return "fraction"
+        case "fraction" if char in "eE":
+            return "exponent_start"
+        case "exponent_start" if char in "+-":
+            return "exponent_sign"
+        case "exponent_start" | "exponent_sign" | "exponent" if digit:
+            return "exponent"
+    return None
+
+
+class TokenVocabulary:
+    """Surface strings of a tokenizer's tokens, arranged in a trie, with a cache of
+    the allowed-token masks of the states of each schema."""
+
+    def __init__(self, tokenizer: Any) -> None:
+        self.tokenizer = tokenizer
+        self.size = len(tokenizer)
+        self.eos_token_id: int = tokenizer.eos_token_id
+
+        # Decode each token after an anchor token, to keep the leading spaces
+        # that tokenizers drop at the start of a text
+        anchor = tokenizer.encode("a", add_special_tokens=False)[-1:]
+        anchor_text = tokenizer.decode(anchor)
+        special_ids = set(tokenizer.all_special_ids)
+
+        self.token_strings: list[str] = []
+        self.trie: TrieNode = {}
+        for token_id in range(self.size):
+            text = tokenizer.decode(anchor + [token_id])[len(anchor_text) :]
+            # Partial UTF-8 byte tokens and special tokens never continue a JSON object
+            if token_id in special_ids or not text or "�" in text:
+                text = ""
+            self.token_strings.append(text)
+            if text:
+                node = self.trie
+                for char in text:
+                    node = node.setdefault(char, {})
+                node.setdefault(None, []).append(token_id)
+
+        self._masks: dict[tuple[str, State], torch.Tensor] = {}
+
+    def allowed_mask(
+        self, machine: JSONSchemaMachine, schema_key: str, state: State
+    ) -> torch.Tensor:
+        """Boolean mask of the tokens that can follow the given state."""
+
+        key = (schema_key, state)
+        if key not in self._masks:
+            mask = torch.zeros(self.size, dtype=torch.bool)
+            if state == DONE:
+                mask[self.eos_token_id] = True
+            else:
+                mask[self._allowed_tokens(machine, state)] = True
+            self._masks[key] = mask
+        return self._masks[key]
+
+    def _allowed_tokens(self, machine: JSONSchemaMachine, state: State) -> list[int]:
+        allowed: list[int] = []
+        stack: list[tuple[TrieNode, State]] = [(self.trie, state)]
+
+        while stack:
+            node, node_state = stack.pop()
+            for char, child in node.items():
+                if char is None:
+                    continue
+                child_state = machine.advance(node_state, char)
+                if child_state is None:
+                    continue
+                allowed.extend(child.get(None, []))
+                # Nothing can follow the end of the object
+                if child_state != DONE:
+                    stack.append((child, child_state))
+
+        return allowed
+
+
+class JSONSchemaLogitsProcessor(LogitsProcessor):
+    """Mask the tokens that cannot continue a JSON object matching the schema.
+    Once the object is complete, only the end-of-sequence token is allowed."""
+
+    def __init__(
+        self, vocabulary: TokenVocabulary, schema: dict[str, Any], prompt_length: int
+    ) -> None:
+        """Initialize the logits processor.
+
+        Args:
+            vocabulary: The token vocabulary of the model tokenizer.
+            schema: The JSON schema of the object to generate.
+            prompt_length: The length of the (padded) prompts, after which tokens are generated.
+        """
+        self.vocabulary = vocabulary
+        self.machine = JSONSchemaMachine(schema)
+        self.schema_key = json.dumps(schema, sort_keys=True)
+        self.prompt_length = prompt_length
+        self._states: list[State | None] = []
+
+    def __call__(
+        self, input_ids: torch.LongTensor, scores: torch.FloatTensor
+    ) -> torch.FloatTensor:
+        if not self._states:
+            self._states = [self.machine.initial_state] * input_ids.shape[0]
+
+        for row in range(input_ids.shape[0]):
+            state = self._states[row]
+
+            # Advance with the last generated token
+            if input_ids.shape[1] > self.prompt_length and state is not None:
+                text = self.vocabulary.token_strings[int(input_ids[row, -1])]
+                for char in text:
+                    state = self.machine.advance(state, char) if state else None
+                    if state is None or state == DONE:
+                        break
+                self._states[row] = state
+
+            if state is None:
+                continue  # Unconstrained past an unexpected token
+
+            mask = self.vocabulary.allowed_mask(self.machine, self.schema_key, state)
+            if not mask.any():
+                # No token of the vocabulary can continue the object
+                self._states[row] = None
+                continue
+            scores[row, : mask.shape[0]] = scores[row, : mask.shape[0]].masked_fill(
+                ~mask.to(scores.device), float("-inf")
+            )
+            if scores.shape[1] > mask.shape[0]:
+                scores[row, mask.shape[0] :] = float("-inf")
+
+        return scores
@@ -0,0 +1,122 @@
+"""Single-flight deduplication of identical prompts sent to an async language model."""
+
+import asyncio
+from typing import Any, Awaitable, Callable, TypeVar, override
+
+from llm_mediator_simulation.models.coalescing_model import batch_key
+from llm_mediator_simulation.models.language_model import AsyncLanguageModel
+
+T = TypeVar("T")
+
+
+class DeduplicatingAsyncLanguageModel(AsyncLanguageModel):
+    """Async language model wrapper that sends identical (prompt, seed, kwargs) calls only once.
+
+    Duplicates are collapsed within a batch and across the batches in flight at the same time,
+    and every caller gets the shared completion. Calls without a seed are stochastic,
+    so they are never deduplicated."""
+
+    def __init__(self, *, model: AsyncLanguageModel) -> None:
+        """Initialize the deduplicating wrapper.
+
+        Args:
+            model: The async model to send the deduplicated prompts to.
+        """
+
+        self.model = model
+        # Only forward a real model name, as the cached wrappers key responses by it
+        self.model_name: str | None = getattr(model, "model_name", None)
+
+        self._in_flight: dict[str, asyncio.Future[Any]] = {}
+
+        # Counters
+        self.calls = 0
+        self.saved_calls = 0
+
+    @property
+    @override
+    def structured_output(self) -> bool:
+        return self.model.structured_output
+
+    @override
+    async def sample(
+        self, prompts: list[str], seed: int | None = None, **kwargs: Any
+    ) -> list[str]:
+        return await self._deduplicated(
+            prompts,
+            seed,
+            kwargs,
+            lambda new_prompts: self.model.sample(new_prompts, seed, **kwargs),
+        )
+
+    @override
+    async def sample_json(
+        self,
+        prompts: list[str],
+        json_format: dict[str, str],
+        seed: int | None = None,
+        **kwargs: Any,
+    ) -> list[dict[str, Any] | None]:
+        return await self._deduplicated(
+            prompts,
+            seed,
+            {**kwargs, "sample_json": json_format},
+            lambda new_prompts: self.model.sample_json(
+                new_prompts, json_format, seed, **kwargs
+            ),
+        )
+
+    async def _deduplicated(
+        self,
+        prompts: list[str],
+        seed: int | None,
+        kwargs: dict[str, Any],
+        call: Callable[[list[str]], Awaitable[list[T]]],
+    ) -> list[T]:
+        """Send the prompts that are not already in flight with `call`,
+        and share the results between identical calls."""
+
+        self.calls += len(prompts)
+
+        if seed is None:
+            return await call(prompts)
+
+        loop = asyncio.get_running_loop()
+        parameters_key = batch_key(seed, kwargs)
+
+        # Prompts that are not already being generated are sent in a single call
+        futures: list[asyncio.Future[T]] = []
+        owned: dict[str, asyncio.Future[T]] = {}
+        new_prompts: list[str] = []
+
+        for prompt in prompts:
+            key = f"{parameters_key}\n{prompt}"
+            future = self._in_flight.get(key)
+            if future is None or future.get_loop() is not loop:
+                future = owned[key] = self._in_flight[key] = loop.create_future()
+                new_prompts.append(prompt)
+            futures.append(future)
+
+        self.saved_calls += len(prompts) - len(new_prompts)
+
+        if new_prompts:
+            try:
+                completions = await call(new_prompts)
+            except asyncio.CancelledError:
+                for future in owned.values():
+                    future.cancel()
+                raise
+            except Exception as e:
+                for future in owned.values():
+                    future.set_exception(e)
+                    future.exception()  # Only the other waiting callers need to see it
+                raise
+            else:
+                for future, completion in zip(owned.values(), completions):
+                    future.set_result(completion)
+            finally:
+                for key, future in owned.items():
+                    if self._in_flight.get(key) is future:
+                        del self._in_flight[key]
+
+        return list(await asyncio.gather(*futures))
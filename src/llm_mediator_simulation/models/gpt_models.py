@@ -1,20 +1,77 @@
 """OpenAI GPT model wrapper."""
 
 import asyncio
-from typing import Any, Literal, override
+import json
+import logging
+from typing import Any, AsyncIterator, Iterator, Literal, override
 
-from openai import AsyncOpenAI, OpenAI
+from openai import (
+    NOT_GIVEN,
+    APIConnectionError,
+    APIStatusError,
+    AsyncOpenAI,
+    OpenAI,
+)
 from openai.types.chat import ChatCompletionMessageParam
 
 from llm_mediator_simulation.models.language_model import (
     AsyncLanguageModel,
     LanguageModel,
 )
+from llm_mediator_simulation.models.rate_limiter import (
+    backoff_delay,
+    estimate_tokens,
+    shared_rate_limiter,
+)
+from llm_mediator_simulation.utils.json import json_schema
+
+logger = logging.getLogger(__name__)
+
+# Completion of a request that still failed on transient errors after all retries
+REQUEST_FAILED = "OpenAI request failed."
+
+
+def _response_format(json_format: dict[str, str]) -> dict[str, Any]:
+    """OpenAI structured output parameter for the answers to a `json_prompt` format."""
+
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "answer",
+            "strict": True,
+            "schema": json_schema(json_format),
+        },
+    }
+
+
+def _loads_or_none(content: str) -> dict[str, Any] | None:
+    """Parse a structured output, or return None for failed or truncated answers."""
+
+    try:
+        return json.loads(content)
+    except json.JSONDecodeError:
+        return None
+
+
+def _is_retryable(error: Exception) -> bool:
+    """Whether a failed OpenAI request is worth retrying: connection errors,
+    rate limits (429) and server errors (5xx)."""
+
+    if isinstance(error, APIConnectionError):
+        return True
+    return isinstance(error, APIStatusError) and (
+        error.status_code == 429 or error.status_code >= 500
+    )
 
 
 class GPTModel(LanguageModel):
     """OpenAI GPT model wrapper."""
 
+    @property
+    @override
+    def structured_output(self) -> bool:
+        return True
+
     def __init__(
         self,
         *,
@@ -48,49 +105,256 @@ class GPTModel(LanguageModel):
 
         return content if content else ""
 
+    @override
+    def sample_json(
+        self,
+        prompt: str,
+        json_format: dict[str, str],
+        seed: int | None = None,
+        **kwargs: Any,
+    ) -> dict[str, Any]:
+        """Generate a JSON object answering the given prompt. The answer is constrained
+        to the format schema by the API (structured outputs)."""
+
+        messages: list[ChatCompletionMessageParam] = [
+            {"role": "user", "content": prompt}
+        ]
+
+        result = self.client.chat.completions.create(
+            messages=messages,
+            model=self.model_name,
+            n=1,
+            seed=seed,
+            temperature=0,
+            response_format=_response_format(json_format),  # type: ignore
+        )
+        content = result.choices[0].message.content
+        if not content:
+            raise ValueError("The model refused to answer.")
+
+        return json.loads(content)
+
+    @override
+    def sample_stream(
+        self, prompt: str, seed: int | None = None, **kwargs: Any
+    ) -> Iterator[str]:
+        messages: list[ChatCompletionMessageParam] = [
+            {"role": "user", "content": prompt}
+        ]
+
+        stream = self.client.chat.completions.create(
+            messages=messages,
+            model=self.model_name,
+            n=1,
+            seed=seed,
+            temperature=0,
+            stream=True,
+        )
+        try:
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            stream.close()
+
 
 class AsyncGPTModel(AsyncLanguageModel):
-    """OpenAI GPT model wrapper."""
+    """OpenAI GPT model wrapper.
+
+    Requests go through a token-bucket rate limiter shared by all instances targeting the same
+    endpoint and model. Rate-limited (429) and server error (5xx) responses are retried with
+    exponential backoff. A request that still fails after all retries gives up on its own,
+    without aborting the rest of the batch. Other errors (such as 400 or 401) are raised.
+    """
+
+    @property
+    @override
+    def structured_output(self) -> bool:
+        return True
 
     def __init__(
         self,
         *,
         api_key: str,
         model_name: Literal["gpt-3.5-turbo", "gpt-4-turbo", "gpt-4o"],
+        base_url: str | None = None,
+        requests_per_minute: int = 500,
+        tokens_per_minute: int = 30_000,
+        max_retries: int = 6,
+        backoff_base: float = 1.0,
     ):
         """Initialize a GPT model.
 
         Args:
             api_key: OpenAI API key.
             model_name: OpenAI model name.
+            base_url: OpenAI-compatible API endpoint (defaults to the OpenAI API).
+            requests_per_minute: Rate limit on the number of requests, shared with the other instances of the same endpoint and model.
+            tokens_per_minute: Rate limit on the number of tokens, shared with the other instances of the same endpoint and model.
+            max_retries: The maximum number of retries of a failed request.
+            backoff_base: The exponential backoff scale between retries, in seconds.
         """
         self._api_key = api_key
         self.model_name = model_name
-        self.client = AsyncOpenAI(api_key=api_key)
+        # Retries are handled here, with the shared rate limiter
+        self.client = AsyncOpenAI(api_key=api_key, base_url=base_url, max_retries=0)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.rate_limiter = shared_rate_limiter(
+            (str(self.client.base_url), model_name),
+            requests_per_minute=requests_per_minute,
+            tokens_per_minute=tokens_per_minute,
+        )
 
     @override
     async def sample(
         self, prompts: list[str], seed: int | None = None, **kwargs: Any
     ) -> list[str]:
-        # Prepare prompts
-        messages: list[list[ChatCompletionMessageParam]] = [
-            [{"role": "user", "content": prompt}] for prompt in prompts
+        """Generate texts based on the given prompts. Requests that still fail on transient
+        errors after all retries give `REQUEST_FAILED`. Other errors are raised."""
+
+        completions = await self._complete_all(prompts, seed)
+        return [
+            REQUEST_FAILED if completion is None else completion
+            for completion in completions
+        ]
+
+    @override
+    async def sample_json(
+        self,
+        prompts: list[str],
+        json_format: dict[str, str],
+        seed: int | None = None,
+        **kwargs: Any,
+    ) -> list[dict[str, Any] | None]:
+        """Generate JSON objects answering the given prompts. The answers are constrained
+        to the format schema by the API (structured outputs).
+
+        Requests that still fail on transient errors after all retries are None, so that the
+        caller can retry them without failing the whole batch. Other errors are raised.
+        """
+
+        completions = await self._complete_all(
+            prompts, seed, _response_format(json_format)
+        )
+        return [
+            None if completion is None else _loads_or_none(completion)
+            for completion in completions
+        ]
+
+    @override
+    async def sample_stream(
+        self, prompt: str, seed: int | None = None, **kwargs: Any
+    ) -> AsyncIterator[str]:
+        """Stream the completion of a single prompt. The request goes through the rate limiter,
+        but is not retried: failures are raised to the caller."""
+
+        messages: list[ChatCompletionMessageParam] = [
+            {"role": "user", "content": prompt}
+        ]
+        await self.rate_limiter.acquire(estimate_tokens(prompt, self.model_name))
+
+        stream = await self.client.chat.completions.create(
+            messages=messages,
+            model=self.model_name,
+            n=1,
+            seed=seed,
+            temperature=0,
+            stream=True,
+        )
+        try:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            await stream.close()
+
+    async def _complete_all(
+        self,
+        prompts: list[str],
+        seed: int | None,
+        response_format: dict[str, Any] | None = None,
+    ) -> list[str | None]:
+        """Complete the prompts concurrently. Each request gives up on its own: the requests
+        that still fail on transient errors after all retries are None.
+
+        Raises:
+            APIStatusError: A request failed with a non-retryable error.
+        """
+
+        completions = await asyncio.gather(
+            *[self._complete(prompt, seed, response_format) for prompt in prompts],
+            return_exceptions=True,
+        )
+
+        results: list[str | None] = []
+        for completion in completions:
+            if isinstance(completion, Exception) and _is_retryable(completion):
+                results.append(None)
+            elif isinstance(completion, BaseException):
+                raise completion
+            else:
+                results.append(completion)
+        return results
+
+    async def _complete(
+        self,
+        prompt: str,
+        seed: int | None,
+        response_format: dict[str, Any] | None = None,
+    ) -> str:
+        """Complete a single prompt, retrying on rate limits and server errors.
+
+        Raises:
+            APIConnectionError | APIStatusError: The request failed with a non-retryable error,
+                or still failed after all retries.
+        """
+
+        messages: list[ChatCompletionMessageParam] = [
+            {"role": "user", "content": prompt}
         ]
+        tokens = estimate_tokens(prompt, self.model_name)
+
+        for attempt in range(self.max_retries + 1):
+            await self.rate_limiter.acquire(tokens)
 
-        # Await all completions asynchronously
-        results = await asyncio.gather(
-            *[
-                self.client.chat.completions.create(
-                    messages=message,
+            try:
+                result = await self.client.chat.completions.create(
+                    messages=messages,
                     model=self.model_name,
                     n=1,
                     seed=seed,
                     temperature=0,
+                    response_format=response_format or NOT_GIVEN,  # type: ignore
                 )
-                for message in messages
-            ]
-        )
+            except (APIConnectionError, APIStatusError) as e:
+                if not _is_retryable(e):
+                    logger.error("OpenAI request failed: %s: %s", type(e).__name__, e)
+                    raise
+                if attempt == self.max_retries:
+                    logger.warning(
+                        "OpenAI request failed after %d retries: %s: %s",
+                        self.max_retries,
+                        type(e).__name__,
+                        e,
+                    )
+                    raise
+
+                retry_after = (
+                    e.response.headers.get("retry-after")
+                    if isinstance(e, APIStatusError)
+                    else None
+                )
+                await asyncio.sleep(
+                    backoff_delay(
+                        attempt, base=self.backoff_base, retry_after=retry_after
+                    )
+                )
+                continue
+
+            if result.usage is not None:
+                self.rate_limiter.record(result.usage.completion_tokens)
 
-        contents = [result.choices[0].message.content or "" for result in results]
+            return result.choices[0].message.content or ""
 
-        return contents
+        raise AssertionError("unreachable: the last attempt returns or raises")
@@ -1,21 +1,88 @@
-"""Mistral local-running model wrapper"""
+"""HuggingFace local-running model wrappers"""
 
+import asyncio
 import os
-from typing import Any, Literal, override
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Iterator, Literal, override
 
 import torch
 from peft import PeftConfig, PeftModel
-from transformers import AutoModelForCausalLM, AutoTokenizer
+from transformers import (
+    AutoModelForCausalLM,
+    AutoTokenizer,
+    LogitsProcessorList,
+    StoppingCriteria,
+    StoppingCriteriaList,
+    TextIteratorStreamer,
+)
 
+from llm_mediator_simulation.models.constrained_decoding import (
+    JSONSchemaLogitsProcessor,
+    TokenVocabulary,
+)
 from llm_mediator_simulation.models.language_model import (
     AsyncLanguageModel,
     LanguageModel,
 )
+from llm_mediator_simulation.models.prefix_cache import PrefixKVCache
+from llm_mediator_simulation.utils.json import json_schema
 from llm_mediator_simulation.utils.reproducibility import set_transformers_seed
 
 
-class HFLocalModel(LanguageModel):
-    """HuggingFace's local-running model wrapper"""
+@dataclass
+class AssistedDecodingStats:
+    """Statistics of the generations assisted by a draft model.
+
+    Each round, the draft model proposes tokens that the main model checks in a single forward pass:
+    the matching ones are accepted, and the main model adds one token of its own.
+
+    Attributes:
+        calls: The number of assisted `generate` calls.
+        rounds: The number of main model forward passes.
+        drafted_tokens: The number of tokens proposed by the draft model.
+        accepted_tokens: The number of drafted tokens accepted by the main model.
+        generated_tokens: The number of generated tokens.
+        generation_time: The time spent in assisted generation, in seconds.
+    """
+
+    calls: int = 0
+    rounds: int = 0
+    drafted_tokens: int = 0
+    accepted_tokens: int = 0
+    generated_tokens: int = 0
+    generation_time: float = 0.0
+
+    @property
+    def acceptance_rate(self) -> float:
+        """Share of the drafted tokens accepted by the main model."""
+        return (
+            self.accepted_tokens / self.drafted_tokens if self.drafted_tokens else 0.0
+        )
+
+    @property
+    def tokens_per_second(self) -> float:
+        """Assisted generation throughput."""
+        return (
+            self.generated_tokens / self.generation_time
+            if self.generation_time
+            else 0.0
+        )
+
+    def summary(self) -> dict[str, float]:
+        return {
+            "calls": self.calls,
+            "rounds": self.rounds,
+            "drafted_tokens": self.drafted_tokens,
+            "accepted_tokens": self.accepted_tokens,
+            "acceptance_rate": self.acceptance_rate,
+            "tokens_per_second": self.tokens_per_second,
+        }
+
+
+class HFLocalBase:
+    """Model loading and padded batch generation shared by the local HuggingFace model wrappers."""
 
     def __init__(
         self,
@@ -30,12 +97,17 @@ class HFLocalModel(LanguageModel):
         quantization: Literal["4_bits"] | None = None,
         debug: bool = False,
         json: bool = False,
+        prefix_cache_tokens: int = 0,
+        prefix_block_size: int = 32,
+        constrained_json: bool = False,
+        draft_model_name: str | None = None,
+        max_batch_tokens: int = 8192,
         **kwargs: dict,
     ):
         """Initialize a HuggingFace model.
 
         Args:
-            model_name: Model name, or path to such a model.
+            model_name: Model name, or path to such a model (or to a LoRA adapter).
             max_new_tokens: Maximum newly generated tokens
             num_return_sequences: Number of generated sentences.
             temperature: Sampling temperature.
@@ -44,6 +116,16 @@ class HFLocalModel(LanguageModel):
             quantization: BitsAndBytes precision.
             debug: Displays verbose prompts and responses.
             json: Whether to enforce JSON generation.
+            prefix_cache_tokens: Token capacity of the LRU cache of prompt prefix attention states (0 to disable).
+                Prompts sharing a long prefix (few-shot examples, personas...) then only prefill their differing suffix.
+            prefix_block_size: Prefix cache granularity, in tokens.
+            constrained_json: Whether to constrain JSON generation to the format given by the `json_format` sampling argument,
+                so that the response always parses. A `json_format` implies JSON mode.
+            draft_model_name: Small model (or path to such a model) drafting tokens for the main model to check,
+                with transformers' assisted generation. Only single-prompt generations are assisted,
+                and never the generations constrained by `constrained_json`.
+                Greedy outputs are unchanged, and sampled outputs follow the same distribution.
+            max_batch_tokens: The maximum number of tokens (padded prompt and new tokens) per `generate` call.
             kwargs: Additional arguments for the model.
 
         Recommendations can be found in Google Prompt Engineering White Paper:
@@ -63,10 +145,14 @@ class HFLocalModel(LanguageModel):
             self.model_name = model_name
 
         self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+        # Left padding so that batched prompts all end right before generation starts
+        self.tokenizer.padding_side = "left"
+        if self.tokenizer.pad_token is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
         model = AutoModelForCausalLM.from_pretrained(
             self.model_name,
             device_map="auto",
-            quantization_config=QUANTIZATION_CONFIG[quantization],
+            quantization_config=quantization_config(quantization),
             # revision="stage1-step721901-tokens6056B",
             **kwargs,
         )
@@ -86,14 +172,104 @@ class HFLocalModel(LanguageModel):
         self.do_sample = do_sample
         self.debug = debug
         self.json = json
+        self.prefix_cache = (
+            PrefixKVCache(max_tokens=prefix_cache_tokens, block_size=prefix_block_size)
+            if prefix_cache_tokens > 0
+            else None
+        )
+
+        self.constrained_json = constrained_json
+        self._vocabulary: TokenVocabulary | None = None
+
+        self.max_batch_tokens = max_batch_tokens
+
+        # Throughput counters
+        self.generated_tokens = 0
+        self.generation_time = 0.0
+
+        self.draft_model: Any = None
+        self.assisted_stats = AssistedDecodingStats()
+        # Forward passes of both models, counted once a draft model is loaded
+        self._forward_passes = {"main": 0, "draft": 0}
+        if draft_model_name is not None:
+            self._load_draft_model(draft_model_name)
 
         if quantization is None:
             self.quantization = "no quantization"
         else:
             self.quantization = quantization
 
-    @override
-    def sample(self, prompt: str, seed: int | None = None, **kwargs: Any) -> str:
+    def _load_draft_model(self, draft_model_name: str) -> None:
+        """Load the draft model, and count the forward passes of both models
+        to measure how many drafted tokens are accepted."""
+
+        self.draft_model = AutoModelForCausalLM.from_pretrained(
+            draft_model_name, device_map="auto"
+        )
+        draft_tokenizer = AutoTokenizer.from_pretrained(draft_model_name)
+        # Drafts from another tokenizer are re-tokenized by transformers
+        self._draft_tokenizer = (
+            None
+            if draft_tokenizer.get_vocab() == self.tokenizer.get_vocab()
+            else draft_tokenizer
+        )
+
+        def counter(name: str) -> Any:
+            def hook(*_: Any) -> None:
+                self._forward_passes[name] += 1
+
+            return hook
+
+        # Adapters run the forward pass of their base model
+        main_model = (
+            self.model.get_base_model()
+            if isinstance(self.model, PeftModel)
+            else self.model
+        )
+        main_model.register_forward_hook(counter("main"))
+        self.draft_model.register_forward_hook(counter("draft"))
+
+    @property
+    def max_prompt_tokens(self) -> int:
+        """The longest prompt that leaves room for `max_new_tokens` in the model context,
+        with a small margin for the JSON mode prompt suffix."""
+        return self.tokenizer.model_max_length - self.max_new_tokens - 8
+
+    def token_budget_batches(
+        self, prompts: list[str], max_new_tokens: int
+    ) -> list[list[int]]:
+        """Split prompt indexes into batches whose padded size fits in the token budget.
+        Prompts of similar lengths are grouped together to limit padding.
+        A prompt that does not fit in the budget on its own gets its own batch."""
+
+        lengths = [
+            len(ids)
+            for ids in self.tokenizer(prompts, add_special_tokens=True).input_ids
+        ]
+        order = sorted(range(len(prompts)), key=lambda i: lengths[i], reverse=True)
+
+        batches: list[list[int]] = []
+        batch: list[int] = []
+        batch_length = 0  # Longest prompt of the current batch (the first one, as prompts are sorted)
+
+        for i in order:
+            if not batch:
+                batch_length = lengths[i]
+            elif (len(batch) + 1) * (
+                batch_length + max_new_tokens
+            ) > self.max_batch_tokens:
+                batches.append(batch)
+                batch = []
+                batch_length = lengths[i]
+            batch.append(i)
+
+        if batch:
+            batches.append(batch)
+
+        return batches
+
+    def _with_default_parameters(self, kwargs: dict[str, Any]) -> dict[str, Any]:
+        """Fill the generation parameters that were not given with the model defaults."""
         for parameter in [
             "max_new_tokens",
             "num_return_sequences",
@@ -105,157 +281,486 @@ class HFLocalModel(LanguageModel):
             if parameter not in kwargs:
                 kwargs[parameter] = getattr(self, parameter)
 
-        json = kwargs.pop("json", self.json)
+        return kwargs
 
-        stop_strings = kwargs.pop("stop_strings", None)
-        assert not (json and stop_strings), (
-            "stop_strings and json cannot be used together. "
-            "Please use one or the other."
-        )
+    def _pop_json_mode(self, kwargs: dict[str, Any]) -> tuple[bool, dict | None]:
+        """Pop the JSON mode arguments from the sampling arguments.
 
-        debug = kwargs.pop("debug", self.debug)
+        Returns:
+            Whether to generate JSON, and the schema to constrain the generation to (if any).
+        """
+        json = kwargs.pop("json", self.json)
+        json_format = kwargs.pop("json_format", None)
 
-        if json:
-            prompt = f"{prompt}```json"  #
+        if json_format is None or not self.constrained_json:
+            return json, None
 
-        if debug:
-            print("Prompt:")
-            print("----------------------")
-            print(prompt)
-            print()
+        return True, json_schema(json_format)
 
-        inputs = self.tokenizer(prompt, return_tensors="pt")
+    def _generate(
+        self,
+        prompts: list[str],
+        stop_strings: list[list[str] | None],
+        **kwargs: Any,
+    ) -> list[str]:
+        """Run a single left-padded `generate` call and decode the newly generated tokens only.
 
-        # Seeding
-        if seed is not None:
-            set_transformers_seed(seed)  # sampling tokens generation time
+        Args:
+            prompts: The prompts to complete.
+            stop_strings: The stop strings of each prompt. Each completion is cut right after its first stop string.
+            kwargs: Generation parameters, shared by all prompts.
+                A `json_schema` argument constrains the generation to JSON objects matching it.
+        """
+
+        inputs = self.tokenizer(prompts, return_tensors="pt", padding=True)
+        prompt_length = inputs.input_ids.shape[1]
 
         assert (
-            inputs.input_ids.shape[1] + kwargs["max_new_tokens"]
+            prompt_length + kwargs["max_new_tokens"]
         ) < self.tokenizer.model_max_length, (
             "Prompt too long for the model. Please reduce the number of tokens."
         )
 
+        schema = kwargs.pop("json_schema", None)
+        if schema is not None:
+            if self._vocabulary is None:
+                self._vocabulary = TokenVocabulary(self.tokenizer)
+            kwargs["logits_processor"] = LogitsProcessorList(
+                [
+                    *kwargs.get("logits_processor", []),
+                    JSONSchemaLogitsProcessor(self._vocabulary, schema, prompt_length),
+                ]
+            )
+
+        stopping_criteria = StoppingCriteriaList(kwargs.pop("stopping_criteria", []))
+        if all(stops == stop_strings[0] for stops in stop_strings):
+            # Shared stop strings are natively supported by `generate`
+            kwargs["stop_strings"] = stop_strings[0]
+            kwargs["tokenizer"] = self.tokenizer
+        else:
+            stopping_criteria.append(
+                _PerRowStopStrings(self.tokenizer, stop_strings, prompt_length)
+            )
+        if stopping_criteria:
+            kwargs["stopping_criteria"] = stopping_criteria
+
+        # Assisted generation only supports single sequences. The JSON schema processor
+        # tracks one state per generated token, which rejected draft tokens would corrupt.
+        assisted = (
+            self.draft_model is not None
+            and len(prompts) == 1
+            and kwargs["num_return_sequences"] == 1
+            and schema is None
+        )
+        # Forward pass counts before generation, to measure the assisted rounds
+        forward_passes = dict(self._forward_passes)
+        if assisted:
+            kwargs["assistant_model"] = self.draft_model
+            if self._draft_tokenizer is not None:
+                kwargs["tokenizer"] = self.tokenizer
+                kwargs["assistant_tokenizer"] = self._draft_tokenizer
+        elif (
+            self.prefix_cache is not None
+            and len(prompts) == 1
+            and kwargs["num_return_sequences"] == 1
+        ):
+            kwargs["past_key_values"] = self._prefill_cached_prefix(inputs.input_ids)
+
+        start = time.perf_counter()
         with torch.no_grad():
             outputs = self.model.generate(
-                inputs.input_ids.to("cuda"),
-                attention_mask=inputs.attention_mask,
-                # num_return_sequences=self.num_return_sequences,
-                # temperature=self.temperature,
-                # top_k=self.top_k,
-                # top_p=self.top_p,
-                # do_sample=self.do_sample,
-                stop_strings=(["```"] if json else stop_strings),
-                tokenizer=self.tokenizer,
+                inputs.input_ids.to(self.model.device),
+                attention_mask=inputs.attention_mask.to(self.model.device),
+                pad_token_id=self.tokenizer.pad_token_id,
                 **kwargs,
             )
 
-        generated_text = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
+        elapsed = time.perf_counter() - start
+        self.generation_time += elapsed
+        new_tokens = outputs[:, prompt_length:]
+        generated_tokens = int((new_tokens != self.tokenizer.pad_token_id).sum().item())
+        self.generated_tokens += generated_tokens
+
+        if assisted:
+            # Each round adds the accepted drafted tokens, and one token from the main model
+            rounds = self._forward_passes["main"] - forward_passes["main"]
+            stats = self.assisted_stats
+            stats.calls += 1
+            stats.rounds += rounds
+            stats.drafted_tokens += (
+                self._forward_passes["draft"] - forward_passes["draft"]
+            )
+            stats.accepted_tokens += max(new_tokens.shape[1] - rounds, 0)
+            stats.generated_tokens += generated_tokens
+            stats.generation_time += elapsed
 
-        if debug:
-            print("Response:")
-            print("---------------------")
-            print(generated_text[len(prompt) :])
-            print()
+        generated_texts = self.tokenizer.batch_decode(
+            new_tokens, skip_special_tokens=True
+        )
 
-        return generated_text
+        return [
+            _cut_after_stop_string(text, stops)
+            for text, stops in zip(generated_texts, stop_strings)
+        ]
 
+    @property
+    def tokens_per_second(self) -> float:
+        """Average generation throughput since the model was loaded."""
+        return (
+            self.generated_tokens / self.generation_time
+            if self.generation_time
+            else 0.0
+        )
 
-# TODO Check if async really needed here?
-# If no, then make a single model class to handle both cases
-# If Yes, make a superclass that both classes will inherit from
-class BatchedHFLocalModel(AsyncLanguageModel):
-    """HuggingFace's local-running model wrapper, in a batched async-compatible version."""
+    def _prefill_cached_prefix(self, input_ids: torch.Tensor) -> Any:
+        """Compute the attention states of the longest block-aligned prefix of a single prompt,
+        reusing the longest prefix found in the cache, and cache the result.
 
-    def __init__(
-        self,
-        *,
-        max_length: int = 50,
-        num_return_sequences: int = 1,
-        temperature: float = 0.7,
-        top_p: float = 0.9,
-        do_sample: bool = True,
-        quantization: Literal["4_bits"] | None = None,
-        json: bool = False,
-    ):
-        """Initialize a HuggingFace model.
-
-        Args:
-            model_name: Mistral model name.
-            max_length: Maximum token length of the generated text.
-            num_return_sequences: Number of generated sentences.
-            temperature: Sampling temperature.
-            top_p: Top-p sampling ratio.
-            do_sample: Whether to sample or not.
-            json: Whether to enforce JSON generation.
+        Returns:
+            The `past_key_values` of the prefix, or None if the prompt is shorter than a block.
         """
+        assert self.prefix_cache is not None
 
-        self.model_name = "mistralai/Mistral-7B-Instruct-v0.2"
-        self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+        ids = input_ids[0].tolist()
+        cached_length, past_key_values = self.prefix_cache.lookup(ids)
 
-        self.model = AutoModelForCausalLM.from_pretrained(
-            self.model_name,
-            device_map="auto",
-            quantization_config=QUANTIZATION_CONFIG[quantization],
+        # Leave at least one prompt token for `generate` to compute the first logits from
+        block_size = self.prefix_cache.block_size
+        prefix_length = (len(ids) - 1) // block_size * block_size
+
+        if prefix_length > cached_length:
+            with torch.no_grad():
+                past_key_values = self.model(
+                    input_ids[:, cached_length:prefix_length].to(self.model.device),
+                    past_key_values=past_key_values,
+                    use_cache=True,
+                ).past_key_values
+            self.prefix_cache.store(ids[:prefix_length], past_key_values)
+        elif prefix_length == 0:
+            return None
+        elif prefix_length < cached_length:
+            # The whole prompt was cached
+            past_key_values.crop(prefix_length - cached_length)
+
+        return past_key_values
+
+
+class HFLocalModel(HFLocalBase, LanguageModel):
+    """HuggingFace's local-running model wrapper"""
+
+    @override
+    def sample(self, prompt: str, seed: int | None = None, **kwargs: Any) -> str:
+        return self.sample_batch([prompt], seed=seed, **kwargs)[0]
+
+    @override
+    def sample_many(
+        self, prompts: list[str], seed: int | None = None, **kwargs: Any
+    ) -> list[str]:
+        """Generate texts for independent prompts, in padded `generate` calls
+        bounded by the `max_batch_tokens` budget."""
+        if not prompts:
+            return []
+
+        max_new_tokens = kwargs.get("max_new_tokens", self.max_new_tokens)
+        texts: list[str] = [""] * len(prompts)
+
+        for batch in self.token_budget_batches(prompts, max_new_tokens):
+            batch_texts = self.sample_batch(
+                [prompts[i] for i in batch], seed=seed, **kwargs
+            )
+            for i, text in zip(batch, batch_texts):
+                texts[i] = text
+
+        return texts
+
+    def sample_batch(
+        self, prompts: list[str], seed: int | None = None, **kwargs: Any
+    ) -> list[str]:
+        """Generate texts for several prompts in a single padded `generate` call.
+        All prompts share the same generation parameters.
+
+        Like `sample`, each returned text is the prompt followed by its completion."""
+        kwargs = self._with_default_parameters(kwargs)
+
+        json, schema = self._pop_json_mode(kwargs)
+
+        stop_strings = kwargs.pop("stop_strings", None)
+        assert not (json and stop_strings), (
+            "stop_strings and json cannot be used together. "
+            "Please use one or the other."
         )
 
-        # Parameters
-        self.max_length = max_length
-        self.num_return_sequences = num_return_sequences
-        self.temperature = temperature
-        self.top_p = top_p
-        self.do_sample = do_sample
-        self.json = json
+        debug = kwargs.pop("debug", self.debug)
+
+        if json:
+            prompts = [f"{prompt}```json" for prompt in prompts]
+
+        if debug:
+            for prompt in prompts:
+                print("Prompt:")
+                print("----------------------")
+                print(prompt)
+                print()
+
+        # Seeding
+        if seed is not None:
+            set_transformers_seed(seed)  # sampling tokens generation time
+
+        if schema is not None:
+            # Constrained generation ends right after the JSON object
+            generated_texts = [
+                f"{text}\n```"
+                for text in self._generate(
+                    prompts, [None] * len(prompts), json_schema=schema, **kwargs
+                )
+            ]
+        else:
+            generated_texts = self._generate(
+                prompts,
+                [["```"] if json else stop_strings] * len(prompts),
+                **kwargs,
+            )
+
+        if debug:
+            for generated_text in generated_texts:
+                print("Response:")
+                print("---------------------")
+                print(generated_text)
+                print()
+
+        return [
+            f"{prompt}{generated_text}"
+            for prompt, generated_text in zip(prompts, generated_texts)
+        ]
+
+    @override
+    def sample_stream(
+        self, prompt: str, seed: int | None = None, **kwargs: Any
+    ) -> Iterator[str]:
+        """Generate the completion of the given prompt as a stream of text chunks.
+
+        Unlike `sample`, the prompt is not repeated: in JSON mode, the stream starts with
+        the "```json" prefix that was forced into the prompt.
+        Closing the stream stops the generation at the next token."""
+        kwargs = self._with_default_parameters(kwargs)
+        kwargs["num_return_sequences"] = 1
+        kwargs.pop("debug", None)
+
+        json, schema = self._pop_json_mode(kwargs)
+        stop_strings = kwargs.pop("stop_strings", None)
+        assert not (json and stop_strings), (
+            "stop_strings and json cannot be used together. "
+            "Please use one or the other."
+        )
+
+        if json:
+            prompt = f"{prompt}```json"
+            stop_strings = None if schema is not None else ["```"]
+            kwargs["json_schema"] = schema
+            yield "```json"
+
+        # Seeding
+        if seed is not None:
+            set_transformers_seed(seed)  # sampling tokens generation time
+
+        streamer = TextIteratorStreamer(
+            self.tokenizer, skip_prompt=True, skip_special_tokens=True
+        )
+        stop = threading.Event()
+        errors: list[BaseException] = []
+
+        def generate() -> None:
+            try:
+                self._generate(
+                    [prompt],
+                    [stop_strings],
+                    streamer=streamer,
+                    stopping_criteria=[_StopWhenSet(stop)],
+                    **kwargs,
+                )
+            except BaseException as e:
+                errors.append(e)
+                streamer.end()
+
+        thread = threading.Thread(target=generate, daemon=True)
+        thread.start()
+
+        completion = ""
+        try:
+            for chunk in streamer:
+                text = _cut_after_stop_string(completion + chunk, stop_strings)
+                if text[len(completion) :]:
+                    yield text[len(completion) :]
+                completion = text
+                if stop_strings and any(stop in completion for stop in stop_strings):
+                    break
+        finally:
+            stop.set()
+            thread.join()
+
+        if errors:
+            raise errors[0]
+
+        if schema is not None:
+            yield "\n```"
+
+
+class BatchedHFLocalModel(HFLocalBase, AsyncLanguageModel):
+    """HuggingFace's local-running model wrapper, in a batched async-compatible version.
+
+    Prompts are sorted by length and split into batches bounded by a token budget,
+    each batch being served by a single left-padded `generate` call."""
 
     @override
     async def sample(
         self, prompts: list[str], seed: int | None = None, **kwargs: Any
     ) -> list[str]:
-        preprompt = JSON_FEW_SHOT_PREPROMPT if self.json else FEW_SHOT_PREPROMPT
-        postprompt = "Assistant:```json" if self.json else "Assistant: "
+        """Generate the completions of the given prompts.
+
+        The `stop_strings` argument is either a list of stop strings shared by all prompts,
+        or a list with one list of stop strings (or None) per prompt.
+        In JSON mode, completions start with the "```json" prefix that was forced into the prompt.
+        """
+        if not prompts:
+            return []
 
-        prompts = [f"{preprompt}{prompt}{postprompt}" for prompt in prompts]
+        kwargs = self._with_default_parameters(kwargs)
+        json, schema = self._pop_json_mode(kwargs)
+        debug = kwargs.pop("debug", self.debug)
+
+        stop_strings = kwargs.pop("stop_strings", None)
+        assert not (json and stop_strings), (
+            "stop_strings and json cannot be used together. "
+            "Please use one or the other."
+        )
 
-        inputs = self.tokenizer(prompts, return_tensors="pt")
+        per_prompt_stop_strings: list[list[str] | None]
+        if json:
+            prompts = [f"{prompt}```json" for prompt in prompts]
+            per_prompt_stop_strings = [None if schema else ["```"]] * len(prompts)
+            kwargs["json_schema"] = schema
+        elif stop_strings and not isinstance(stop_strings[0], str):
+            assert len(stop_strings) == len(
+                prompts
+            ), "Per-prompt stop strings must match the number of prompts."
+            per_prompt_stop_strings = stop_strings
+        else:
+            per_prompt_stop_strings = [stop_strings] * len(prompts)
 
         # Seeding
         if seed is not None:
             set_transformers_seed(seed)  # sampling tokens generation time
 
-        with torch.no_grad():
-            outputs = self.model.generate(
-                inputs.input_ids.to("cuda"),
-                attention_mask=inputs.attention_mask,
-                max_length=self.max_length,
-                num_return_sequences=self.num_return_sequences,
-                temperature=self.temperature,
-                top_p=self.top_p,
-                do_sample=self.do_sample,
-                pad_token_id=self.pad_token_id,
-                # Stop conditions
-                stop_strings=["```"] if self.json else ["User:"],
-                tokenizer=self.tokenizer,
-                max_new_tokens=self.max_length,
+        completions: list[str] = [""] * len(prompts)
+
+        for batch in self.token_budget_batches(prompts, kwargs["max_new_tokens"]):
+            # Generation is blocking: run it in a thread to keep the event loop responsive
+            texts = await asyncio.to_thread(
+                self._generate,
+                [prompts[i] for i in batch],
+                [per_prompt_stop_strings[i] for i in batch],
+                **kwargs.copy(),
             )
+            for i, text in zip(batch, texts):
+                completions[i] = text
 
-        generated_texts = [
-            self.tokenizer.decode(output, skip_special_tokens=True)
-            for output in outputs
-        ]
+        if debug:
+            for prompt, completion in zip(prompts, completions):
+                print("Prompt:")
+                print("----------------------")
+                print(prompt)
+                print()
+                print("Response:")
+                print("---------------------")
+                print(completion)
+                print()
+
+        if schema is not None:
+            return [f"```json{completion}\n```" for completion in completions]
+        if json:
+            return [f"```json{completion}" for completion in completions]
 
-        return generated_texts
+        return completions
 
 
-# Quantization configs
-from transformers import BitsAndBytesConfig  # noqa: E402
+class _StopWhenSet(StoppingCriteria):
+    """Stop the generation once an event is set (e.g. when a stream is closed)."""
+
+    def __init__(self, event: threading.Event):
+        self.event = event
+
+    def __call__(
+        self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs: Any
+    ) -> torch.BoolTensor:
+        return torch.full(  # type: ignore
+            (input_ids.shape[0],),
+            self.event.is_set(),
+            dtype=torch.bool,
+            device=input_ids.device,
+        )
+
+
+class _PerRowStopStrings(StoppingCriteria):
+    """Stop each sequence of a batch on its own stop strings."""
+
+    def __init__(
+        self, tokenizer: Any, stop_strings: list[list[str] | None], prompt_length: int
+    ):
+        self.tokenizer = tokenizer
+        self.stop_strings = stop_strings
+        self.prompt_length = prompt_length
+        # Tokens are at least one character long: this many tokens cover any stop string
+        self.window = max(
+            (len(stop) for stops in stop_strings if stops for stop in stops), default=0
+        )
+
+    def __call__(
+        self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs: Any
+    ) -> torch.BoolTensor:
+        done = torch.zeros(
+            input_ids.shape[0], dtype=torch.bool, device=input_ids.device
+        )
+
+        for row, stops in enumerate(self.stop_strings):
+            if not stops:
+                continue
+            tail = self.tokenizer.decode(
+                input_ids[row, self.prompt_length :][-self.window :],
+                skip_special_tokens=True,
+            )
+            done[row] = any(stop in tail for stop in stops)
+
+        return done  # type: ignore
+
+
+def _cut_after_stop_string(text: str, stop_strings: list[str] | None) -> str:
+    """Cut a text right after the first occurrence of any of the stop strings."""
+
+    if not stop_strings:
+        return text
+
+    ends = [text.find(stop) + len(stop) for stop in stop_strings if stop in text]
+
+    return text[: min(ends)] if ends else text
+
+
+# Quantization configs, built on first use
+def quantization_config(quantization: Literal["4_bits"] | None) -> Any:
+    """Return the BitsAndBytes config of a quantization level (None for no quantization)."""
+
+    if quantization is None:
+        return None
+
+    from transformers import BitsAndBytesConfig
+
+    # 4 bit precision
+    return BitsAndBytesConfig(
+        load_in_4bit=True,
+        bnb_4bit_quant_type="nf4",
+        bnb_4bit_use_double_quant=True,
+        bnb_4bit_compute_dtype=torch.float16,  # bfloat16 Not supported in RTX 8000
+    )
 
-# 4 bit precision
-config_4bits = BitsAndBytesConfig(
-    load_in_4bit=True,
-    bnb_4bit_quant_type="nf4",
-    bnb_4bit_use_double_quant=True,
-    bnb_4bit_compute_dtype=torch.float16,  # bfloat16 Not supported in RTX 8000
-)
 
 # https://huggingface.co/blog/4bit-transformers-bitsandbytes
 # "A rule of thumb is:
@@ -283,9 +788,3 @@ config_4bits = BitsAndBytesConfig(
 # https://huggingface.co/docs/transformers/main/en/quantization/bitsandbytes?bnb=4-bit
 # "Quantize a model by passing a BitsAndBytesConfig to from_pretrained().
 # This works for any model in any modality, as long as it supports Accelerate and contains torch.nn.Linear layers."
-
-
-QUANTIZATION_CONFIG = {
-    None: None,
-    "4_bits": config_4bits,
-}
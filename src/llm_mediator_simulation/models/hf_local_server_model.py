@@ -1,31 +1,44 @@
 """Mistral local model running as a server wrapper"""
 
+import asyncio
+import weakref
 from typing import Any, override
 
 import httpx
 
-from llm_mediator_simulation.models.language_model import LanguageModel
+from llm_mediator_simulation.models.language_model import (
+    AsyncLanguageModel,
+    LanguageModel,
+)
 
+SERVER_NOT_RUNNING = "Local server not running."
 
-class HFLocalServerModel(LanguageModel):
-    """Mistral local model running as a server wrapper
-    (to avoid reloading weights before each new debate)."""
 
-    def __init__(self, *, port: int = 8000, **kwargs: Any) -> None:
-        """Initialize a Mistral local model.
+class _HFLocalServerClient:
+    """Request building shared by the local server model wrappers.
 
-        Args:
-            port: The port on which the local server is running.
-            kwargs: Additional arguments for the model.
-        """
+    Public attributes set from the constructor kwargs are forwarded to the server
+    as generation parameters. Client settings are excluded."""
+
+    _client_settings = ["port", "timeout"]
 
+    def __init__(self, *, port: int = 8000, timeout: float = 80, **kwargs: Any):
         self.port = port
+        self.timeout = timeout
         for key, value in kwargs.items():
             setattr(self, key, value)
 
-    @override
-    def sample(self, prompt: str, seed: int | None = None, **kwargs: Any) -> str:
-        """Generate text based on the given prompt."""
+    @property
+    def _url(self) -> str:
+        return f"http://localhost:{self.port}/call"
+
+    @property
+    def _batch_url(self) -> str:
+        return f"http://localhost:{self.port}/call_batch"
+
+    def _request_data(
+        self, prompt: str, seed: int | None, kwargs: dict[str, Any]
+    ) -> dict[str, Any]:
         data = {
             "text": prompt,
             "seed": seed,
@@ -37,16 +50,162 @@ class HFLocalServerModel(LanguageModel):
 
         # get all parameters from self
         for parameter in self.__dict__.keys():
-            if parameter not in ["port"] and parameter not in kwargs:
+            if (
+                parameter not in self._client_settings
+                and not parameter.startswith("_")
+                and parameter not in kwargs
+            ):
                 data[parameter] = getattr(self, parameter)
 
+        return data
+
+
+class HFLocalServerModel(_HFLocalServerClient, LanguageModel):
+    """Mistral local model running as a server wrapper
+    (to avoid reloading weights before each new debate).
+
+    The connection to the server is kept alive between calls."""
+
+    def __init__(self, *, port: int = 8000, timeout: float = 80, **kwargs: Any) -> None:
+        """Initialize a Mistral local model.
+
+        Args:
+            port: The port on which the local server is running.
+            timeout: The timeout of each request, in seconds.
+            kwargs: Additional arguments for the model.
+        """
+
+        super().__init__(port=port, timeout=timeout, **kwargs)
+        self._client = httpx.Client(timeout=timeout)
+
+    @override
+    def sample(self, prompt: str, seed: int | None = None, **kwargs: Any) -> str:
+        """Generate text based on the given prompt."""
+
         try:
-            response = httpx.post(
-                f"http://localhost:{self.port}/call",
-                json=data,  # {"text": prompt, "seed": seed},
-                timeout=80,
+            response = self._client.post(
+                self._url, json=self._request_data(prompt, seed, kwargs)
             )
         except httpx.ConnectError:
-            return "Local server not running."
+            return SERVER_NOT_RUNNING
 
         return response.text
+
+    @override
+    def sample_many(
+        self, prompts: list[str], seed: int | None = None, **kwargs: Any
+    ) -> list[str]:
+        """Generate texts for independent prompts with a single request,
+        batched by the server."""
+
+        if not prompts:
+            return []
+
+        data = self._request_data("", seed, kwargs)
+        del data["text"]
+        data["texts"] = prompts
+
+        try:
+            # The server generates the whole batch before answering
+            response = self._client.post(
+                self._batch_url, json=data, timeout=self.timeout * len(prompts)
+            )
+        except httpx.ConnectError:
+            return [SERVER_NOT_RUNNING] * len(prompts)
+
+        return response.json()
+
+    def close(self) -> None:
+        """Close the pooled connections to the server."""
+        self._client.close()
+
+
+class AsyncHFLocalServerModel(_HFLocalServerClient, AsyncLanguageModel):
+    """Mistral local model running as a server wrapper, in an async-compatible version.
+
+    Requests share a pool of keep-alive connections, and at most `max_concurrency`
+    of them are in flight at the same time."""
+
+    _client_settings = ["port", "timeout", "max_concurrency"]
+
+    def __init__(
+        self,
+        *,
+        port: int = 8000,
+        timeout: float = 80,
+        max_concurrency: int = 8,
+        **kwargs: Any,
+    ) -> None:
+        """Initialize an async Mistral local model.
+
+        Args:
+            port: The port on which the local server is running.
+            timeout: The timeout of each request, in seconds.
+            max_concurrency: The maximum number of concurrent requests to the server.
+            kwargs: Additional arguments for the model.
+        """
+
+        assert max_concurrency >= 1, "max_concurrency must be at least 1."
+
+        super().__init__(port=port, timeout=timeout, **kwargs)
+        self.max_concurrency = max_concurrency
+
+        # Async clients and semaphores are bound to the event loop they are first used in:
+        # each loop gets its own pool, dropped with the loop
+        self._pools: weakref.WeakKeyDictionary[
+            asyncio.AbstractEventLoop, tuple[httpx.AsyncClient, asyncio.Semaphore]
+        ] = weakref.WeakKeyDictionary()
+
+    @override
+    async def sample(
+        self, prompts: list[str], seed: int | None = None, **kwargs: Any
+    ) -> list[str]:
+        """Generate texts based on the given prompts, concurrently."""
+
+        return list(
+            await asyncio.gather(
+                *(self._sample_one(prompt, seed, kwargs) for prompt in prompts)
+            )
+        )
+
+    async def _sample_one(
+        self, prompt: str, seed: int | None, kwargs: dict[str, Any]
+    ) -> str:
+        client, semaphore = self._pool()
+        data = self._request_data(prompt, seed, kwargs)
+
+        async with semaphore:
+            try:
+                response = await client.post(self._url, json=data)
+            except httpx.ConnectError:
+                return SERVER_NOT_RUNNING
+
+        return response.text
+
+    def _pool(self) -> tuple[httpx.AsyncClient, asyncio.Semaphore]:
+        """Return the connection pool and concurrency limit of the running event loop."""
+
+        loop = asyncio.get_running_loop()
+        pool = self._pools.get(loop)
+        if pool is None:
+            client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_concurrency,
+                    max_keepalive_connections=self.max_concurrency,
+                ),
+            )
+            pool = self._pools[loop] = (
+                client,
+                asyncio.Semaphore(self.max_concurrency),
+            )
+
+        return pool
+
+    async def aclose(self) -> None:
+        """Close the pooled connections of the running event loop.
+        Connections can only be closed from the loop that opened them."""
+
+        pool = self._pools.pop(asyncio.get_running_loop(), None)
+        if pool is not None:
+            await pool[0].aclose()
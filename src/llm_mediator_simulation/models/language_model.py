@@ -1,22 +1,134 @@
 """Abstract base class for language models."""
 
+import contextvars
 from abc import ABC, abstractmethod
-from typing import Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Iterator
+
+from llm_mediator_simulation.utils.json import (
+    json_schema,
+    parse_llm_json,
+    parse_llm_json_stream,
+    validate_json_schema,
+)
 
 
 class LanguageModel(ABC):
     """Abstract base class for language models."""
 
+    @property
+    def structured_output(self) -> bool:
+        """Whether `sample_json` is enforced by the backend, instead of parsed from free text."""
+        return False
+
+    # Maximum number of concurrent `sample` calls of the default `sample_many`
+    max_parallel_calls: int = 8
+
     @abstractmethod
     def sample(self, prompt: str, seed: int | None = None, **kwargs: Any) -> str:
         """Generate text based on the given prompt."""
 
+    def sample_many(
+        self, prompts: list[str], seed: int | None = None, **kwargs: Any
+    ) -> list[str]:
+        """Generate texts for independent prompts, returned in the order of the prompts.
+
+        Defaults to concurrent `sample` calls from a thread pool, for backends that serve
+        concurrent requests (remote APIs, model servers). Backends that batch prompts override it.
+        """
+
+        workers = min(self.max_parallel_calls, len(prompts))
+        if workers <= 1:
+            return [self.sample(prompt, seed, **kwargs) for prompt in prompts]
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # Each call runs in a copy of the caller context (e.g. its call purpose)
+            futures = [
+                executor.submit(
+                    contextvars.copy_context().run, self.sample, prompt, seed, **kwargs
+                )
+                for prompt in prompts
+            ]
+            return [future.result() for future in futures]
+
+    def sample_stream(
+        self, prompt: str, seed: int | None = None, **kwargs: Any
+    ) -> Iterator[str]:
+        """Generate text based on the given prompt, as a stream of text chunks.
+        Closing the iterator early stops the generation, if the backend supports it.
+
+        Defaults to a single chunk with the whole `sample` response."""
+        yield self.sample(prompt, seed, **kwargs)
+
+    def sample_json(
+        self,
+        prompt: str,
+        json_format: dict[str, str],
+        seed: int | None = None,
+        **kwargs: Any,
+    ) -> dict[str, Any]:
+        """Generate a JSON object answering the given prompt, with the keys and value types
+        of a `json_prompt` format.
+
+        Defaults to parsing the streamed response, which stops as soon as a matching JSON object is complete.
+
+        Throws:
+            ValueError: If the response is not a JSON object matching the format.
+        """
+        schema = json_schema(json_format)
+        data, _ = parse_llm_json_stream(
+            self.sample_stream(prompt, seed, json_format=json_format, **kwargs),
+            schema=schema,
+        )
+        if not validate_json_schema(data, schema):
+            raise ValueError("JSON response does not match the expected format.")
+        return data
+
 
 class AsyncLanguageModel(ABC):
     """Abstract base class for async language models."""
 
+    @property
+    def structured_output(self) -> bool:
+        """Whether `sample_json` is enforced by the backend, instead of parsed from free text."""
+        return False
+
     @abstractmethod
     async def sample(
         self, prompts: list[str], seed: int | None = None, **kwargs: Any
     ) -> list[str]:
         """Generate texts based on the given prompts."""
+
+    async def sample_stream(
+        self, prompt: str, seed: int | None = None, **kwargs: Any
+    ) -> AsyncIterator[str]:
+        """Generate text based on the given prompt, as an async stream of text chunks.
+        Closing the iterator early stops the generation, if the backend supports it.
+
+        Defaults to a single chunk with the whole `sample` response."""
+        yield (await self.sample([prompt], seed, **kwargs))[0]
+
+    async def sample_json(
+        self,
+        prompts: list[str],
+        json_format: dict[str, str],
+        seed: int | None = None,
+        **kwargs: Any,
+    ) -> list[dict[str, Any] | None]:
+        """Generate JSON objects answering the given prompts, with the keys and value types
+        of a `json_prompt` format. Responses that do not match the format are None.
+
+        Defaults to parsing the `sample` responses."""
+        responses = await self.sample(prompts, seed, json_format=json_format, **kwargs)
+        schema = json_schema(json_format)
+        return [parse_json_response(response, schema) for response in responses]
+
+
+def parse_json_response(response: str, schema: dict) -> dict[str, Any] | None:
+    """Parse a LLM JSON response, or return None if it does not match the schema."""
+
+    try:
+        data = parse_llm_json(response)
+    except ValueError:  # Includes JSON decoding errors
+        return None
+    return data if validate_json_schema(data, schema) else None
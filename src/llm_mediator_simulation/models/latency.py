@@ -0,0 +1,41 @@
+"""Per-call latency statistics of model backends."""
+
+import threading
+from collections import deque
+
+
+class LatencyStats:
+    """Per-call latency statistics, over a window of the most recent calls."""
+
+    def __init__(self, window: int = 1000) -> None:
+        self.calls = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self._latencies: deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, latency: float, error: bool = False) -> None:
+        with self._lock:
+            self.calls += 1
+            self.errors += error
+            self.total_time += latency
+            self._latencies.append(latency)
+
+    def summary(self) -> dict[str, float]:
+        """Call count, error count, and mean, median, 95th percentile and max latencies (in seconds)."""
+
+        with self._lock:
+            latencies = sorted(self._latencies)
+            calls, errors, total_time = self.calls, self.errors, self.total_time
+
+        if not latencies:
+            return {"calls": calls, "errors": errors}
+
+        return {
+            "calls": calls,
+            "errors": errors,
+            "mean": total_time / calls,
+            "p50": latencies[len(latencies) // 2],
+            "p95": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+            "max": latencies[-1],
+        }
@@ -42,6 +42,9 @@ User:"""
 class MistralLocalModel(LanguageModel):
     """Mistral local-running model wrapper"""
 
+    # Concurrent `generate` calls on the same weights would only compete for the GPU
+    max_parallel_calls = 1
+
     def __init__(
         self,
         *,
@@ -79,7 +82,7 @@ class MistralLocalModel(LanguageModel):
         self.model = AutoModelForCausalLM.from_pretrained(
             self.model_name,
             device_map="auto",
-            quantization_config=QUANTIZATION_CONFIG[quantization],
+            quantization_config=quantization_config(quantization),
         )
 
         # Parameters
@@ -172,7 +175,7 @@ class BatchedMistralLocalModel(AsyncLanguageModel):
         self.model = AutoModelForCausalLM.from_pretrained(
             self.model_name,
             device_map="auto",
-            quantization_config=QUANTIZATION_CONFIG[quantization],
+            quantization_config=quantization_config(quantization),
         )
 
         # Parameters
@@ -222,18 +225,19 @@ class BatchedMistralLocalModel(AsyncLanguageModel):
         return generated_texts
 
 
-# Quantization configs
-from transformers import BitsAndBytesConfig  # noqa: E402
+# Quantization configs, built on first use
+def quantization_config(quantization: Literal["4_bits"] | None) -> Any:
+    """Return the BitsAndBytes config of a quantization level (None for no quantization)."""
 
-# 4 bit precision
-config_4bits = BitsAndBytesConfig(
-    load_in_4bit=True,
-    bnb_4bit_quant_type="nf4",
-    bnb_4bit_use_double_quant=True,
-    bnb_4bit_compute_dtype=torch.bfloat16,
-)
+    if quantization is None:
+        return None
 
-QUANTIZATION_CONFIG = {
-    None: None,
-    "4_bits": config_4bits,
-}
+    from transformers import BitsAndBytesConfig
+
+    # 4 bit precision
+    return BitsAndBytesConfig(
+        load_in_4bit=True,
+        bnb_4bit_quant_type="nf4",
+        bnb_4bit_use_double_quant=True,
+        bnb_4bit_compute_dtype=torch.bfloat16,
+    )
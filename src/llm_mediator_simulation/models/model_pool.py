@@ -0,0 +1,384 @@
+"""Load-balanced pools of local model server replicas (see `scripts/hf_server.py`)."""
+
+import asyncio
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, override
+
+import httpx
+
+from llm_mediator_simulation.models.hf_local_server_model import (
+    SERVER_NOT_RUNNING,
+    _HFLocalServerClient,
+)
+from llm_mediator_simulation.models.language_model import (
+    AsyncLanguageModel,
+    LanguageModel,
+)
+
+
+@dataclass(eq=False)
+class Replica:
+    """Routing state of a model server replica.
+
+    Attributes:
+        url: The base URL of the server.
+        outstanding: The number of requests in flight.
+        healthy: Whether the replica receives requests. Unhealthy replicas are ejected
+            until a health check succeeds.
+        next_check: When to check the health of an ejected replica again (monotonic time).
+        requests: The number of requests sent to the replica.
+        failures: The number of failed requests.
+    """
+
+    url: str
+    outstanding: int = 0
+    healthy: bool = True
+    next_check: float = 0.0
+    requests: int = 0
+    failures: int = 0
+
+
+class _ModelPoolBase(_HFLocalServerClient):
+    """Least-outstanding-requests routing over server replicas, shared by the pool wrappers.
+
+    Public attributes set from the constructor kwargs are forwarded to the servers
+    as generation parameters, like with `HFLocalServerModel`."""
+
+    _client_settings = [
+        "urls",
+        "timeout",
+        "max_concurrency_per_replica",
+        "health_check_interval",
+        "replicas",
+        "port",
+        "max_parallel_calls",
+    ]
+
+    def __init__(
+        self,
+        *,
+        urls: list[str],
+        timeout: float = 80,
+        max_concurrency_per_replica: int = 4,
+        health_check_interval: float = 10,
+        **kwargs: Any,
+    ) -> None:
+        assert urls, "At least one replica URL is required."
+        assert (
+            max_concurrency_per_replica >= 1
+        ), "max_concurrency_per_replica must be at least 1."
+
+        super().__init__(timeout=timeout, **kwargs)
+        self.urls = [url.rstrip("/") for url in urls]
+        self.max_concurrency_per_replica = max_concurrency_per_replica
+        self.health_check_interval = health_check_interval
+        self.replicas = [Replica(url) for url in self.urls]
+
+        self._lock = threading.Lock()
+
+    def _acquire(self, excluded: list[Replica]) -> Replica | None:
+        """Take a request slot on the healthy replica with the fewest outstanding requests.
+        Returns None if all healthy replicas are at their concurrency cap."""
+
+        with self._lock:
+            candidates = [
+                replica
+                for replica in self.replicas
+                if replica.healthy
+                and replica not in excluded
+                and replica.outstanding < self.max_concurrency_per_replica
+            ]
+            if not candidates:
+                return None
+
+            replica = min(candidates, key=lambda replica: replica.outstanding)
+            replica.outstanding += 1
+            replica.requests += 1
+            return replica
+
+    def _release(self, replica: Replica, failed: bool) -> None:
+        with self._lock:
+            replica.outstanding -= 1
+            if failed:
+                replica.failures += 1
+                self._eject(replica)
+
+    def _eject(self, replica: Replica) -> None:
+        replica.healthy = False
+        replica.next_check = time.monotonic() + self.health_check_interval
+
+    def _due_for_check(self, force: bool = False) -> list[Replica]:
+        """The ejected replicas whose health should be checked again."""
+
+        now = time.monotonic()
+        with self._lock:
+            due = [
+                replica
+                for replica in self.replicas
+                if not replica.healthy and (force or replica.next_check <= now)
+            ]
+            # Other callers wait for the next interval instead of checking in parallel
+            for replica in due:
+                replica.next_check = now + self.health_check_interval
+            return due
+
+    def _record_check(self, replica: Replica, healthy: bool) -> None:
+        with self._lock:
+            if healthy:
+                replica.healthy = True
+            else:
+                self._eject(replica)
+
+    def _available(self, excluded: list[Replica]) -> bool:
+        """Whether a replica may still serve the request, now or once a slot is free."""
+
+        with self._lock:
+            return any(
+                replica.healthy and replica not in excluded for replica in self.replicas
+            )
+
+    @staticmethod
+    def _failed(response: httpx.Response) -> bool:
+        return response.status_code >= 500
+
+    def stats(self) -> list[dict[str, Any]]:
+        """Return the routing state and request counts of each replica."""
+
+        with self._lock:
+            return [
+                {
+                    "url": replica.url,
+                    "healthy": replica.healthy,
+                    "outstanding": replica.outstanding,
+                    "requests": replica.requests,
+                    "failures": replica.failures,
+                }
+                for replica in self.replicas
+            ]
+
+
+class ModelPool(_ModelPoolBase, LanguageModel):
+    """Pool of local model server replicas, as a single model.
+
+    Each request goes to the healthy replica with the fewest requests in flight, and waits
+    if all of them are at `max_concurrency_per_replica`. A replica that fails a request
+    (connection error, timeout or server error) is ejected, and the request is sent to another one.
+    Ejected replicas are re-admitted once their `/` route answers again."""
+
+    def __init__(
+        self,
+        *,
+        urls: list[str],
+        timeout: float = 80,
+        max_concurrency_per_replica: int = 4,
+        health_check_interval: float = 10,
+        **kwargs: Any,
+    ) -> None:
+        """Initialize a model pool.
+
+        Args:
+            urls: The base URLs of the replicas (e.g. "http://localhost:8000").
+            timeout: The timeout of each request, in seconds.
+            max_concurrency_per_replica: The maximum number of concurrent requests to each replica.
+            health_check_interval: How long an ejected replica waits before its next health check, in seconds.
+            kwargs: Additional arguments for the model.
+        """
+
+        super().__init__(
+            urls=urls,
+            timeout=timeout,
+            max_concurrency_per_replica=max_concurrency_per_replica,
+            health_check_interval=health_check_interval,
+            **kwargs,
+        )
+        self._client = httpx.Client(
+            timeout=timeout,
+            limits=httpx.Limits(
+                max_keepalive_connections=len(urls) * max_concurrency_per_replica
+            ),
+        )
+        self._slot_freed = threading.Condition()
+        # Enough concurrent `sample_many` calls to fill every replica
+        self.max_parallel_calls = len(urls) * max_concurrency_per_replica
+
+    @override
+    def sample(self, prompt: str, seed: int | None = None, **kwargs: Any) -> str:
+        """Generate text based on the given prompt, on the least busy replica."""
+
+        data = self._request_data(prompt, seed, kwargs)
+        tried: list[Replica] = []
+
+        while True:
+            self.check_health()
+            with self._slot_freed:
+                replica = self._acquire(tried)
+                if replica is None:
+                    if not self._available(tried):
+                        return SERVER_NOT_RUNNING
+                    # Wait for a slot (or for the next health check)
+                    self._slot_freed.wait(timeout=self.health_check_interval)
+                    continue
+
+            failed = True
+            response: httpx.Response | None = None
+            try:
+                response = self._client.post(f"{replica.url}/call", json=data)
+                failed = self._failed(response)
+            except httpx.TransportError:
+                pass
+            finally:
+                self._release(replica, failed)
+                with self._slot_freed:
+                    self._slot_freed.notify_all()
+
+            if response is not None and not failed:
+                return response.text
+            tried.append(replica)
+
+    def check_health(self, force: bool = False) -> None:
+        """Check the health of the ejected replicas that are due for it (or all of them if forced),
+        and re-admit the ones that answer."""
+
+        for replica in self._due_for_check(force):
+            try:
+                healthy = not self._failed(self._client.get(f"{replica.url}/"))
+            except httpx.TransportError:
+                healthy = False
+            self._record_check(replica, healthy)
+
+    def close(self) -> None:
+        """Close the pooled connections to the replicas."""
+        self._client.close()
+
+
+class AsyncModelPool(_ModelPoolBase, AsyncLanguageModel):
+    """Pool of local model server replicas, as a single async model.
+    See `ModelPool` for the routing and health checks."""
+
+    def __init__(
+        self,
+        *,
+        urls: list[str],
+        timeout: float = 80,
+        max_concurrency_per_replica: int = 4,
+        health_check_interval: float = 10,
+        **kwargs: Any,
+    ) -> None:
+        """Initialize an async model pool.
+
+        Args:
+            urls: The base URLs of the replicas (e.g. "http://localhost:8000").
+            timeout: The timeout of each request, in seconds.
+            max_concurrency_per_replica: The maximum number of concurrent requests to each replica.
+            health_check_interval: How long an ejected replica waits before its next health check, in seconds.
+            kwargs: Additional arguments for the model.
+        """
+
+        super().__init__(
+            urls=urls,
+            timeout=timeout,
+            max_concurrency_per_replica=max_concurrency_per_replica,
+            health_check_interval=health_check_interval,
+            **kwargs,
+        )
+
+        # Async clients and conditions are bound to the event loop they are first used in
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._client: httpx.AsyncClient | None = None
+        self._slot_freed: asyncio.Condition | None = None
+
+    @override
+    async def sample(
+        self, prompts: list[str], seed: int | None = None, **kwargs: Any
+    ) -> list[str]:
+        """Generate texts based on the given prompts, spread over the replicas."""
+
+        return list(
+            await asyncio.gather(
+                *(self._sample_one(prompt, seed, kwargs) for prompt in prompts)
+            )
+        )
+
+    async def _sample_one(
+        self, prompt: str, seed: int | None, kwargs: dict[str, Any]
+    ) -> str:
+        client, slot_freed = self._pool()
+        data = self._request_data(prompt, seed, kwargs)
+        tried: list[Replica] = []
+
+        while True:
+            await self.check_health()
+            async with slot_freed:
+                replica = self._acquire(tried)
+                if replica is None:
+                    if not self._available(tried):
+                        return SERVER_NOT_RUNNING
+                    # Wait for a slot (or for the next health check)
+                    try:
+                        await asyncio.wait_for(
+                            slot_freed.wait(), timeout=self.health_check_interval
+                        )
+                    except TimeoutError:
+                        pass
+                    continue
+
+            failed = True
+            response: httpx.Response | None = None
+            try:
+                response = await client.post(f"{replica.url}/call", json=data)
+                failed = self._failed(response)
+            except httpx.TransportError:
+                pass
+            finally:
+                self._release(replica, failed)
+                async with slot_freed:
+                    slot_freed.notify_all()
+
+            if response is not None and not failed:
+                return response.text
+            tried.append(replica)
+
+    async def check_health(self, force: bool = False) -> None:
+        """Check the health of the ejected replicas that are due for it (or all of them if forced),
+        and re-admit the ones that answer."""
+
+        due = self._due_for_check(force)
+        if not due:
+            return
+
+        client, _ = self._pool()
+
+        async def check(replica: Replica) -> None:
+            try:
+                healthy = not self._failed(await client.get(f"{replica.url}/"))
+            except httpx.TransportError:
+                healthy = False
+            self._record_check(replica, healthy)
+
+        await asyncio.gather(*(check(replica) for replica in due))
+
+    def _pool(self) -> tuple[httpx.AsyncClient, asyncio.Condition]:
+        """Return the connection pool and slot condition of the running event loop."""
+
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._slot_freed is None or self._loop is not loop:
+            self._loop = loop
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_keepalive_connections=len(self.replicas)
+                    * self.max_concurrency_per_replica
+                ),
+            )
+            self._slot_freed = asyncio.Condition()
+
+        return self._client, self._slot_freed
+
+    async def aclose(self) -> None:
+        """Close the pooled connections to the replicas."""
+
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
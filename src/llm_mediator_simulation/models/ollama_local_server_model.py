@@ -5,52 +5,253 @@ likely due to KV Caching https://github.com/huggingface/transformers/issues/2542
 """
 
 import asyncio
-from typing import Any, override
+import json
+import time
+from typing import Any, AsyncGenerator, Generator, cast, override
 
+import httpx
 import ollama
 
 from llm_mediator_simulation.models.language_model import (
     AsyncLanguageModel,
     LanguageModel,
 )
+from llm_mediator_simulation.models.latency import LatencyStats
+from llm_mediator_simulation.utils.json import json_schema
 
 
-class OllamaLocalModel(LanguageModel):
+class _OllamaBase:
+    """Server options and latency statistics shared by the Ollama model wrappers."""
+
+    def __init__(
+        self,
+        *,
+        model_name: str,
+        host: str | None,
+        timeout: float | None,
+        keep_alive: float | str | None,
+        num_ctx: int | None,
+        num_predict: int | None,
+        stop: list[str] | None,
+        warm_up: bool,
+    ) -> None:
+        self.model_name = model_name
+        self.host = host
+        self.timeout = timeout
+        self.keep_alive = keep_alive
+        self.num_ctx = num_ctx
+        self.num_predict = num_predict
+        self.stop = stop
+        self.latency = LatencyStats()
+
+        if warm_up:
+            self.warm_up()
+
+    @property
+    def structured_output(self) -> bool:
+        return True
+
+    def _options(self, seed: int | None) -> dict[str, Any]:
+        options = {
+            "seed": seed,
+            "num_ctx": self.num_ctx,
+            "num_predict": self.num_predict,
+            "stop": self.stop,
+        }
+        return {key: value for key, value in options.items() if value is not None}
+
+    def warm_up(self) -> None:
+        """Load the model in the server memory, so that the first calls do not time out.
+        A server that is not running yet is not an error here."""
+
+        try:
+            # An empty prompt only loads the model
+            ollama.Client(host=self.host, timeout=self.timeout).generate(
+                model=self.model_name, prompt="", keep_alive=self.keep_alive
+            )
+        except (ollama.ResponseError, httpx.HTTPError, ConnectionError) as e:
+            print(f"Ollama warm-up of {self.model_name} failed: {e}")
+
+    def stats(self) -> dict[str, float]:
+        """Return the per-call latency statistics."""
+        return self.latency.summary()
+
+
+class OllamaLocalModel(_OllamaBase, LanguageModel):
     """Ollama local model running as a server wrapper"""
 
-    def __init__(self, *, model_name: str = "deepseek-r1:8b") -> None:
+    def __init__(
+        self,
+        *,
+        model_name: str = "deepseek-r1:8b",
+        host: str | None = None,
+        timeout: float | None = None,
+        keep_alive: float | str | None = "30m",
+        num_ctx: int | None = None,
+        num_predict: int | None = None,
+        stop: list[str] | None = None,
+        warm_up: bool = True,
+    ) -> None:
         """Initialize a Ollama local model.
 
         Args:
             model_name: The model name to use.
+            host: The Ollama server URL (defaults to the `OLLAMA_HOST` environment variable, or the local server).
+            timeout: The timeout of each request, in seconds.
+            keep_alive: How long the server keeps the model loaded after a call (e.g. "30m", or -1 for ever).
+            num_ctx: The context window size, in tokens (defaults to the model configuration).
+            num_predict: The maximum number of generated tokens.
+            stop: Stop sequences.
+            warm_up: Whether to load the model on the server right away.
         """
 
-        self.model_name = model_name
+        self.client = ollama.Client(host=host, timeout=timeout)
+        super().__init__(
+            model_name=model_name,
+            host=host,
+            timeout=timeout,
+            keep_alive=keep_alive,
+            num_ctx=num_ctx,
+            num_predict=num_predict,
+            stop=stop,
+            warm_up=warm_up,
+        )
+
+    def _generate(self, prompt: str, seed: int | None, **kwargs: Any) -> Any:
+        start = time.perf_counter()
+        error = True
+        try:
+            response = self.client.generate(
+                model=self.model_name,
+                prompt=prompt,
+                options=self._options(seed),
+                keep_alive=self.keep_alive,
+                **kwargs,
+            )
+            error = False
+            return response
+        finally:
+            self.latency.record(time.perf_counter() - start, error)
 
     @override
     def sample(self, prompt: str, seed: int | None = None, **kwargs: Any) -> str:
         """Generate text based on the given prompt."""
 
-        response = ollama.generate(
+        return self._generate(prompt, seed).response
+
+    @override
+    def sample_json(
+        self,
+        prompt: str,
+        json_format: dict[str, str],
+        seed: int | None = None,
+        **kwargs: Any,
+    ) -> dict[str, Any]:
+        """Generate a JSON object answering the given prompt.
+        The answer is constrained to the format schema by the server."""
+
+        response = self._generate(prompt, seed, format=json_schema(json_format))
+        return json.loads(response.response)
+
+    @override
+    def sample_stream(
+        self, prompt: str, seed: int | None = None, **kwargs: Any
+    ) -> Generator[str, None, None]:
+        """Generate text based on the given prompt, as a stream of text chunks."""
+
+        for part in self.client.generate(
             model=self.model_name,
             prompt=prompt,
-            options={"seed": seed},
-        )
-        return response.response
+            options=self._options(seed),
+            keep_alive=self.keep_alive,
+            stream=True,
+        ):
+            yield part.response
 
 
-class AsyncOllamaLocalModel(AsyncLanguageModel):
-    """Asynchronous Ollama local model running as a server wrapper"""
+class AsyncOllamaLocalModel(_OllamaBase, AsyncLanguageModel):
+    """Asynchronous Ollama local model running as a server wrapper
 
-    def __init__(self, *, model_name: str = "deepseek-r1:8b") -> None:
+    At most `max_concurrency` requests are sent to the server at the same time,
+    so that large batches queue here instead of timing out in the server queue."""
+
+    def __init__(
+        self,
+        *,
+        model_name: str = "deepseek-r1:8b",
+        host: str | None = None,
+        timeout: float | None = None,
+        max_concurrency: int = 4,
+        keep_alive: float | str | None = "30m",
+        num_ctx: int | None = None,
+        num_predict: int | None = None,
+        stop: list[str] | None = None,
+        warm_up: bool = True,
+    ) -> None:
         """Initialize a Ollama local model.
 
         Args:
             model_name: The model name to use.
+            host: The Ollama server URL (defaults to the `OLLAMA_HOST` environment variable, or the local server).
+            timeout: The timeout of each request, in seconds.
+            max_concurrency: The maximum number of concurrent requests to the server
+                (match it with the server `OLLAMA_NUM_PARALLEL` setting).
+            keep_alive: How long the server keeps the model loaded after a call (e.g. "30m", or -1 for ever).
+            num_ctx: The context window size, in tokens (defaults to the model configuration).
+            num_predict: The maximum number of generated tokens.
+            stop: Stop sequences.
+            warm_up: Whether to load the model on the server right away.
         """
 
-        self.model_name = model_name
-        self.client = ollama.AsyncClient()
+        assert max_concurrency >= 1, "max_concurrency must be at least 1."
+
+        self.max_concurrency = max_concurrency
+
+        # Async clients and semaphores are bound to the event loop they are first used in
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._client: ollama.AsyncClient | None = None
+        self._semaphore: asyncio.Semaphore | None = None
+
+        super().__init__(
+            model_name=model_name,
+            host=host,
+            timeout=timeout,
+            keep_alive=keep_alive,
+            num_ctx=num_ctx,
+            num_predict=num_predict,
+            stop=stop,
+            warm_up=warm_up,
+        )
+
+    def _pool(self) -> tuple[ollama.AsyncClient, asyncio.Semaphore]:
+        """Return the client and concurrency limit of the running event loop."""
+
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._semaphore is None or self._loop is not loop:
+            self._loop = loop
+            self._client = ollama.AsyncClient(host=self.host, timeout=self.timeout)
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        return self._client, self._semaphore
+
+    async def _generate(self, prompt: str, seed: int | None, **kwargs: Any) -> Any:
+        client, semaphore = self._pool()
+
+        async with semaphore:
+            start = time.perf_counter()
+            error = True
+            try:
+                response = await client.generate(
+                    model=self.model_name,
+                    prompt=prompt,
+                    options=self._options(seed),
+                    keep_alive=self.keep_alive,
+                    **kwargs,
+                )
+                error = False
+                return response
+            finally:
+                self.latency.record(time.perf_counter() - start, error)
 
     @override
     async def sample(
@@ -58,13 +259,59 @@ class AsyncOllamaLocalModel(AsyncLanguageModel):
     ) -> list[str]:
         """Generate text based on the given prompt."""
 
-        # Await all completions asynchronously
+        # Await all completions asynchronously, within the concurrency limit
         results = await asyncio.gather(
-            *[
-                self.client.generate(
-                    model=self.model_name, prompt=prompt, options={"seed": seed}
-                )
-                for prompt in prompts
-            ]
+            *[self._generate(prompt, seed) for prompt in prompts]
         )
         return [response.response for response in results]
+
+    @override
+    async def sample_json(
+        self,
+        prompts: list[str],
+        json_format: dict[str, str],
+        seed: int | None = None,
+        **kwargs: Any,
+    ) -> list[dict[str, Any] | None]:
+        """Generate JSON objects answering the given prompts.
+        The answers are constrained to the format schema by the server."""
+
+        schema = json_schema(json_format)
+        results = await asyncio.gather(
+            *[self._generate(prompt, seed, format=schema) for prompt in prompts]
+        )
+
+        objects: list[dict[str, Any] | None] = []
+        for response in results:
+            try:
+                objects.append(json.loads(response.response))
+            except json.JSONDecodeError:  # Truncated answer
+                objects.append(None)
+        return objects
+
+    @override
+    async def sample_stream(
+        self, prompt: str, seed: int | None = None, **kwargs: Any
+    ) -> AsyncGenerator[str, None]:
+        """Generate text based on the given prompt, as a stream of text chunks."""
+
+        client, semaphore = self._pool()
+
+        async with semaphore:
+            # The client streams with an async generator, typed as a plain async iterator
+            stream = cast(
+                AsyncGenerator[ollama.GenerateResponse, None],
+                await client.generate(
+                    model=self.model_name,
+                    prompt=prompt,
+                    options=self._options(seed),
+                    keep_alive=self.keep_alive,
+                    stream=True,
+                ),
+            )
+            try:
+                async for part in stream:
+                    yield part.response
+            finally:
+                # Closing the request stops the generation on the server
+                await stream.aclose()
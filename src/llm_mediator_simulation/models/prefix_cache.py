@@ -0,0 +1,150 @@
+"""LRU cache of key/value attention states for shared prompt prefixes.
+
+Debater prompts share long prefixes (few-shot examples, persona, debate configuration)
+and only differ in their tail. Reusing the attention states of the longest cached prefix
+means that only the remaining suffix has to be prefilled."""
+
+import copy
+import hashlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any
+
+
+@dataclass
+class _CacheEntry:
+    length: int
+    block_hashes: list[str]
+    past_key_values: Any
+
+
+class PrefixKVCache:
+    """LRU cache of `past_key_values` keyed by token-prefix hashes.
+
+    Prefixes are hashed every `block_size` tokens, so that a cached prompt can serve any
+    new prompt that shares at least one of its blocks. Entries are evicted in least recently
+    used order once the total number of cached tokens exceeds `max_tokens`."""
+
+    def __init__(self, *, max_tokens: int = 32_768, block_size: int = 32) -> None:
+        """Initialize the prefix cache.
+
+        Args:
+            max_tokens: The maximum number of cached tokens, summed over all entries. Bounds the cache memory.
+            block_size: The prefix hashing granularity, in tokens.
+        """
+
+        self.max_tokens = max_tokens
+        self.block_size = block_size
+
+        self._entries: OrderedDict[str, _CacheEntry] = OrderedDict()
+        self._index: dict[str, str] = {}  # Block prefix hash -> entry key
+        self._cached_tokens = 0
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.reused_tokens = 0
+
+    def block_hashes(self, input_ids: list[int]) -> list[str]:
+        """Hashes of the prefixes of `input_ids` ending on each full block."""
+
+        hasher = hashlib.sha1()
+        hashes: list[str] = []
+
+        for end in range(self.block_size, len(input_ids) + 1, self.block_size):
+            hasher.update(
+                b"".join(
+                    i.to_bytes(4, "little")
+                    for i in input_ids[end - self.block_size : end]
+                )
+            )
+            hashes.append(hasher.hexdigest())
+
+        return hashes
+
+    def lookup(self, input_ids: list[int]) -> tuple[int, Any]:
+        """Find the longest cached block-aligned prefix of the given tokens.
+
+        Returns:
+            The length of the cached prefix, and a copy of its `past_key_values` (or `(0, None)`).
+        """
+
+        for block, block_hash in reversed(
+            list(enumerate(self.block_hashes(input_ids)))
+        ):
+            key = self._index.get(block_hash)
+            if key is None:
+                continue
+
+            entry = self._entries[key]
+            self._entries.move_to_end(key)
+
+            length = (block + 1) * self.block_size
+            past_key_values = copy.deepcopy(entry.past_key_values)
+            if length < entry.length:
+                past_key_values.crop(length - entry.length)
+
+            self.hits += 1
+            self.reused_tokens += length
+            return length, past_key_values
+
+        self.misses += 1
+        return 0, None
+
+    def store(self, input_ids: list[int], past_key_values: Any) -> None:
+        """Cache a copy of the attention states of a block-aligned prefix."""
+
+        assert (
+            len(input_ids) % self.block_size == 0
+        ), "Only block-aligned prefixes can be cached."
+
+        if not input_ids or len(input_ids) > self.max_tokens:
+            return
+
+        block_hashes = self.block_hashes(input_ids)
+        key = block_hashes[-1]
+
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return
+
+        self._entries[key] = _CacheEntry(
+            len(input_ids), block_hashes, copy.deepcopy(past_key_values)
+        )
+        self._cached_tokens += len(input_ids)
+        for block_hash in block_hashes:
+            self._index[block_hash] = key
+
+        while self._cached_tokens > self.max_tokens:
+            self._evict()
+
+    def _evict(self) -> None:
+        """Evict the least recently used entry."""
+
+        key, entry = self._entries.popitem(last=False)
+        self._cached_tokens -= entry.length
+
+        for block_hash in entry.block_hashes:
+            if self._index.get(block_hash) != key:
+                continue
+            # Point the block to another entry sharing it, if any
+            owner = next(
+                (
+                    other_key
+                    for other_key, other in reversed(self._entries.items())
+                    if block_hash in other.block_hashes
+                ),
+                None,
+            )
+            if owner is None:
+                del self._index[block_hash]
+            else:
+                self._index[block_hash] = owner
+
+    @property
+    def cached_tokens(self) -> int:
+        """The total number of cached tokens."""
+        return self._cached_tokens
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,160 @@
+"""Client-side rate limiting and retry policy for remote model APIs."""
+
+import asyncio
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from functools import lru_cache
+from typing import Any
+
+
+class TokenBucketRateLimiter:
+    """Token-bucket limiter bounded by both requests per minute and tokens per minute.
+
+    Both buckets start full and refill continuously. The limiter is safe to share between
+    event loops and threads: its lock is never held while waiting."""
+
+    def __init__(self, *, requests_per_minute: int, tokens_per_minute: int) -> None:
+        """Initialize the rate limiter.
+
+        Args:
+            requests_per_minute: The maximum number of requests per minute.
+            tokens_per_minute: The maximum number of tokens per minute.
+        """
+
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+
+        self._available_requests = float(requests_per_minute)
+        self._available_tokens = float(tokens_per_minute)
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed_minutes = (now - self._last_refill) / 60
+        self._last_refill = now
+
+        self._available_requests = min(
+            self.requests_per_minute,
+            self._available_requests + elapsed_minutes * self.requests_per_minute,
+        )
+        self._available_tokens = min(
+            self.tokens_per_minute,
+            self._available_tokens + elapsed_minutes * self.tokens_per_minute,
+        )
+
+    def try_acquire(self, tokens: int) -> float:
+        """Take one request and the given number of tokens from the buckets if available.
+
+        Returns:
+            0 if the request can be sent now, else the time to wait (in seconds) before retrying.
+        """
+
+        # A request larger than the bucket would never fit: only wait for a full bucket
+        tokens = min(tokens, self.tokens_per_minute)
+
+        with self._lock:
+            self._refill()
+
+            missing_requests = 1 - self._available_requests
+            missing_tokens = tokens - self._available_tokens
+
+            if missing_requests <= 0 and missing_tokens <= 0:
+                self._available_requests -= 1
+                self._available_tokens -= tokens
+                return 0.0
+
+            return 60 * max(
+                missing_requests / self.requests_per_minute,
+                missing_tokens / self.tokens_per_minute,
+            )
+
+    async def acquire(self, tokens: int) -> None:
+        """Wait until one request and the given number of tokens are available, and take them."""
+
+        while (wait := self.try_acquire(tokens)) > 0:
+            await asyncio.sleep(wait)
+
+    def record(self, tokens: int) -> None:
+        """Take tokens that were used without being acquired beforehand (e.g. completion tokens).
+        The token bucket may go negative, delaying the next requests."""
+
+        with self._lock:
+            self._refill()
+            self._available_tokens -= tokens
+
+
+_SHARED_LIMITERS: dict[Any, TokenBucketRateLimiter] = {}
+_SHARED_LIMITERS_LOCK = threading.Lock()
+
+
+def shared_rate_limiter(
+    key: Any, *, requests_per_minute: int, tokens_per_minute: int
+) -> TokenBucketRateLimiter:
+    """Return the rate limiter shared by all model instances with the same key
+    (typically the API endpoint and model name). It is created on first use."""
+
+    with _SHARED_LIMITERS_LOCK:
+        if key not in _SHARED_LIMITERS:
+            _SHARED_LIMITERS[key] = TokenBucketRateLimiter(
+                requests_per_minute=requests_per_minute,
+                tokens_per_minute=tokens_per_minute,
+            )
+        return _SHARED_LIMITERS[key]
+
+
+@lru_cache(maxsize=None)
+def _encoding(model_name: str) -> Any | None:
+    """The tiktoken encoding of a model, or None if it cannot be loaded (e.g. offline)."""
+    import tiktoken
+
+    try:
+        try:
+            return tiktoken.encoding_for_model(model_name)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+
+def estimate_tokens(text: str, model_name: str) -> int:
+    """Estimate the number of tokens of a text with tiktoken.
+    Falls back to 4 characters per token if the encoding is not available."""
+
+    encoding = _encoding(model_name)
+    if encoding is None:
+        return len(text) // 4 + 1
+
+    return len(encoding.encode(text))
+
+
+def backoff_delay(
+    attempt: int,
+    *,
+    base: float = 1.0,
+    maximum: float = 60.0,
+    retry_after: str | None = None,
+) -> float:
+    """Delay before the next retry: the server `Retry-After` header if given,
+    else exponential backoff with full jitter.
+
+    Args:
+        attempt: The number of failed attempts so far, starting at 0.
+        base: The delay scale, in seconds.
+        maximum: The maximum delay, in seconds.
+        retry_after: The `Retry-After` response header (in seconds, or an HTTP date).
+    """
+
+    if retry_after is not None:
+        try:
+            return min(maximum, max(0.0, float(retry_after)))
+        except ValueError:
+            try:
+                date = parsedate_to_datetime(retry_after)
+                return min(maximum, max(0.0, date.timestamp() - time.time()))
+            except (TypeError, ValueError):
+                pass
+
+    return random.uniform(0, min(maximum, base * 2**attempt))
@@ -0,0 +1,68 @@
+"""Registry of the language model backends, resolved by name.
+
+Backend modules import heavy dependencies (torch, transformers, API clients) at module level,
+so they are only imported when a backend is first resolved. Analysis, transcript and
+configuration code can reference backends by name without paying for these imports.
+"""
+
+import importlib
+from typing import Any
+
+from llm_mediator_simulation.models.language_model import (
+    AsyncLanguageModel,
+    LanguageModel,
+)
+
+_MODELS = "llm_mediator_simulation.models"
+
+# Backend name -> "module:class"
+MODEL_BACKENDS: dict[str, str] = {
+    "dummy": f"{_MODELS}.dummy_model:DummyModel",
+    "gpt": f"{_MODELS}.gpt_models:GPTModel",
+    "async_gpt": f"{_MODELS}.gpt_models:AsyncGPTModel",
+    "google": f"{_MODELS}.google_models:GoogleModel",
+    "async_google": f"{_MODELS}.google_models:AsyncGoogleModel",
+    "mistral": f"{_MODELS}.mistral_models:MistralModel",
+    "mistral_local": f"{_MODELS}.mistral_local_model:MistralLocalModel",
+    "batched_mistral_local": f"{_MODELS}.mistral_local_model:BatchedMistralLocalModel",
+    "hf_local": f"{_MODELS}.hf_local_model:HFLocalModel",
+    "batched_hf_local": f"{_MODELS}.hf_local_model:BatchedHFLocalModel",
+    "coalescing_hf_local": f"{_MODELS}.coalescing_model:CoalescingHFLocalModel",
+    "hf_local_server": f"{_MODELS}.hf_local_server_model:HFLocalServerModel",
+    "async_hf_local_server": f"{_MODELS}.hf_local_server_model:AsyncHFLocalServerModel",
+    "model_pool": f"{_MODELS}.model_pool:ModelPool",
+    "async_model_pool": f"{_MODELS}.model_pool:AsyncModelPool",
+    "ollama": f"{_MODELS}.ollama_local_server_model:OllamaLocalModel",
+    "async_ollama": f"{_MODELS}.ollama_local_server_model:AsyncOllamaLocalModel",
+}
+
+
+def register_backend(name: str, path: str) -> None:
+    """Register a backend class under a name, as a "module:class" import path."""
+
+    assert ":" in path, f"Backend path must be 'module:class', got {path!r}."
+    MODEL_BACKENDS[name] = path
+
+
+def get_model_class(
+    name: str,
+) -> type[LanguageModel] | type[AsyncLanguageModel]:
+    """Return the model class of a backend, importing its module on first use.
+
+    Throws:
+        ValueError: If the backend is unknown.
+    """
+
+    if name not in MODEL_BACKENDS:
+        raise ValueError(
+            f"Unknown model backend {name!r}. Known backends are: {', '.join(MODEL_BACKENDS)}."
+        )
+
+    module_name, class_name = MODEL_BACKENDS[name].split(":")
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def create_model(name: str, **kwargs: Any) -> LanguageModel | AsyncLanguageModel:
+    """Instantiate a model backend by name, with the given constructor arguments."""
+
+    return get_model_class(name)(**kwargs)
@@ -0,0 +1,266 @@
+"""Route model calls to different backends depending on their purpose.
+
+The simulation functions tag the model calls they make with a purpose (debater intervention,
+mediator decision, summary...). A routed model sends each call to the backend configured
+for its purpose, so that cheap calls (summaries, argument quality scores) can run on a small
+model while mediator decisions stay on a large one.
+"""
+
+import functools
+import inspect
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Generic,
+    Iterator,
+    Literal,
+    TypeVar,
+    override,
+)
+
+from llm_mediator_simulation.models.language_model import (
+    AsyncLanguageModel,
+    LanguageModel,
+)
+from llm_mediator_simulation.models.latency import LatencyStats
+
+CallPurpose = Literal[
+    "debater", "debater_update", "mediator", "summary", "argument_quality"
+]
+CALL_PURPOSES: tuple[CallPurpose, ...] = (
+    "debater",
+    "debater_update",
+    "mediator",
+    "summary",
+    "argument_quality",
+)
+# Stats key of the calls made outside of any tagged function
+UNTAGGED = "untagged"
+
+# Context variables follow asyncio tasks, so concurrent debates keep their own purposes
+_purpose: ContextVar[CallPurpose | None] = ContextVar("call_purpose", default=None)
+
+F = TypeVar("F", bound=Callable[..., Any])
+M = TypeVar("M", LanguageModel, AsyncLanguageModel)
+
+
+def current_purpose() -> CallPurpose | None:
+    """The purpose of the model calls made in the current context."""
+    return _purpose.get()
+
+
+@contextmanager
+def call_purpose(purpose: CallPurpose) -> Iterator[None]:
+    """Tag the model calls made within the context with a purpose."""
+
+    assert purpose in CALL_PURPOSES, f"Unknown call purpose {purpose!r}."
+    token = _purpose.set(purpose)
+    try:
+        yield
+    finally:
+        _purpose.reset(token)
+
+
+def tag_purpose(purpose: CallPurpose) -> Callable[[F], F]:
+    """Decorator tagging the model calls made by a function (sync or async) with a purpose."""
+
+    def decorator(function: F) -> F:
+        if inspect.iscoroutinefunction(function):
+
+            @functools.wraps(function)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                with call_purpose(purpose):
+                    return await function(*args, **kwargs)
+
+            return async_wrapper  # type: ignore
+
+        @functools.wraps(function)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with call_purpose(purpose):
+                return function(*args, **kwargs)
+
+        return wrapper  # type: ignore
+
+    return decorator
+
+
+class _RouterBase(Generic[M]):
+    """Route selection and per-route statistics shared by the routed model wrappers."""
+
+    def __init__(self, *, default: M, routes: dict[CallPurpose, M] | None) -> None:
+        routes = routes or {}
+        unknown = set(routes) - set(CALL_PURPOSES)
+        assert not unknown, f"Unknown call purposes: {', '.join(sorted(unknown))}."
+
+        self.default = default
+        self.routes = routes
+        self.latency = {key: LatencyStats() for key in (*CALL_PURPOSES, UNTAGGED)}
+
+    def _route(self) -> tuple[str, M]:
+        """The stats key and backend of the current call."""
+
+        purpose = current_purpose()
+        return purpose or UNTAGGED, self.routes.get(purpose, self.default)  # type: ignore
+
+    @property
+    def structured_output(self) -> bool:
+        """Whether the backend of the current purpose enforces JSON answers."""
+        return self._route()[1].structured_output  # type: ignore
+
+    def stats(self) -> dict[str, dict[str, float]]:
+        """Return the call counts and latencies of each purpose that was called."""
+
+        return {
+            key: latency.summary()
+            for key, latency in self.latency.items()
+            if latency.calls
+        }
+
+
+class RoutedLanguageModel(_RouterBase[LanguageModel], LanguageModel):
+    """Model sending each call to the backend configured for its purpose."""
+
+    def __init__(
+        self,
+        *,
+        default: LanguageModel,
+        routes: dict[CallPurpose, LanguageModel] | None = None,
+    ) -> None:
+        """Initialize a routed model.
+
+        Args:
+            default: The backend of the purposes without a route, and of untagged calls.
+            routes: The backend of each purpose ("debater", "debater_update", "mediator", "summary", "argument_quality").
+        """
+        super().__init__(default=default, routes=routes)
+
+    @override
+    def sample(self, prompt: str, seed: int | None = None, **kwargs: Any) -> str:
+        key, model = self._route()
+        start = time.perf_counter()
+        error = True
+        try:
+            response = model.sample(prompt, seed, **kwargs)
+            error = False
+            return response
+        finally:
+            self.latency[key].record(time.perf_counter() - start, error)
+
+    @override
+    def sample_many(
+        self, prompts: list[str], seed: int | None = None, **kwargs: Any
+    ) -> list[str]:
+        key, model = self._route()
+        start = time.perf_counter()
+        error = True
+        try:
+            responses = model.sample_many(prompts, seed, **kwargs)
+            error = False
+            return responses
+        finally:
+            self.latency[key].record(time.perf_counter() - start, error)
+
+    @override
+    def sample_stream(
+        self, prompt: str, seed: int | None = None, **kwargs: Any
+    ) -> Iterator[str]:
+        key, model = self._route()
+        start = time.perf_counter()
+        error = True
+        try:
+            yield from model.sample_stream(prompt, seed, **kwargs)
+            error = False
+        except GeneratorExit:
+            error = False  # Closed early by the caller
+            raise
+        finally:
+            self.latency[key].record(time.perf_counter() - start, error)
+
+    @override
+    def sample_json(
+        self,
+        prompt: str,
+        json_format: dict[str, str],
+        seed: int | None = None,
+        **kwargs: Any,
+    ) -> dict[str, Any]:
+        key, model = self._route()
+        start = time.perf_counter()
+        error = True
+        try:
+            data = model.sample_json(prompt, json_format, seed, **kwargs)
+            error = False
+            return data
+        finally:
+            self.latency[key].record(time.perf_counter() - start, error)
+
+
+class AsyncRoutedLanguageModel(_RouterBase[AsyncLanguageModel], AsyncLanguageModel):
+    """Async model sending each call to the backend configured for its purpose."""
+
+    def __init__(
+        self,
+        *,
+        default: AsyncLanguageModel,
+        routes: dict[CallPurpose, AsyncLanguageModel] | None = None,
+    ) -> None:
+        """Initialize an async routed model.
+
+        Args:
+            default: The backend of the purposes without a route, and of untagged calls.
+            routes: The backend of each purpose ("debater", "debater_update", "mediator", "summary", "argument_quality").
+        """
+        super().__init__(default=default, routes=routes)
+
+    @override
+    async def sample(
+        self, prompts: list[str], seed: int | None = None, **kwargs: Any
+    ) -> list[str]:
+        key, model = self._route()
+        start = time.perf_counter()
+        error = True
+        try:
+            responses = await model.sample(prompts, seed, **kwargs)
+            error = False
+            return responses
+        finally:
+            self.latency[key].record(time.perf_counter() - start, error)
+
+    @override
+    async def sample_stream(
+        self, prompt: str, seed: int | None = None, **kwargs: Any
+    ) -> AsyncIterator[str]:
+        key, model = self._route()
+        start = time.perf_counter()
+        error = True
+        try:
+            async for chunk in model.sample_stream(prompt, seed, **kwargs):
+                yield chunk
+            error = False
+        except GeneratorExit:
+            error = False  # Closed early by the caller
+            raise
+        finally:
+            self.latency[key].record(time.perf_counter() - start, error)
+
+    @override
+    async def sample_json(
+        self,
+        prompts: list[str],
+        json_format: dict[str, str],
+        seed: int | None = None,
+        **kwargs: Any,
+    ) -> list[dict[str, Any] | None]:
+        key, model = self._route()
+        start = time.perf_counter()
+        error = True
+        try:
+            answers = await model.sample_json(prompts, json_format, seed, **kwargs)
+            error = False
+            return answers
+        finally:
+            self.latency[key].record(time.perf_counter() - start, error)
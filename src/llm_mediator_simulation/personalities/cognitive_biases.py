@@ -1,7 +1,9 @@
 import csv
+import io
 import os
 from dataclasses import dataclass
 from enum import Enum
+from importlib import resources
 
 
 class ReasoningError(Enum):
@@ -12,7 +14,9 @@ class ReasoningError(Enum):
         return self.value.name.capitalize()
 
 
-@dataclass
+# Frozen (hence hashable) values let Enum index its members by value,
+# instead of comparing each new member to all the previous ones
+@dataclass(frozen=True)
 class CognitiveBiasValue:
     """Typing for the values of a cognitive bias."""
 
@@ -25,13 +29,28 @@ class CognitiveBiasValue:
         return self.description
 
 
-def load_biases_from_csv(file_path: str = "data/cognitive-bias-tree.csv") -> None:
+def read_catalog(file_name: str, file_path: str | None = None) -> str:
+    """Read a catalog file, from the given path or else from the package data.
+    Package data does not depend on the working directory."""
+
+    if file_path is None:
+        catalog = resources.files("llm_mediator_simulation.personalities") / "data"
+        return (catalog / file_name).read_text(encoding="utf-8")
+
     if not os.path.exists(file_path):
         raise FileNotFoundError(
-            f"File not found: {file_path}. Please provide a valid path to the CSV file to load cognitive biases."
+            f"File not found: {file_path}. Please provide a valid path to the {file_name} catalog file."
         )
+    with open(file_path, mode="r", newline="", encoding="utf-8") as file:
+        return file.read()
+
+
+def load_biases_from_csv(file_path: str | None = None) -> None:
+    """Load the CognitiveBias Enum from a CSV file (defaults to the bundled catalog)."""
 
-    with open(file_path, mode="r", newline="", encoding="utf-8") as csvfile:
+    with io.StringIO(
+        read_catalog("cognitive-bias-tree.csv", file_path), newline=""
+    ) as csvfile:
         # remove non-breaking space characters from the CSV file such as '\xa0'
         reader = csv.DictReader(csvfile)
         enum_entries = {}
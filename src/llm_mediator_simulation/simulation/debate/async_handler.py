@@ -1,14 +1,16 @@
 """Async debate handler class"""
 
+import asyncio
 import pickle
 import random
 from copy import deepcopy
+from typing import Literal
 
 from rich.progress import track
 
 from llm_mediator_simulation.metrics.async_metrics_handler import AsyncMetricsHandler
 from llm_mediator_simulation.models.language_model import AsyncLanguageModel
-from llm_mediator_simulation.simulation.debate.config import DebateConfig
+from llm_mediator_simulation.simulation.debate.config import DebateConfig, DebateSlot
 from llm_mediator_simulation.simulation.debate.handler import DebatePickle
 from llm_mediator_simulation.simulation.debater.async_handler import AsyncDebaterHandler
 from llm_mediator_simulation.simulation.debater.config import DebaterConfig
@@ -30,13 +32,17 @@ class AsyncDebateHandler:
         *,
         debater_model: AsyncLanguageModel,
         mediator_model: AsyncLanguageModel,
-        debaters: list[DebaterConfig],
-        config: DebateConfig,
+        debaters: list[DebaterConfig] | None = None,
+        config: DebateConfig | None = None,
         mediator_config: MediatorConfig | None = None,
         summary_config: SummaryConfig | None = None,
         metrics_handler: AsyncMetricsHandler | None = None,
         parallel_debates: int = 1,
         seed: int | None = None,
+        json_debater_reponse: bool = True,
+        few_shot_samples: list[dict] | None = None,
+        speculative_summary: bool = False,
+        slots: list[DebateSlot] | None = None,
     ) -> None:
         """Instanciate an asynchronous debate simulation handler.
 
@@ -50,64 +56,121 @@ class AsyncDebateHandler:
             metrics_handler: The metrics handler to use. Defaults to None.
             parallel_debates: The number of parallel debates to run. Defaults to 1.
             seed: The seed to use for the random sampling at generation. Defaults to None.
+            json_debater_reponse: Whether to enforce JSON generation for debater responses. Defaults to True.
+            few_shot_samples: The few-shot samples to use for the debaters. Defaults to None.
+            speculative_summary: Whether to regenerate the summaries during the mediator calls, saving one model round trip per debater turn for the debates where the mediator stays silent. Defaults to False.
+            slots: Different debates to run in parallel, each with its own configuration, debaters and preloaded chat. \
+Replaces `debaters`, `config` and `parallel_debates`. The summaries of the preloaded chats are generated at the start of the first run. \
+Defaults to None: `parallel_debates` copies of the same debate are run.
         """
 
+        if slots is None:
+            assert (
+                debaters is not None and config is not None
+            ), "Either debaters and config, or slots must be given."
+            slots = [DebateSlot(config, debaters) for _ in range(parallel_debates)]
+
+        assert len(slots) >= 1, "At least one debate slot must be given."
+
         # Configuration
-        self.config = config
+        self.speculative_summary = speculative_summary
         self.summary_config = summary_config or SummaryConfig()
         self.mediator_config = mediator_config
-        self.parallel_debates = parallel_debates
+
+        # Models
+        self.debater_model = debater_model
+        self.mediator_model = mediator_model
+
+        self.metrics_handler = metrics_handler
+
+        # Seed
+        self.seed = seed  # setting the seed for sampling in generation
+
+        # Forced order of the debaters in the first round, for every parallel debate
+        self.debater_order: list[str] | None = None
+
+        # JSON generation
+        self.json_debater_reponse = json_debater_reponse
+
+        # Few-shot samples
+        self.few_shot_samples = few_shot_samples
+
+        self._init_slots(slots, remove_statement=True)
+
+    def _init_slots(self, slots: list[DebateSlot], remove_statement: bool) -> None:
+        """(Re)build the handlers and logs of the parallel debates.
+        The summaries of the preloaded chats are left to `_summarize_preloaded_chats`.
+        """
+
+        self.configs = [slot.config for slot in slots]
+        self.config = self.configs[0]
+        self.parallel_debates = len(slots)
+
+        # The debaters of every parallel debate, in their initial order. The personalities evolve in place.
+        self.debater_configs = [
+            [deepcopy(debater) for debater in slot.debaters] for slot in slots
+        ]
+        if remove_statement:
+            for configs, slot in zip(self.debater_configs, slots):
+                remove_statement_from_personalities(configs, slot.config.statement)
+        self.debater_orders = [slot.debater_order for slot in slots]
 
         # Handlers
         self.summary_handler = AsyncSummaryHandler(
-            model=mediator_model,
+            model=self.mediator_model,
             config=self.summary_config,
-            parallel_debates=parallel_debates,
+            parallel_debates=self.parallel_debates,
         )
 
+        for i, slot in enumerate(slots):
+            for intervention in slot.interventions:
+                self.summary_handler.add_new_messages([intervention], [i])
+        self._unsummarized = [i for i, slot in enumerate(slots) if slot.interventions]
+
         self.mediator_handler = (
             AsyncMediatorHandler(
-                model=mediator_model,
-                config=mediator_config,
-                debate_config=config,
+                model=self.mediator_model,
+                config=self.mediator_config,
+                debate_configs=self.configs,
                 summary_handler=self.summary_handler,
             )
-            if mediator_config
+            if self.mediator_config
             else None
         )
 
-        self.debaters = [
-            AsyncDebaterHandler(
-                model=debater_model,
-                config=debater,
-                debate_config=config,
-                summary_handler=self.summary_handler,
-                parallel_debates=parallel_debates,
-            )
-            for debater in debaters
-        ]
-
-        remove_statement_from_personalities(self.debaters, self.config.statement)
-
-        self.metrics_handler = metrics_handler
+        # One debater handler per turn of a round
+        self.debaters: list[AsyncDebaterHandler] = []
+        self._assign_turns(self.debater_configs)
 
         # Logs
         self.interventions: list[list[Intervention]] = [
-            [] for _ in range(parallel_debates)
+            list(slot.interventions) for slot in slots
         ]
-        self.initial_debaters = [
-            deepcopy(debater.configs[0]) for debater in self.debaters
+        self.initial_debaters = [  # For every parallel debate
+            [deepcopy(debater) for debater in configs]
+            for configs in self.debater_configs
         ]
 
-        # Seed
-        self.seed = seed  # setting the seed for sampling in generation
+    async def _summarize_preloaded_chats(self) -> None:
+        """Generate the summaries of the preloaded chats, in one batch."""
+
+        if self._unsummarized:
+            await self.summary_handler.regenerate_summaries(indexes=self._unsummarized)
+            self._unsummarized = []
 
-    async def run(self, rounds: int = 3) -> None:
+    async def run(self, rounds: int = 3, progress: bool = True) -> None:
         """Run the debate simulation for the given amount of rounds.
-        The debaters will all send one message per round, in the order they are listed in the debaters list.
+        The debaters will all send one message per round, in random order.
+        The first round follows the forced debater order of a preloaded chat, if any.
+
+        Args:
+            rounds: The number of rounds to run.
+            progress: Whether to display a progress bar. Only one can be displayed at a time.
         """
 
-        for i in track(range(rounds)):
+        await self._summarize_preloaded_chats()
+
+        for i in track(range(rounds), disable=not progress):
             # Moving the internal random state initialization to the beginning of each round
             # rather than before the round loop is fairly inelegant,
             # but it enables better reproducibility through consistancy in the async case, where,
@@ -118,52 +181,27 @@ class AsyncDebateHandler:
                     self.seed + i
                 )  # shuffling the list of debaters consulted in each round
 
-            # ###### Shuffle the debaters order ######
-            # Say there are 2 debaters and 3 parallel debates.
-            # self.debaters = [AsyncDebaterHandler(...
-            #                       self.configs = [DebaterConfig(...Alice...),
-            #                                       DebaterConfig(...Alice...),
-            #                                       DebaterConfig(...Alice...)]
-            #                       ...),
-            #                  AsyncDebaterHandler(...
-            #                       self.configs = [DebaterConfig(...Bob...),
-            #                                       DebaterConfig(...Bob...),
-            #                                       DebaterConfig(...Bob...)]
-            #                       ...)]
-            #
-            # After shuffling, we want to have:
-            # self.debaters = [AsyncDebaterHandler(...
-            #                       self.configs = [DebaterConfig(...Bob...),
-            #                                       DebaterConfig(...Alice...),
-            #                                       DebaterConfig(...Bob...)]
-            #                       ...),
-            #                  AsyncDebaterHandler(...
-            #                       self.configs = [DebaterConfig(...Alice...),
-            #                                       DebaterConfig(...Bob...),
-            #                                       DebaterConfig(...Alice...)]
-            #                       ...)]
-            # This is not straightforward but it matches the async calls of the debaters
-
-            for j in range(self.parallel_debates):
-                shuffled_debaters = random.sample(
-                    [debater.configs[j] for debater in self.debaters],
-                    len(self.debaters),
-                )
-                for k, debater in enumerate(self.debaters):
-                    debater.configs[j] = shuffled_debaters[k]
+            self._order_debaters()
 
             for debater in self.debaters:
                 ######################################################################
                 #                        DEBATER INTERVENTION                        #
                 ######################################################################
 
+                # The debates that have a debater at this turn
+                active_indexes = debater.active_indexes
+                if not active_indexes:
+                    continue
+
                 interventions = await debater.interventions(
                     initial_intervention=i == 0,
                     seed=self.seed,
+                    json=self.json_debater_reponse,
+                    few_shot_samples=self.few_shot_samples,
                 )
                 valid_indexes = [  # Compute the indexes of debates that just had a non-empty text intervention
-                    i
-                    for i, intervention in enumerate(interventions)
+                    index
+                    for index, intervention in zip(active_indexes, interventions)
                     if intervention.text
                 ]
 
@@ -172,15 +210,25 @@ class AsyncDebateHandler:
                         interventions, valid_indexes, self.seed
                     )
 
-                self.append_interventions(interventions)
-                self.summary_handler.add_new_messages(interventions)
+                self.append_interventions(interventions, active_indexes)
+                self.summary_handler.add_new_messages(interventions, active_indexes)
+
+                # Skip the debates where the debater did not intervene
+                if not valid_indexes:
+                    continue
 
                 ######################################################################
                 #                        MEDIATOR INTERVENTION                       #
                 ######################################################################
 
                 if not self.mediator_handler:
-                    await self.summary_handler.regenerate_summaries(seed=self.seed)
+                    await self.summary_handler.regenerate_summaries(
+                        seed=self.seed, indexes=valid_indexes
+                    )
+                    continue
+
+                if self.speculative_summary:
+                    await self._speculative_mediator_interventions(valid_indexes)
                     continue
 
                 interventions = await self.mediator_handler.interventions(
@@ -189,8 +237,120 @@ class AsyncDebateHandler:
 
                 # Mediator interventions were only computed for debates where the debater intervened, so we must pass `valid_indexes` this time
                 self.append_interventions(interventions, valid_indexes)
-                self.summary_handler.add_new_messages(interventions)
-                await self.summary_handler.regenerate_summaries(seed=self.seed)
+                self.summary_handler.add_new_messages(interventions, valid_indexes)
+                await self.summary_handler.regenerate_summaries(
+                    seed=self.seed, indexes=valid_indexes
+                )
+
+    def _order_debaters(self) -> None:
+        """Set the order of the debaters of every parallel debate for this round: the forced order
+        of a preloaded chat in the first round, if any, else a random order."""
+
+        # Say there are 2 parallel debates, with debaters Alice and Bob, and Carol, Dan and Eve.
+        # There is one AsyncDebaterHandler per turn of the round, that makes the debater of this turn
+        # intervene in every parallel debate at once:
+        # self.debaters = [AsyncDebaterHandler(...
+        #                       self.configs = [DebaterConfig(...Bob...),
+        #                                       DebaterConfig(...Eve...)]
+        #                       ...),
+        #                  AsyncDebaterHandler(...
+        #                       self.configs = [DebaterConfig(...Alice...),
+        #                                       DebaterConfig(...Carol...)]
+        #                       ...),
+        #                  AsyncDebaterHandler(...
+        #                       self.configs = [None,
+        #                                       DebaterConfig(...Dan...)]
+        #                       ...)]
+        # This is not straightforward but it matches the async calls of the debaters.
+        # Every round shuffles the initial order, like the sync handler does.
+
+        turns: list[list[DebaterConfig]] = []
+
+        for configs, debater_order in zip(self.debater_configs, self.debater_orders):
+            debater_order = self.debater_order or debater_order
+
+            if debater_order:
+                # Follow the forced order of debaters, for the first round only
+                turns.append(self._forced_order(configs, debater_order))
+            else:
+                turns.append(random.sample(configs, len(configs)))
+
+        self.debater_order = None
+        self.debater_orders = [None] * self.parallel_debates
+
+        self._assign_turns(turns)
+
+    @staticmethod
+    def _forced_order(
+        configs: list[DebaterConfig], debater_order: list[str]
+    ) -> list[DebaterConfig]:
+        """Return the debaters of a debate following the given order of names."""
+
+        debaters: list[DebaterConfig] = []
+        for debater_name in debater_order:
+            for config in configs:
+                if config.name == debater_name:
+                    debaters.append(config)
+                    break
+            else:
+                raise ValueError(
+                    f"Debater {debater_name} not found in the list of debaters."
+                )
+
+        return debaters
+
+    def _assign_turns(self, turns: list[list[DebaterConfig]]) -> None:
+        """Give the debaters of every parallel debate, in turn order, to the debater handlers."""
+
+        while len(self.debaters) < max(len(debaters) for debaters in turns):
+            self.debaters.append(
+                AsyncDebaterHandler(
+                    model=self.debater_model,
+                    configs=[None] * self.parallel_debates,
+                    debate_configs=self.configs,
+                    summary_handler=self.summary_handler,
+                )
+            )
+
+        for j, debaters in enumerate(turns):
+            for k, handler in enumerate(self.debaters):
+                handler.configs[j] = debaters[k] if k < len(debaters) else None
+
+    async def _speculative_mediator_interventions(
+        self, valid_indexes: list[int]
+    ) -> None:
+        """Mediator interventions, with the summaries regenerated during the mediator calls.
+
+        The mediator prompts only use the raw latest messages, not the summaries. The summaries
+        that ignore the mediator are kept for the debates where it stays silent, and only the
+        others are recomputed.
+        """
+
+        assert self.mediator_handler is not None
+
+        interventions, summaries = await asyncio.gather(
+            self.mediator_handler.interventions(valid_indexes, seed=self.seed),
+            self.summary_handler.next_summaries(
+                valid_indexes, self.summary_handler.message_strings, seed=self.seed
+            ),
+        )
+
+        self.append_interventions(interventions, valid_indexes)
+        self.summary_handler.add_new_messages(interventions, valid_indexes)
+
+        # The mediated debates are summarized again from their summary before this turn
+        mediated: list[int] = []
+        for index, intervention, summary in zip(
+            valid_indexes, interventions, summaries
+        ):
+            if intervention.text:
+                mediated.append(index)
+            else:
+                self.summary_handler.summaries[index] = summary
+
+        await self.summary_handler.regenerate_summaries(
+            seed=self.seed, indexes=mediated
+        )
 
     def append_interventions(
         self, interventions: list[Intervention], valid_indexes: list[int] | None = None
@@ -209,15 +369,24 @@ class AsyncDebateHandler:
         for i, intervention in zip(valid_indexes, interventions):
             self.interventions[i].append(intervention)
 
+    def to_debate_pickles(self) -> list[DebatePickle]:
+        """Return the configuration and logs of every parallel debate as DebatePickle objects."""
+        return [
+            DebatePickle(
+                config,
+                self.summary_config,
+                self.mediator_config,
+                initial_debaters,
+                interventions,
+            )
+            for config, initial_debaters, interventions in zip(
+                self.configs, self.initial_debaters, self.interventions
+            )
+        ]
+
     def to_first_debate_pickle(self) -> DebatePickle:
         """Return the first debate configuration and logs as a DebatePickle object."""
-        return DebatePickle(
-            self.config,
-            self.summary_config,
-            self.mediator_config,
-            self.initial_debaters,
-            self.interventions[0],
-        )
+        return self.to_debate_pickles()[0]
 
     def pickle(self, path: str) -> None:
         """Serialize all parallel debate configurations and logs to individual pickle files per debate. This does not include the model configuration.
@@ -226,14 +395,49 @@ class AsyncDebateHandler:
             path (str): The path to the pickle files, without file extension.
         """
 
-        for i, interventions in enumerate(self.interventions):
-            data = DebatePickle(
-                self.config,
-                self.summary_config,
-                self.mediator_config,
-                self.initial_debaters,
-                interventions,
-            )
-
+        for i, data in enumerate(self.to_debate_pickles()):
             with open(f"{path}_{i}.pkl", "wb") as f:
                 pickle.dump(data, f)
+
+    async def preload_chat(
+        self, debaters: list[DebaterConfig], interventions: list[Intervention]
+    ) -> None:
+        """Preload the same debate chat from debaters and interventions in every parallel debate."""
+
+        await self.preload_slots(
+            [DebateSlot(config, debaters, interventions) for config in self.configs]
+        )
+
+    async def preload_slots(self, slots: list[DebateSlot]) -> None:
+        """Replace the parallel debates with the given ones, continuing their preloaded chats."""
+
+        self._init_slots(slots, remove_statement=False)
+        await self._summarize_preloaded_chats()
+
+    async def preload_csv_chat(
+        self,
+        path: str,
+        app: Literal["deliberate-lab", "reddit"] = "deliberate-lab",
+        truncated_num: int | None = 2,
+        force_truncated_order: bool | None = None,
+        load_debater_profiles: bool = False,
+        debater_profiles_path: str | None = None,
+        prune_debaters: bool = True,
+    ) -> None:
+        """Preload the same debate chat from a CSV file in every parallel debate."""
+        # Imported here, as the CSV loaders pull in polars
+        from llm_mediator_simulation.utils.load_csv import load_csv_chat
+
+        debaters, interventions, debater_order = load_csv_chat(
+            path,
+            app=app,
+            truncated_num=truncated_num,
+            force_truncated_order=force_truncated_order,
+            load_debater_profiles=load_debater_profiles,
+            debater_profiles_path=debater_profiles_path,
+            statement=self.config.statement,
+            prune_debaters=prune_debaters,
+        )
+        self.debater_order = debater_order
+
+        await self.preload_chat(debaters, interventions)
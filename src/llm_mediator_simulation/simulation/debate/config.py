@@ -1,9 +1,11 @@
 """Configuration for debate simulations"""
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Literal, override
 
+from llm_mediator_simulation.simulation.debater.config import DebaterConfig
 from llm_mediator_simulation.utils.interfaces import Promptable
+from llm_mediator_simulation.utils.types import Intervention
 
 
 @dataclass
@@ -23,3 +25,20 @@ class DebateConfig(Promptable):
     @override
     def to_prompt(self) -> str:
         return f"""{self.context} "{self.statement}\""""
+
+
+@dataclass
+class DebateSlot:
+    """One of the parallel debates of an asynchronous debate handler.
+
+    Args:
+        config (DebateConfig): The debate configuration.
+        debaters (list[DebaterConfig]): The debaters participating in the debate.
+        interventions (list[Intervention]): The preloaded chat to continue. Defaults to an empty chat.
+        debater_order (list[str] | None): The forced order of the debaters in the first round. Defaults to None.
+    """
+
+    config: DebateConfig
+    debaters: list[DebaterConfig]
+    interventions: list[Intervention] = field(default_factory=list)
+    debater_order: list[str] | None = None
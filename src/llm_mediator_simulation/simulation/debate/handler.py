@@ -1,10 +1,14 @@
 """Full debate simulation handler class"""
 
-import functools
+import contextvars
+import os
 import pickle
 import random
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
+from typing import Any, Literal
 
+import numpy as np
 from rich.progress import track
 
 from llm_mediator_simulation.metrics.metrics_handler import MetricsHandler
@@ -23,10 +27,7 @@ from llm_mediator_simulation.simulation.summary.config import (
 )
 from llm_mediator_simulation.simulation.summary.handler import SummaryHandler
 from llm_mediator_simulation.utils.debaters import remove_statement_from_personalities
-from llm_mediator_simulation.utils.load_csv import (
-    load_deliberate_lab_csv_chat,
-    load_reddit_csv_conv,
-)
+from llm_mediator_simulation.utils.probabilities import ProbabilityMapper
 from llm_mediator_simulation.utils.types import Intervention, PrintableIntervention
 
 
@@ -46,6 +47,8 @@ class DebateHandler:
         seed: int | None = None,
         json_debater_reponse: bool = True,
         few_shot_samples: list[dict] | None = None,
+        background_metrics: bool = False,
+        speculative_summary: bool = False,
     ) -> None:
         """Instanciate a debate simulation handler.
 
@@ -60,6 +63,8 @@ class DebateHandler:
             seed: The seed to use for the random sampling at generation. Defaults to None.
             json_debater_reponse: Whether to enforce JSON generation for debater responses. Defaults to True.
             few_shot_samples: The few-shot samples to use for the debater. Defaults to None.
+            background_metrics: Whether to compute the metrics in background workers while the debate goes on. Only enable it for metrics backends that accept concurrent calls (remote APIs, model servers): an in-process local model is not thread-safe, and its global seeding breaks seeded reproducibility. Otherwise, the interventions of each round are scored together at the end of the round, with `sample_many`. Defaults to False.
+            speculative_summary: Whether to regenerate the summary during the mediator call, saving one model round trip per debater turn when the mediator stays silent. Requires a mediator model that accepts concurrent calls. Defaults to False.
         """
 
         # Configuration
@@ -100,6 +105,8 @@ class DebateHandler:
         remove_statement_from_personalities(self.debaters, self.config.statement)
 
         self.metrics_handler = metrics_handler
+        self.background_metrics = background_metrics
+        self.speculative_summary = speculative_summary
 
         # Logs
         self.interventions: list[Intervention] = []
@@ -119,13 +126,26 @@ class DebateHandler:
         # Few-shot samples
         self.few_shot_samples = few_shot_samples
 
-    def run(self, rounds: int = 3) -> None:
+    def run(self, rounds: int = 3, checkpoint: str | None = None) -> None:
         """Run the debate simulation for the given amount of rounds.
 
         The debaters will all send one intervention per round, in random order.
+        Returns once the metrics of all interventions are computed.
+
+        Args:
+            rounds: The number of rounds to run.
+            checkpoint: The path of a checkpoint file, without file extension. If set, the debate state is saved \
+after every round, so that `DebateHandler.resume` can finish the debate after a crash. Defaults to None.
         """
 
-        for i in track(range(rounds)):
+        self._run_rounds(0, rounds, checkpoint)
+
+    def _run_rounds(
+        self, first_round: int, rounds: int, checkpoint: str | None
+    ) -> None:
+        """Run the rounds from `first_round` (included) to `rounds` (excluded)."""
+
+        for i in track(range(first_round, rounds), total=rounds - first_round):
             # Moving the internal random state initialization to the beginning of each round
             # rather than before the round loop is fairly inelegant,
             # but it enables better reproducibility through consistancy in the async case, where,
@@ -155,6 +175,9 @@ class DebateHandler:
                 # Shuffle the debaters order
                 debaters = random.sample(self.debaters, len(self.debaters))
 
+            # Debater interventions of this round, scored together when the metrics are inline
+            unscored: list[Intervention] = []
+
             for debater in debaters:
                 ##############################################################
                 #                    DEBATER INTERVENTION                    #
@@ -173,8 +196,11 @@ class DebateHandler:
                 if not intervention.text:
                     continue
 
-                if self.metrics_handler:
-                    self.metrics_handler.inject_metrics(intervention, seed=self.seed)
+                # Nothing in the debate depends on the metrics: compute them in the background
+                if self.metrics_handler and self.background_metrics:
+                    self.metrics_handler.submit(intervention, seed=self.seed)
+                elif self.metrics_handler:
+                    unscored.append(intervention)
 
                 ##############################################################
                 #                    MEDIATOR INTERVENTION                   #
@@ -184,6 +210,10 @@ class DebateHandler:
                     self.summary_handler.regenerate_summary(seed=self.seed)
                     continue
 
+                if self.speculative_summary:
+                    self._speculative_mediator_intervention()
+                    continue
+
                 intervention = self.mediator_handler.intervention(seed=self.seed)
                 self.interventions.append(intervention)
                 self.summary_handler.add_new_message(intervention)
@@ -192,6 +222,48 @@ class DebateHandler:
                 # (either way, a debater or mediator has intervened here)
                 self.summary_handler.regenerate_summary(seed=self.seed)
 
+            if self.metrics_handler and unscored:
+                self.metrics_handler.inject_metrics_many(unscored, seed=self.seed)
+
+            if checkpoint is not None:
+                self.save_checkpoint(checkpoint, completed_rounds=i + 1, rounds=rounds)
+
+        self.wait_for_metrics()
+
+    def _speculative_mediator_intervention(self) -> None:
+        """Mediator intervention, with the summary regenerated during the mediator call.
+
+        The mediator prompt only uses the raw latest messages, not the summary. The summary
+        that ignores the mediator is kept if the mediator stays silent, and recomputed otherwise.
+        """
+
+        assert self.mediator_handler is not None
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            context = contextvars.copy_context()
+            speculation = executor.submit(
+                context.run,
+                self.summary_handler.next_summary,
+                self.summary_handler.message_strings,
+                self.seed,
+            )
+            intervention = self.mediator_handler.intervention(seed=self.seed)
+            summary = speculation.result()
+
+        self.interventions.append(intervention)
+        self.summary_handler.add_new_message(intervention)
+
+        if intervention.text:
+            self.summary_handler.regenerate_summary(seed=self.seed)
+        else:
+            self.summary_handler.summary = summary
+
+    def wait_for_metrics(self) -> None:
+        """Wait for the metrics being computed in the background."""
+
+        if self.metrics_handler:
+            self.metrics_handler.wait()
+
     ###############################################################################################
     #                                        SERIALIZATION                                        #
     ###############################################################################################
@@ -200,6 +272,8 @@ class DebateHandler:
     def to_debate_pickle(self) -> "DebatePickle":
         """Return the debate configuration and logs as a DebatePickle object."""
 
+        self.wait_for_metrics()
+
         return DebatePickle(
             self.config,
             self.summary_config,
@@ -224,6 +298,103 @@ class DebateHandler:
                 file,
             )
 
+    # Checkpoints
+    def to_checkpoint(self, completed_rounds: int, rounds: int) -> "DebateCheckpoint":
+        """Return the debate state after the given number of completed rounds as a DebateCheckpoint object."""
+
+        self.wait_for_metrics()
+
+        return DebateCheckpoint(
+            config=self.config,
+            summary_config=self.summary_config,
+            mediator_config=self.mediator_config,
+            initial_debaters=self.initial_debaters,
+            debaters=[debater.config for debater in self.debaters],
+            interventions=self.interventions,
+            summary=self.summary_handler.summary,
+            latest_messages=self.summary_handler.latest_messages,
+            debater_order=self.debater_order,
+            probability_mapper=(
+                self.mediator_handler.probability_mapper
+                if self.mediator_handler
+                else None
+            ),
+            seed=self.seed,
+            json_debater_reponse=self.json_debater_reponse,
+            few_shot_samples=self.few_shot_samples,
+            background_metrics=self.background_metrics,
+            speculative_summary=self.speculative_summary,
+            completed_rounds=completed_rounds,
+            rounds=rounds,
+            random_state=random.getstate(),
+            numpy_random_state=np.random.get_state(),
+        )
+
+    def save_checkpoint(self, path: str, completed_rounds: int, rounds: int) -> None:
+        """Save the debate state to a checkpoint file, replacing the previous one atomically.
+        This does not include the model configuration.
+
+        Args:
+            path (str): The path to the checkpoint file, without file extension.
+        """
+
+        data = self.to_checkpoint(completed_rounds, rounds)
+
+        with open(f"{path}.ckpt.tmp", "wb") as file:
+            pickle.dump(data, file)
+        os.replace(f"{path}.ckpt.tmp", f"{path}.ckpt")
+
+    @staticmethod
+    def resume(
+        path: str,
+        *,
+        debater_model: LanguageModel,
+        mediator_model: LanguageModel,
+        metrics_handler: MetricsHandler | None = None,
+    ) -> "DebateHandler":
+        """Restore a debate from its checkpoint file, and run its remaining rounds, still saving checkpoints.
+        Under a fixed seed, the debate ends as if it had never stopped.
+
+        Args:
+            path (str): The path to the checkpoint file, without file extension.
+            debater_model: The language model to use for debaters.
+            mediator_model: The language model to use for the mediator and metrics.
+            metrics_handler: The metrics handler to use. Defaults to None.
+        """
+
+        with open(f"{path}.ckpt", "rb") as file:
+            data: DebateCheckpoint = pickle.load(file)
+
+        debate = DebateHandler(
+            debater_model=debater_model,
+            mediator_model=mediator_model,
+            debaters=data.debaters,
+            config=data.config,
+            mediator_config=data.mediator_config,
+            summary_config=data.summary_config,
+            metrics_handler=metrics_handler,
+            seed=data.seed,
+            json_debater_reponse=data.json_debater_reponse,
+            few_shot_samples=data.few_shot_samples,
+            background_metrics=data.background_metrics,
+            speculative_summary=data.speculative_summary,
+        )
+
+        debate.interventions = data.interventions
+        debate.initial_debaters = data.initial_debaters
+        debate.debater_order = data.debater_order
+        debate.summary_handler.summary = data.summary
+        debate.summary_handler.latest_messages = data.latest_messages
+        if debate.mediator_handler:
+            debate.mediator_handler.probability_mapper = data.probability_mapper
+
+        random.setstate(data.random_state)
+        np.random.set_state(data.numpy_random_state)
+
+        debate._run_rounds(data.completed_rounds, data.rounds, path)
+
+        return debate
+
     @staticmethod
     def unpickle(path: str) -> "DebatePickle":
         """Load a debate configuration and logs from a pickle file.
@@ -285,7 +456,7 @@ class DebateHandler:
     def preload_csv_chat(
         self,
         path: str,
-        app: str = "deliberate-lab",
+        app: Literal["deliberate-lab", "reddit"] = "deliberate-lab",
         truncated_num: int | None = 2,
         force_truncated_order: bool | None = None,
         load_debater_profiles: bool = False,
@@ -293,27 +464,19 @@ class DebateHandler:
         prune_debaters: bool = True,
     ):
         """Preload a debate chat from a CSV file."""
-        if force_truncated_order is None:
-            force_truncated_order = bool(truncated_num)
-
-        if app == "deliberate-lab":
-            load_csv_chat = load_deliberate_lab_csv_chat
-        elif app == "reddit":
-            load_csv_chat = functools.partial(
-                load_reddit_csv_conv,
-                truncated_num=truncated_num,
-                force_truncated_order=force_truncated_order,
-                load_debater_profiles=load_debater_profiles,
-                debater_profiles_path=debater_profiles_path,
-                statement=self.config.statement,
-                prune_debaters=prune_debaters,
-            )
-        else:
-            raise ValueError(
-                f"Unknown app {app}. Supported apps are: 'deliberate-lab', 'reddit'."
-            )
-
-        debaters, interventions, debater_order = load_csv_chat(path)
+        # Imported here, as the CSV loaders pull in polars
+        from llm_mediator_simulation.utils.load_csv import load_csv_chat
+
+        debaters, interventions, debater_order = load_csv_chat(
+            path,
+            app=app,
+            truncated_num=truncated_num,
+            force_truncated_order=force_truncated_order,
+            load_debater_profiles=load_debater_profiles,
+            debater_profiles_path=debater_profiles_path,
+            statement=self.config.statement,
+            prune_debaters=prune_debaters,
+        )
         self.debater_order = debater_order
 
         self.preload_chat(debaters, interventions)
@@ -352,3 +515,28 @@ class DebatePickle:
                 intervention.to_printable() for intervention in self.interventions
             ],
         )
+
+
+@dataclass
+class DebateCheckpoint:
+    """Debate state after a completed round, to resume the debate after a crash"""
+
+    config: DebateConfig
+    summary_config: SummaryConfig
+    mediator_config: MediatorConfig | None
+    initial_debaters: list[DebaterConfig]
+    debaters: list[DebaterConfig]  # With their evolved personalities
+    interventions: list[Intervention]
+    summary: str
+    latest_messages: list[Intervention]
+    debater_order: list[str] | None
+    probability_mapper: ProbabilityMapper | None
+    seed: int | None
+    json_debater_reponse: bool
+    few_shot_samples: list[dict] | None
+    background_metrics: bool
+    speculative_summary: bool
+    completed_rounds: int
+    rounds: int
+    random_state: Any
+    numpy_random_state: Any
@@ -15,65 +15,98 @@ from llm_mediator_simulation.utils.types import Intervention
 
 
 class AsyncDebaterHandler:
-    """A class to simulate the same debater across multiple debates, asynchronously"""
+    """A class to simulate one debater turn across multiple debates, asynchronously.
+    Each debate has its own debater at this turn, or none if it has fewer debaters than turns.
+    """
 
     def __init__(
         self,
         *,
         model: AsyncLanguageModel,
-        config: DebaterConfig,
-        debate_config: DebateConfig,
+        configs: list[DebaterConfig | None],
+        debate_configs: list[DebateConfig],
         summary_handler: AsyncSummaryHandler,
-        parallel_debates: int = 1,
     ) -> None:
         """Initialize the asynchronous debater handler.
 
         Args:
             model: The language model to use.
-            config: The debater configuration. The debater personality will evolve during the debate.
-            debate_config: The debate configuration.
+            configs: The debater configuration of every parallel debate, or None for the debates without a debater at this turn. \
+The debater personalities will evolve during the debate.
+            debate_configs: The debate configuration of every parallel debate.
             summary_handler: The conversation summary handler.
         """
 
+        assert len(configs) == len(
+            debate_configs
+        ), "Debater and debate configurations must have the same length."
+
         self.model = model
-        self.configs = [deepcopy(config) for _ in range(parallel_debates)]
-        self.debate_config = debate_config
+        self.configs = configs
+        self.debate_configs = debate_configs
         self.summary_handler = summary_handler
 
+    @property
+    def active_indexes(self) -> list[int]:
+        """The parallel debates that have a debater at this turn."""
+
+        return [i for i, config in enumerate(self.configs) if config is not None]
+
     def variable_debater(self) -> bool:
-        """Check if the debater is variable."""
+        """Check if one of the debaters is variable."""
 
-        return self.configs[0].variable_topic_opinion or (
-            self.configs[0].personality.variable_personality()
-            if self.configs[0].personality is not None
-            else False
-        )  # To be safe, we should check these proporties for all debaters but let's assume they are the same for all debaters
+        return any(
+            config.variable_topic_opinion
+            or (
+                config.personality.variable_personality()
+                if config.personality is not None
+                else False
+            )
+            for config in self.configs
+            if config is not None
+        )
 
     async def interventions(
-        self, initial_intervention: bool = False, seed: int | None = None
+        self,
+        initial_intervention: bool = False,
+        seed: int | None = None,
+        json: bool = True,
+        few_shot_samples: list[dict] | None = None,
     ) -> list[Intervention]:
-        """Do a debater intervention for all parallel debates, asynchronously
+        """Do a debater intervention for all parallel debates that have a debater at this turn
+        (see `active_indexes`), asynchronously
 
         Args:
             initial_intervention: If this is the first intervention from this debater.
             seed: The seed to use for the random sampling at generation.
+            json: Whether to enforce JSON generation.
+            few_shot_samples: The few shot samples to use for the debater interventions.
         """
 
+        indexes = self.active_indexes
+        debaters = [config for config in self.configs if config is not None]
+        debate_configs = [self.debate_configs[i] for i in indexes]
+
         # Update the debater personalities
         if not (initial_intervention) and self.variable_debater():
             await async_debater_update(
                 model=self.model,
-                debate_statement=self.debate_config.statement,
-                debaters=self.configs,
-                interventions=self.summary_handler.latest_messages,
+                debate_statements=[config.statement for config in debate_configs],
+                debaters=debaters,
+                interventions=[
+                    self.summary_handler.latest_messages[i] for i in indexes
+                ],
             )
 
         responses, prompts = await async_debater_interventions(
             model=self.model,
-            config=self.debate_config,
+            configs=debate_configs,
             summary=self.summary_handler,
-            debaters=self.configs,
+            debaters=debaters,
+            indexes=indexes,
             seed=seed,
+            json=json,
+            few_shot_samples=few_shot_samples,
         )
 
         return [
@@ -83,8 +116,8 @@ class AsyncDebaterHandler:
                 ),  # Freeze the debater configuration because the personality can change
                 text=response["text"],
                 prompt=prompt,
-                justification=response["intervention_justification"],  # TODO Update
+                justification=response["justification"],
                 timestamp=datetime.now(),
             )
-            for response, prompt, config in zip(responses, prompts, self.configs)
+            for response, prompt, config in zip(responses, prompts, debaters)
         ]
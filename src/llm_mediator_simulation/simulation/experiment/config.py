@@ -0,0 +1,56 @@
+"""Configuration for the debates of an experiment"""
+
+from dataclasses import dataclass, field
+from typing import Literal
+
+from llm_mediator_simulation.simulation.debate.config import DebateConfig
+from llm_mediator_simulation.simulation.debater.config import DebaterConfig
+from llm_mediator_simulation.utils.types import Intervention
+
+
+@dataclass
+class DebateJob:
+    """A debate to run in an experiment.
+
+    Args:
+        name (str): The unique name of the debate, used for its result files.
+        config (DebateConfig): The debate configuration.
+        debaters (list[DebaterConfig]): The debaters participating in the debate.
+        interventions (list[Intervention]): The preloaded chat to continue. Defaults to an empty chat.
+        debater_order (list[str] | None): The forced order of the debaters in the first round. Defaults to None.
+    """
+
+    name: str
+    config: DebateConfig
+    debaters: list[DebaterConfig]
+    interventions: list[Intervention] = field(default_factory=list)
+    debater_order: list[str] | None = None
+
+    @staticmethod
+    def from_csv(
+        name: str,
+        path: str,
+        config: DebateConfig,
+        app: Literal["deliberate-lab", "reddit"] = "reddit",
+        truncated_num: int | None = 2,
+        force_truncated_order: bool | None = None,
+        load_debater_profiles: bool = False,
+        debater_profiles_path: str | None = None,
+        prune_debaters: bool = True,
+    ) -> "DebateJob":
+        """Create a debate job continuing a chat from a CSV file."""
+        # Imported here, as the CSV loaders pull in polars
+        from llm_mediator_simulation.utils.load_csv import load_csv_chat
+
+        debaters, interventions, debater_order = load_csv_chat(
+            path,
+            app=app,
+            truncated_num=truncated_num,
+            force_truncated_order=force_truncated_order,
+            load_debater_profiles=load_debater_profiles,
+            debater_profiles_path=debater_profiles_path,
+            statement=config.statement,
+            prune_debaters=prune_debaters,
+        )
+
+        return DebateJob(name, config, debaters, interventions, debater_order)
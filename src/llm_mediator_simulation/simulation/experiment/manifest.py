@@ -0,0 +1,46 @@
+"""Sweep manifest, that records the finished debates of an experiment so that a restarted sweep skips them"""
+
+import json
+import os
+
+
+class SweepManifest:
+    """JSON file listing the debates of a sweep that are finished, with the path of their result file.
+
+    The file is rewritten atomically every time a debate is marked as done, so that it stays
+    readable if the sweep crashes."""
+
+    def __init__(self, path: str) -> None:
+        """Load the manifest from the given path, or start an empty one if the file does not exist yet.
+
+        Args:
+            path: The path to the JSON manifest file.
+        """
+
+        self.path = path
+        self.finished: dict[str, str | None] = {}
+
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as file:
+                self.finished = json.load(file)["finished"]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.finished
+
+    def mark_done(self, name: str, result_path: str | None = None) -> None:
+        """Record a finished debate, and save the manifest.
+
+        Args:
+            name: The unique name of the debate.
+            result_path: The path to the result file of the debate. Defaults to None.
+        """
+
+        self.finished[name] = result_path
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with open(f"{self.path}.tmp", "w", encoding="utf-8") as file:
+            json.dump({"finished": self.finished}, file, indent=2)
+        os.replace(f"{self.path}.tmp", self.path)
@@ -0,0 +1,173 @@
+"""Experiment runner, that advances many debates together and batches their model calls"""
+
+import asyncio
+import os
+import pickle
+from typing import Iterable
+
+from llm_mediator_simulation.metrics.async_metrics_handler import AsyncMetricsHandler
+from llm_mediator_simulation.models.batching_model import BatchingAsyncLanguageModel
+from llm_mediator_simulation.models.language_model import AsyncLanguageModel
+from llm_mediator_simulation.simulation.debate.async_handler import AsyncDebateHandler
+from llm_mediator_simulation.simulation.debate.handler import DebatePickle
+from llm_mediator_simulation.simulation.experiment.config import DebateJob
+from llm_mediator_simulation.simulation.experiment.manifest import SweepManifest
+from llm_mediator_simulation.simulation.mediator.config import MediatorConfig
+from llm_mediator_simulation.simulation.summary.config import SummaryConfig
+from llm_mediator_simulation.visualization.transcript import debate_transcript
+
+
+class ExperimentRunner:
+    """Run many different debates as concurrent coroutines.
+
+    The model calls that the debates issue at the same time are merged into shared batches,
+    so the backends stay busy while some debates do Python-side work."""
+
+    def __init__(
+        self,
+        *,
+        debater_model: AsyncLanguageModel,
+        mediator_model: AsyncLanguageModel,
+        mediator_config: MediatorConfig | None = None,
+        summary_config: SummaryConfig | None = None,
+        metrics_handler: AsyncMetricsHandler | None = None,
+        seed: int | None = None,
+        json_debater_reponse: bool = True,
+        few_shot_samples: list[dict] | None = None,
+        max_in_flight: int = 32,
+        max_batch_size: int = 64,
+        max_wait: float = 0.01,
+        output_dir: str | None = None,
+        manifest_path: str | None = None,
+    ) -> None:
+        """Instanciate an experiment runner.
+
+        Args:
+            debater_model: The language model to use for debaters.
+            mediator_model: The language model to use for the mediator, summaries and metrics. It can be the debater model.
+            mediator_config: The mediator configuration. If None, no mediator will be used. Defaults to None.
+            summary_config: The summary configuration. Defaults to None. A default config will be used.
+            metrics_handler: The metrics handler to use. Defaults to None.
+            seed: The seed to use for the random sampling at generation. Defaults to None.
+            json_debater_reponse: Whether to enforce JSON generation for debater responses. Defaults to True.
+            few_shot_samples: The few-shot samples to use for the debaters. Defaults to None.
+            max_in_flight: The maximum number of debates running at the same time. Defaults to 32.
+            max_batch_size: The number of pending prompts that triggers sending a batch to a model early. Defaults to 64.
+            max_wait: The maximum time (in seconds) a model call waits for others to join its batch. Defaults to 0.01.
+            output_dir: The directory to write the result files of every debate to, as soon as it finishes. \
+The debate pickles go to `{output_dir}/debates`, and the transcripts to `{output_dir}/transcripts`. \
+Defaults to None: no files are written.
+            manifest_path: The JSON file recording the finished debates, which are skipped when the sweep is restarted. \
+Use the same path across restarts. Defaults to `{output_dir}/manifest.json`.
+        """
+
+        assert max_in_flight >= 1, "max_in_flight must be at least 1."
+
+        self.debater_model = BatchingAsyncLanguageModel(
+            model=debater_model, max_batch_size=max_batch_size, max_wait=max_wait
+        )
+        self.mediator_model = (
+            self.debater_model
+            if mediator_model is debater_model
+            else BatchingAsyncLanguageModel(
+                model=mediator_model, max_batch_size=max_batch_size, max_wait=max_wait
+            )
+        )
+
+        self.mediator_config = mediator_config
+        self.summary_config = summary_config
+        self.metrics_handler = metrics_handler
+        self.seed = seed
+        self.json_debater_reponse = json_debater_reponse
+        self.few_shot_samples = few_shot_samples
+        self.max_in_flight = max_in_flight
+        self.output_dir = output_dir
+        if manifest_path is None and output_dir is not None:
+            manifest_path = os.path.join(output_dir, "manifest.json")
+        self.manifest = SweepManifest(manifest_path) if manifest_path else None
+
+        # Debates that raised an error, by name
+        self.failures: dict[str, Exception] = {}
+
+    async def run(
+        self, jobs: Iterable[DebateJob], rounds: int = 1
+    ) -> dict[str, DebatePickle]:
+        """Run every debate for the given amount of rounds, at most `max_in_flight` at a time.
+        A failing debate does not stop the others: its error is stored in `failures`.
+        Debates already recorded as finished in the manifest are loaded from their result file instead of being run again, \
+unless this file is missing.
+
+        Returns the finished debates, by name."""
+
+        semaphore = asyncio.Semaphore(self.max_in_flight)
+        results: dict[str, DebatePickle] = {}
+
+        async def run_job(job: DebateJob) -> None:
+            if self.manifest is not None and job.name in self.manifest:
+                result_path = self.manifest.finished[job.name]
+                if result_path is not None and os.path.exists(result_path):
+                    with open(result_path, "rb") as file:
+                        results[job.name] = pickle.load(file)
+                    return
+
+            async with semaphore:
+                try:
+                    results[job.name] = await self.run_job(job, rounds)
+                except Exception as e:
+                    print(f"Debate {job.name} failed: {e!r}")
+                    self.failures[job.name] = e
+
+        await asyncio.gather(*(run_job(job) for job in jobs))
+
+        return results
+
+    async def run_job(self, job: DebateJob, rounds: int = 1) -> DebatePickle:
+        """Run a single debate, and write its result files."""
+
+        debate = AsyncDebateHandler(
+            debater_model=self.debater_model,
+            mediator_model=self.mediator_model,
+            debaters=job.debaters,
+            config=job.config,
+            mediator_config=self.mediator_config,
+            summary_config=self.summary_config,
+            metrics_handler=self.metrics_handler,
+            seed=self.seed,
+            json_debater_reponse=self.json_debater_reponse,
+            few_shot_samples=self.few_shot_samples,
+        )
+
+        if job.interventions:
+            await debate.preload_chat(job.debaters, job.interventions)
+        debate.debater_order = job.debater_order
+
+        await debate.run(rounds, progress=False)
+
+        result = debate.to_first_debate_pickle()
+        if self.output_dir is not None:
+            self.save(job.name, result)
+
+        return result
+
+    def save(self, name: str, debate: DebatePickle) -> None:
+        """Write the pickle and the transcript of a finished debate, and record it in the manifest."""
+
+        assert self.output_dir is not None
+
+        debate_path = os.path.join(self.output_dir, "debates")
+        transcript_path = os.path.join(self.output_dir, "transcripts")
+        os.makedirs(debate_path, exist_ok=True)
+        os.makedirs(transcript_path, exist_ok=True)
+
+        debate_file = os.path.abspath(os.path.join(debate_path, f"{name}.pkl"))
+        with open(debate_file, "wb") as file:
+            pickle.dump(debate, file)
+
+        with open(
+            os.path.join(transcript_path, f"{name}.txt"), "w", encoding="utf-8"
+        ) as file:
+            file.write(debate_transcript(debate))
+
+        # Last, so that a crash while writing the files reruns the debate
+        if self.manifest is not None:
+            self.manifest.mark_done(name, debate_file)
@@ -22,7 +22,7 @@ class AsyncMediatorHandler:
         *,
         model: AsyncLanguageModel,
         config: MediatorConfig,
-        debate_config: DebateConfig,
+        debate_configs: list[DebateConfig],
         summary_handler: AsyncSummaryHandler,
         probability_config: ProbabilityMappingConfig | None = None,
     ) -> None:
@@ -31,14 +31,14 @@ class AsyncMediatorHandler:
         Args:
             model: The language model to use.
             config: The mediator configuration.
-            debate_config: The debate configuration.
+            debate_configs: The debate configurations (1 per parallel debate).
             summary_handler: The conversation summary handler.
             probability_config: The probability mapping config to use for monitoring mediator intervention. Defaults to None.
         """
 
         self.model = model
         self.config = config
-        self.debate_config = debate_config
+        self.debate_configs = debate_configs
         self.summary_handler = summary_handler
         self.probability_mapper = (
             ProbabilityMapper(probability_config) if probability_config else None
@@ -55,7 +55,7 @@ class AsyncMediatorHandler:
 
         results, prompts = await async_mediator_interventions(
             model=self.model,
-            config=self.debate_config,
+            configs=self.debate_configs,
             mediator=self.config,
             summary=self.summary_handler,
             valid_indexes=valid_indexes,
@@ -67,7 +67,7 @@ class AsyncMediatorHandler:
                 debater=None,
                 text=result["text"],
                 prompt=prompt,
-                justification=result["intervention_justification"],  # TODO Update
+                justification=result["justification"],
                 timestamp=datetime.now(),
             )
             for result, prompt in zip(results, prompts)
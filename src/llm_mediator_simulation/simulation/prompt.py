@@ -1,5 +1,8 @@
 """Prompt utilities for the debate simulation."""
 
+import asyncio
+import json as json_module
+import re
 from random import randint, sample, shuffle
 from typing import Literal, Sequence, Type, TypeVar, cast
 
@@ -9,6 +12,7 @@ from llm_mediator_simulation.models.language_model import (
     AsyncLanguageModel,
     LanguageModel,
 )
+from llm_mediator_simulation.models.routed_model import tag_purpose
 from llm_mediator_simulation.personalities.cognitive_biases import (
     CognitiveBias,
     ReasoningError,
@@ -39,11 +43,12 @@ from llm_mediator_simulation.simulation.summary.handler import SummaryHandler
 from llm_mediator_simulation.utils.decorators import retry
 from llm_mediator_simulation.utils.json import (
     json_prompt,
-    parse_llm_json,
-    parse_llm_jsons,
+    parse_llm_json_stream,
 )
 from llm_mediator_simulation.utils.probabilities import ProbabilityMapper
 from llm_mediator_simulation.utils.prompt_utils import format_list
+from llm_mediator_simulation.utils.summary_prompt import summary_prompt
+from llm_mediator_simulation.utils.token_budget import PromptSection, TokenBudget
 from llm_mediator_simulation.utils.types import (
     Intervention,
     LLMMessage,
@@ -65,12 +70,34 @@ def response_format(utterance: Literal["message", "comment"] = "message"):
 
 
 LLM_PROBA_RESPONSE_FORMAT: dict[str, str] = {
-    "do_write": "a float probability of intervention",
+    "do_intervene": "a float probability of intervention",
     "justification": "a string justification of why you want to intervene or not, which will not be visible by others.",
     "text": "the text message for your intervention, visible by others. Leave empty if you decide not to intervene",
 }  # TODO Update
 
 
+def few_shot_example_prompt(
+    example: dict,
+    add: Literal["send", "post"],
+    utterance: Literal["message", "comment"],
+) -> str:
+    """Prompt for a few-shot example of a Reddit reply."""
+
+    statement = example["statement"].strip()
+    if statement.endswith("."):
+        statement = statement[:-1].strip()
+    penultimate_utterance = example["penultimate_utterance"]
+    last_utterance = example["last_utterance"]
+
+    return f"""\n\nEXAMPLE:
+If you were role-playing a real person with username {last_utterance["userid"]}, engaged in a conversation about the following statement: "{statement}", and replying to this {utterance}: 
+- {penultimate_utterance["userid"]}: {penultimate_utterance["text"].replace("\n", " ").strip()}, 
+
+Then you could {add} the following {utterance}:
+
+- {last_utterance["userid"]}: {last_utterance["text"].replace("\n", " ").strip()}\n"""
+
+
 def debater_intervention_prompt(
     debate_config_prompt: str,
     identifier: Literal["name", "username"],
@@ -87,19 +114,7 @@ def debater_intervention_prompt(
     if few_shot_samples:
         prompt = """You simulate real Reddit users engaging in conversations."""
         for example in few_shot_samples:
-            statement = example["statement"].strip()
-            if statement.endswith("."):
-                statement = statement[:-1].strip()
-            penultimate_utterance = example["penultimate_utterance"]
-            last_utterance = example["last_utterance"]
-
-            prompt += f"""\n\nEXAMPLE:
-If you were role-playing a real person with username {last_utterance["userid"]}, engaged in a conversation about the following statement: "{statement}", and replying to this {utterance}: 
-- {penultimate_utterance["userid"]}: {penultimate_utterance["text"].replace("\n", " ").strip()}, 
-
-Then you could {add} the following {utterance}:
-
-- {last_utterance["userid"]}: {last_utterance["text"].replace("\n", " ").strip()}\n"""
+            prompt += few_shot_example_prompt(example, add, utterance)
         prompt += "\n\nNow, "
 
     else:
@@ -141,7 +156,103 @@ Do not repeat yourself and do not quote other participants."""
     return prompt
 
 
+_DECLINED_MESSAGE = re.compile(
+    r'"do_write"\s*:\s*false\s*,\s*"justification"\s*:\s*("(?:[^"\\]|\\.)*")\s*,\s*"text"'
+)
+
+
+def declined_message(partial_response: str) -> LLMMessage | None:
+    """Parse a partial LLM JSON message response in which the debater already declined to write.
+    Its text is then empty, and does not need to be generated."""
+
+    match = _DECLINED_MESSAGE.search(partial_response)
+    if match is None:
+        return None
+
+    return {
+        "do_write": False,
+        "justification": json_module.loads(match.group(1)),
+        "text": "",
+    }
+
+
+def budgeted_debater_intervention_prompt(
+    model: LanguageModel | AsyncLanguageModel,
+    config: DebateConfig,
+    debater: DebaterConfig,
+    summary: str,
+    messages: list[str],
+    utterance: Literal["message", "comment"],
+    ignore: bool = False,
+    json: bool = True,
+    few_shot_samples: list[dict] | None = None,
+) -> str:
+    """Build the prompt for a debater intervention within the model token budget.
+    Trims the oldest few-shot examples, then the oldest messages, then the last persona details.
+    """
+    debate_config_prompt = config.to_prompt()
+    personality_prompt = (
+        debater.personality.to_prompt() if debater.personality is not None else ""
+    )
+
+    def build(
+        few_shot_samples: list[dict], messages: list[str], persona: list[str]
+    ) -> str:
+        return debater_intervention_prompt(
+            debate_config_prompt,
+            debater.identifier,
+            "\n\n".join(persona),
+            summary_prompt(
+                messages,
+                summary,
+                utterance=utterance,
+                ignore=ignore,
+            ),
+            config.add,
+            utterance,
+            agreement=(
+                debater.topic_opinion.agreement
+                if debater.topic_opinion is not None
+                else None
+            ),
+            json=json,
+            author_name=debater.name,
+            few_shot_samples=few_shot_samples,
+        )
+
+    return TokenBudget.for_model(model).fit(
+        build,
+        [
+            PromptSection(
+                "few_shot_samples",
+                few_shot_samples or [],
+                render=lambda example: few_shot_example_prompt(
+                    example, config.add, utterance
+                ),
+            ),
+            PromptSection("messages", messages),
+            PromptSection("persona", personality_prompt.split("\n\n"), trim_from="end"),
+        ],
+    )
+
+
+def debater_text_message(response: str, author_name: str) -> LLMMessage:
+    """Parse a plain text debater response, that completes a `- {author_name}:` line."""
+
+    text = response.split(f"{author_name}: ")[-1].strip()
+    # Remove trailing quotes
+    if text.endswith('"') and text.startswith('"'):
+        text = text[1:-1]
+
+    return {
+        "do_write": True,
+        "justification": "",
+        "text": text,
+    }
+
+
 @retry(attempts=5, verbose=True)
+@tag_purpose("debater")
 def debater_intervention(
     model: LanguageModel,
     config: DebateConfig,
@@ -152,38 +263,38 @@ def debater_intervention(
     few_shot_samples: list[dict] | None = None,
 ) -> tuple[LLMMessage, str]:
     """Debater intervention: decision, motivation for the intervention, and intervention content."""
-    author_name = debater.name
-    prompt = debater_intervention_prompt(
-        config.to_prompt(),
-        debater.identifier,
-        debater.personality.to_prompt() if debater.personality is not None else "",
-        summary.to_prompt(),
-        config.add,
+    prompt = budgeted_debater_intervention_prompt(
+        model,
+        config,
+        debater,
+        summary.summary,
+        summary.message_strings,
         summary.utterance,
-        agreement=(
-            debater.topic_opinion.agreement
-            if debater.topic_opinion is not None
-            else None
-        ),
+        ignore=summary.ignore,
         json=json,
-        author_name=author_name,
         few_shot_samples=few_shot_samples,
     )
 
-    response = model.sample(prompt, seed=seed, json=json)
-    if json:
-        parsed_response = parse_llm_json(response, LLMMessage)
+    if json and model.structured_output:
+        parsed_response = cast(
+            LLMMessage,
+            model.sample_json(prompt, response_format(summary.utterance), seed=seed),
+        )
+    elif json:
+        # Stop the generation as soon as the answer is known
+        parsed_response, _ = parse_llm_json_stream(
+            model.sample_stream(
+                prompt,
+                seed=seed,
+                json=json,
+                json_format=response_format(summary.utterance),
+            ),
+            LLMMessage,
+            early_result=declined_message,
+        )
     else:
-        text = response.split(f"{author_name}: ")[-1].strip()
-        # Remove trailing quotes
-        if text.endswith('"') and text.startswith('"'):
-            text = text[1:-1]
-
-        parsed_response: LLMMessage = {
-            "do_write": True,
-            "justification": "",
-            "text": text,
-        }
+        response = model.sample(prompt, seed=seed, json=json)
+        parsed_response = debater_text_message(response, debater.name)
 
     return parsed_response, prompt
 
@@ -191,6 +302,47 @@ def debater_intervention(
 def prompt_for_update(
     debater: DebaterConfig, debate_statement: str, interventions: list[Intervention]
 ) -> str:
+    """Build the prompt for a debater's personality update."""
+    return prompt_and_format_for_update(debater, debate_statement, interventions)[0]
+
+
+def budgeted_prompt_and_format_for_update(
+    model: LanguageModel | AsyncLanguageModel,
+    debater: DebaterConfig,
+    debate_statement: str,
+    interventions: list[Intervention],
+) -> tuple[str, dict[str, str]]:
+    """Build the prompt for a debater's personality update within the model token budget,
+    trimming the oldest interventions first, and the JSON format of the expected answer.
+    """
+
+    # The answer format is shuffled: keep the one of the final prompt
+    answer_formats: list[dict[str, str]] = []
+
+    def build(interventions: list[Intervention]) -> str:
+        prompt, answer_format = prompt_and_format_for_update(
+            debater, debate_statement, interventions
+        )
+        answer_formats.append(answer_format)
+        return prompt
+
+    prompt = TokenBudget.for_model(model).fit(
+        build,
+        [
+            PromptSection(
+                "interventions",
+                interventions,
+                render=lambda intervention: intervention.text or "",
+            )
+        ],
+    )
+    return prompt, answer_formats[-1]
+
+
+def prompt_and_format_for_update(
+    debater: DebaterConfig, debate_statement: str, interventions: list[Intervention]
+) -> tuple[str, dict[str, str]]:
+    """Build the prompt for a debater's personality update, and the JSON format of the expected answer."""
 
     ################################################
     # Build the prompt for the debater's current personality
@@ -526,7 +678,7 @@ name: {debater.name};\n"""
     prompt += "\n"
     prompt += f"""{json_prompt(answer_format)}"""
 
-    return prompt
+    return prompt, answer_format
 
 
 def llm_call_needed(debater: DebaterConfig) -> bool:
@@ -795,6 +947,7 @@ def update_personality_from_sampling(personality: Personality | None) -> None:
 
 
 @retry(attempts=5, verbose=True)
+@tag_purpose("debater_update")
 def debater_update(
     model: LanguageModel,
     debate_statement: str,
@@ -811,12 +964,13 @@ def debater_update(
         ):
             return ""
     personality = debater.personality
-    prompt = prompt_for_update(debater, debate_statement, interventions)
+    prompt, answer_format = budgeted_prompt_and_format_for_update(
+        model, debater, debate_statement, interventions
+    )
 
     # If only cognitive bias or fallacies can evolve, then no need for an LLM call since it's purely based on random sampling
     if llm_call_needed(debater):
-        response = model.sample(prompt)
-        data: dict[str, str] = parse_llm_json(response)
+        data = model.sample_json(prompt, answer_format)
         update_personality_from_response(debater, data)
 
     update_personality_from_sampling(personality)
@@ -922,6 +1076,7 @@ def update_feature_list_randomly(
 
 
 @retry(attempts=5, verbose=True)
+@tag_purpose("mediator")
 def mediator_intervention(
     model: LanguageModel,
     config: DebateConfig,
@@ -950,8 +1105,10 @@ CONVERSATION HISTORY WITH TIMESTAMPS:
 {json_prompt(LLM_PROBA_RESPONSE_FORMAT)}
     """
 
-    response = model.sample(prompt, seed=seed)
-    parsed_response = parse_llm_json(response, LLMProbaMessage)
+    parsed_response = cast(
+        LLMProbaMessage,
+        model.sample_json(prompt, LLM_PROBA_RESPONSE_FORMAT, seed=seed),
+    )
 
     p = parsed_response["do_intervene"]
     if probability_mapper is not None:
@@ -962,73 +1119,78 @@ CONVERSATION HISTORY WITH TIMESTAMPS:
     # TODO do_intervene and the probability mapper have not been kept in the async version so probably remove it from the sync version for consistency
 
 
+@tag_purpose("debater")
 async def async_debater_interventions(
     model: AsyncLanguageModel,
-    config: DebateConfig,
+    configs: list[DebateConfig],
     summary: AsyncSummaryHandler,
     debaters: list[DebaterConfig],
+    indexes: list[int] | None = None,
     seed: int | None = None,
+    json: bool = True,
+    few_shot_samples: list[dict] | None = None,
     retry_attempts: int = 5,
 ) -> tuple[list[LLMMessage], list[str]]:
     """Debater intervention: decision, motivation for the intervention, and intervention content. Asynchonous / batched.
 
     Args:
         model: The language model to use.
-        config: The debate configuration.
+        configs: The debate configurations (1 per debater).
         summary: The conversation summary handler for the parallel debates.
         debaters: The debaters participating the respective debates (1 per debate. They can be the same repeated).
+        indexes: The debates of the debaters in the summary handler. Defaults to None: every debate, in order.
         seed: The seed to use for the random sampling at generation.
+        json: Whether to enforce JSON generation. Defaults to True.
+        few_shot_samples: The few-shot samples to use for the debaters. Defaults to None.
         retry_attempts: The number of retry attempts in case of parsing failure. Defaults to 5.
     """
 
-    prompts: list[str] = []
-    summary_prompts = await summary.to_prompts()
-
-    for debater, debate_summary in zip(debaters, summary_prompts):
-        prompt = debater_intervention_prompt(
-            config.to_prompt(),
-            debater.to_prompt(),
-            debate_summary,
-            config.add,
-            summary.utterance,
-        )
-        prompts.append(prompt)
-
-    responses = await model.sample(prompts, seed=seed)
-    coerced, failed = parse_llm_jsons(responses, LLMMessage)
-
-    attempts = 1
-    while len(failed) > 0 and attempts < retry_attempts:
-        prompts = [prompts[i] for i in failed]
-        responses = await model.sample(prompts)
-        new_coerced, new_failed = parse_llm_jsons(responses, LLMMessage)
-        failed = new_failed
-        coerced.extend(new_coerced)
-        attempts += 1
-
-    if len(failed) > 0:
-        # Print the prompt and response of one of the failed attempts
-        prompt = prompts[failed[0]]
-        response = responses[failed[0]]
+    if indexes is None:
+        indexes = list(range(len(debaters)))
 
-        print("Prompt for last failed invocation:")
-        print(prompt)
-        print()
+    assert (
+        len(configs) == len(debaters) == len(indexes)
+    ), "Configs, debaters and indexes must have the same length."
 
-        print("Response for last failed invocation:")
-        print(response)
-        print()
+    message_strings = summary.message_strings
 
-        raise ValueError(
-            f"Failed to parse {len(failed)} LLM responses after {retry_attempts} attempts"
+    prompts = [
+        budgeted_debater_intervention_prompt(
+            model,
+            config,
+            debater,
+            summary.summaries[index],
+            message_strings[index],
+            summary.utterance,
+            ignore=summary.ignore,
+            json=json,
+            few_shot_samples=few_shot_samples,
         )
+        for config, debater, index in zip(configs, debaters, indexes)
+    ]
+
+    if not json:
+        responses = await model.sample(prompts, seed=seed, json=json)
+        return [
+            debater_text_message(response, debater.name)
+            for response, debater in zip(responses, debaters)
+        ], prompts
+
+    coerced = await async_sample_json_with_retries(
+        model,
+        prompts,
+        response_format(summary.utterance),
+        seed=seed,
+        retry_attempts=retry_attempts,
+    )
 
-    return coerced, prompts
+    return cast(list[LLMMessage], coerced), prompts
 
 
+@tag_purpose("mediator")
 async def async_mediator_interventions(
     model: AsyncLanguageModel,
-    config: DebateConfig,
+    configs: list[DebateConfig],
     mediator: MediatorConfig,
     summary: AsyncSummaryHandler,
     seed: int | None = None,
@@ -1036,13 +1198,15 @@ async def async_mediator_interventions(
     retry_attempts: int = 5,
 ) -> tuple[list[LLMMessage], list[str]]:
     prompts: list[str] = []
+    answer_format = response_format()
 
     summary_prompts = summary.raw_history_prompts()
 
     if valid_indexes is not None:
         summary_prompts = [summary_prompts[i] for i in valid_indexes]
+        configs = [configs[i] for i in valid_indexes]
 
-    for debate_summary in summary_prompts:
+    for config, debate_summary in zip(configs, summary_prompts):
         prompts.append(
             f"""{config.to_prompt()}. 
 
@@ -1053,92 +1217,123 @@ async def async_mediator_interventions(
 
             {mediator.to_prompt()}
 
-            {json_prompt(LLM_RESPONSE_FORMAT)} # TODO
+            {json_prompt(answer_format)}
             """
         )
 
-    responses = await model.sample(prompts, seed=seed)
-    coerced, failed = parse_llm_jsons(responses, LLMMessage)
+    coerced = await async_sample_json_with_retries(
+        model, prompts, answer_format, seed=seed, retry_attempts=retry_attempts
+    )
+
+    return cast(list[LLMMessage], coerced), prompts
+
+
+async def async_sample_json_with_retries(
+    model: AsyncLanguageModel,
+    prompts: list[str],
+    json_format: dict[str, str],
+    seed: int | None = None,
+    retry_attempts: int = 5,
+) -> list[dict]:
+    """Generate JSON answers to a batch of prompts, sampling again (without seed) the answers
+    that do not match the format. The answers are returned in the order of the prompts.
+
+    Throws:
+        ValueError: If some answers still do not match the format after all attempts.
+    """
+
+    answers = await model.sample_json(prompts, json_format, seed=seed)
+    failed = [i for i, answer in enumerate(answers) if answer is None]
 
     attempts = 1
     while len(failed) > 0 and attempts < retry_attempts:
-        prompts = [prompts[i] for i in failed]
-        responses = await model.sample(prompts)
-        new_coerced, new_failed = parse_llm_jsons(responses, LLMMessage)
-        failed = new_failed
-        coerced.extend(new_coerced)
+        new_answers = await model.sample_json([prompts[i] for i in failed], json_format)
+        for i, answer in zip(failed, new_answers):
+            answers[i] = answer
+        failed = [i for i in failed if answers[i] is None]
         attempts += 1
 
     if len(failed) > 0:
-        # Print the prompt and response of one of the failed attempts
-        prompt = prompts[failed[0]]
-        response = responses[failed[0]]
-
         print("Prompt for last failed invocation:")
-        print(prompt)
-        print()
-
-        print("Response for last failed invocation:")
-        print(response)
+        print(prompts[failed[0]])
         print()
 
         raise ValueError(
             f"Failed to parse {len(failed)} LLM responses after {retry_attempts} attempts"
         )
 
-    return coerced, prompts
+    return cast(list[dict], answers)
 
 
 @retry(attempts=5, verbose=True)
+@tag_purpose("debater_update")
 async def async_debater_update(
     model: AsyncLanguageModel,
-    debate_statement: str,
+    debate_statements: list[str],
     debaters: list[DebaterConfig],
     interventions: list[list[Intervention]],
 ) -> list[str]:
     """Update multiple debater personalities based on the respective interventions passed as arguments, asynchronously.
     The debater configuration topic opinion and personality are updated in place.
 
-    Returns the prompts used for the personality updates."""
-
-    assert len(debaters) == len(
-        interventions
-    ), "Debaters and interventions must have the same length."  # Indeed len(debaters) = parallel_debates
-
-    if len(debaters) == 0:
-        return []
-
-    debater_0 = debaters[0]
-    if not debater_0.variable_topic_opinion:
-        if debater_0.personality is None or not (
-            debater_0.personality.variable_personality()
-        ):
-            return [""] * len(debaters)
+    Returns the prompts used for the personality updates (empty for the debaters that do not evolve).
+    """
 
-    sep = "\n"
+    assert (
+        len(debaters) == len(interventions) == len(debate_statements)
+    ), "Debaters, interventions and statements must have the same length."  # Indeed len(debaters) = parallel_debates
+
+    prompts = [""] * len(debaters)
+    variable: list[int] = []
+
+    # The debaters of different debates can have different personalities, and thus different answer formats:
+    # there is one batch per answer format
+    batches: dict[tuple, tuple[dict[str, str], list[int]]] = {}
+
+    for k, (debater, statement, debater_interventions) in enumerate(
+        zip(debaters, debate_statements, interventions)
+    ):
+        if not debater.variable_topic_opinion:
+            if debater.personality is None or not (
+                debater.personality.variable_personality()
+            ):
+                continue
 
-    # Build the prompts for every debater variant
-    prompts: list[str] = []
+        assert (
+            debater.personality is not None
+        ), "Personality must be set for the debater."
+        variable.append(k)
 
-    for debater, debater_interventions in zip(debaters, interventions):
-        personality = debater.personality
-        assert personality is not None, "Personality must be set for the debater."
-        prompt = prompt_for_update(
+        prompt, answer_format = budgeted_prompt_and_format_for_update(
+            model,
             debater,
-            debate_statement,  # Assuming all parallel debates deals with the same debate statement
+            statement,
             debater_interventions,
         )
-        prompts.append(prompt)
-
-    # If only cognitive bias or fallacies can evolve, then no need for an LLM call since it's purely based on random sampling
-    if llm_call_needed(debater_0):
-        responses = await model.sample(prompts)
+        prompts[k] = prompt
+
+        # If only cognitive bias or fallacies can evolve, then no need for an LLM call since it's purely based on random sampling
+        if llm_call_needed(debater):
+            # The answer formats are shuffled: group them by their sorted fields
+            key = tuple(sorted(answer_format.items()))
+            if key not in batches:
+                batches[key] = (answer_format, [])
+            batches[key][1].append(k)
+
+    answers = await asyncio.gather(
+        *(
+            model.sample_json([prompts[k] for k in indexes], answer_format)
+            for answer_format, indexes in batches.values()
+        )
+    )
 
-        for response, debater in zip(responses, debaters):
-            data = parse_llm_json(response)
-            update_personality_from_response(debater, data)
+    for (_, indexes), batch_answers in zip(batches.values(), answers):
+        for k, data in zip(indexes, batch_answers):
+            if data is None:
+                raise ValueError("JSON response does not match the expected format.")
+            update_personality_from_response(debaters[k], data)
 
-    for debater in debaters:
-        update_personality_from_sampling(debater.personality)
+    for k in variable:
+        update_personality_from_sampling(debaters[k].personality)
 
     return prompts
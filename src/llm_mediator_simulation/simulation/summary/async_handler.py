@@ -46,26 +46,36 @@ class AsyncSummaryHandler(AsyncPromptable):
 
     @property
     def message_strings(self) -> list[list[str]]:
-        """Return the last message string contents"""
+        """Return the last message string contents, in the same format as `SummaryHandler`"""
 
         return [
-            [message.text for message in debate if message.text]
+            [
+                f"- {message.debater.name if message.debater else 'Mediator'}: {message.text}"
+                for message in debate
+                if message.text
+            ]
             for debate in self.latest_messages
         ]
 
-    def add_new_messages(self, messages: list[Intervention]) -> None:
+    def add_new_messages(
+        self, messages: list[Intervention], valid_indexes: list[int] | None = None
+    ) -> None:
         """Add new messages to the latest messages list.
 
         Args:
             messages: The messages to add, 1 per debate. It is assumed that it contains 1 intervention per debate, \
 active or not. Empty messages are ignored.
+            valid_indexes: The debates of the messages, if they only cover some of the debates. Defaults to None.
         """
 
-        assert (
-            len(messages) == self.parallel_debates
+        if valid_indexes is None:
+            valid_indexes = list(range(self.parallel_debates))
+
+        assert len(messages) == len(
+            valid_indexes
         ), "The number of messages must match the number of debates."
 
-        for index, message in enumerate(messages):
+        for index, message in zip(valid_indexes, messages):
             if not message.text:
                 continue
 
@@ -73,16 +83,44 @@ active or not. Empty messages are ignored.
                 -self._latest_messages_limit :
             ]
 
-    async def regenerate_summaries(self, seed: int | None = None) -> None:
+    async def regenerate_summaries(
+        self, seed: int | None = None, indexes: list[int] | None = None
+    ) -> None:
         """Regenerate the debate summaries.
-        All summaries are regenerated, even for the individual debates that may not have been updated.
+
+        Args:
+            seed: The seed to use for the random sampling at generation.
+            indexes: The debates to regenerate the summaries of. Defaults to None: all summaries are regenerated, \
+even for the individual debates that may not have been updated.
         """
-        if self.ignore:
-            pass
-        else:
-            self.summaries = await summarize_conversation_with_last_messages_async(
-                self._model, self.summaries, self.message_strings, seed=seed
-            )
+        if indexes is None:
+            indexes = list(range(self.parallel_debates))
+
+        summaries = await self.next_summaries(indexes, self.message_strings, seed=seed)
+        for index, summary in zip(indexes, summaries):
+            self.summaries[index] = summary
+
+    async def next_summaries(
+        self,
+        indexes: list[int],
+        message_strings: list[list[str]],
+        seed: int | None = None,
+    ) -> list[str]:
+        """Compute the summaries following the given latest messages, without storing them.
+
+        Args:
+            indexes: The debates to summarize.
+            message_strings: The latest messages of every debate.
+        """
+        if self.ignore or not indexes:
+            return [self.summaries[index] for index in indexes]
+
+        return await summarize_conversation_with_last_messages_async(
+            self._model,
+            [self.summaries[index] for index in indexes],
+            [message_strings[index] for index in indexes],
+            seed=seed,
+        )
 
     @override
     async def to_prompts(self) -> list[str]:
@@ -64,15 +64,22 @@ class SummaryHandler(Promptable):
 
     def regenerate_summary(self, seed: int | None = None) -> str:
         """Regenerate the summary with the latest messages."""
-        if self.ignore:
-            pass
-        else:
-            self.summary = summarize_conversation_with_last_messages(
-                self._model, self.summary, self.message_strings, seed
-            )
+        self.summary = self.next_summary(self.message_strings, seed)
 
         return self.summary
 
+    def next_summary(self, message_strings: list[str], seed: int | None = None) -> str:
+        """Compute the summary following the given latest messages, without storing it.
+
+        Safe to run in another thread while new messages are added.
+        """
+        if self.ignore:
+            return self.summary
+
+        return summarize_conversation_with_last_messages(
+            self._model, self.summary, message_strings, seed
+        )
+
     @override
     def to_prompt(self) -> str:
 
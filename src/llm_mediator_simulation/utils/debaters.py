@@ -1,20 +1,18 @@
 """Debaters utilities."""
 
-from llm_mediator_simulation.simulation.debater.async_handler import AsyncDebaterHandler
 from llm_mediator_simulation.simulation.debater.config import DebaterConfig
 from llm_mediator_simulation.simulation.debater.handler import DebaterHandler
 
 
 def remove_statement_from_personalities(
-    debaters: list[DebaterHandler] | list[AsyncDebaterHandler], statement: str
+    debaters: list[DebaterHandler] | list[DebaterConfig], statement: str
 ) -> None:
     """remove the statement from the list of statements if it is in the debater's agreement_with_statements"""
     for debater in debaters:
-        if isinstance(debater, AsyncDebaterHandler):
-            for config in debater.configs:
-                _remove_statement_from_personality(config, statement)
-        else:
+        if isinstance(debater, DebaterHandler):
             _remove_statement_from_personality(debater.config, statement)
+        else:
+            _remove_statement_from_personality(debater, statement)
 
 
 def _remove_statement_from_personality(config: DebaterConfig, statement: str) -> None:
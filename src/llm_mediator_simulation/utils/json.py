@@ -2,7 +2,7 @@
 
 import json
 import re
-from typing import TypeVar
+from typing import Callable, Iterable, TypeVar
 
 
 def json_prompt(format: dict[str, str]) -> str:
@@ -22,6 +22,81 @@ def json_prompt(format: dict[str, str]) -> str:
 """
 
 
+_STRING_OPTIONS = re.compile(r"^an? string \(([^)]*)\)")
+
+
+def json_schema(format: dict[str, str]) -> dict:
+    """Build the JSON schema of the responses to a `json_prompt` format.
+    Value types are inferred from the descriptions: "bool", "a float ...", "an int ...",
+    "a string ("a", "b", or "c") ..." (enum), and strings otherwise.
+
+    Args:
+        format (dict[str, str]): The format of the json response, with a description for each key.
+    """
+
+    properties: dict[str, dict] = {}
+
+    for key, description in format.items():
+        lowered = description.strip().lower()
+        options = _STRING_OPTIONS.match(lowered)
+
+        if lowered.startswith(("bool", "a bool")):
+            properties[key] = {"type": "boolean"}
+        elif lowered.startswith(("float", "a float")):
+            properties[key] = {"type": "number"}
+        elif lowered.startswith(("int", "an int")):
+            properties[key] = {"type": "integer"}
+        elif options is not None:
+            properties[key] = {
+                "type": "string",
+                "enum": re.findall(r'"([^"]*)"', description[: options.end()]),
+            }
+        else:
+            properties[key] = {"type": "string"}
+
+    return {
+        "type": "object",
+        "properties": properties,
+        "required": list(format),
+        "additionalProperties": False,
+    }
+
+
+_SCHEMA_TYPES: dict[str, type | tuple[type, ...]] = {
+    "boolean": bool,
+    "number": (int, float),
+    "integer": int,
+    "string": str,
+}
+
+
+def validate_json_schema(data: object, schema: dict) -> bool:
+    """Validate that a JSON object matches a flat `json_schema` schema:
+    required keys, value types and enum options. Excess fields are allowed."""
+
+    if not isinstance(data, dict):
+        return False
+
+    for key in schema.get("required", []):
+        if key not in data:
+            return False
+
+    for key, field in schema.get("properties", {}).items():
+        if key not in data:
+            continue
+        value = data[key]
+        expected_type = _SCHEMA_TYPES.get(field.get("type", "string"), object)
+        # bool is a subclass of int, but not a JSON number
+        if not isinstance(value, expected_type) or (
+            isinstance(value, bool) and field.get("type") != "boolean"
+        ):
+            return False
+        if "enum" in field and value not in field["enum"]:
+            return False
+
+    return True
+
+
 def validate_shallow_json(data: dict, typedDict) -> bool:
     """Validate that a shallow JSON object can be coerced to the given TypedDict instance.
     Excess fields are allowed.
@@ -116,3 +191,109 @@ If None, no validation is performed.
             failed.append(i)
 
     return coerced, failed
+
+
+class _JSONObjectScanner:
+    """Incrementally find the top-level JSON objects of a text stream, by tracking
+    brace depth outside of strings."""
+
+    def __init__(self) -> None:
+        self.text = ""
+        self._position = 0
+        self._depth = 0
+        self._start = -1
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, chunk: str) -> list[str]:
+        """Add a text chunk, and return the objects it completes."""
+
+        self.text += chunk
+        objects: list[str] = []
+
+        for position in range(self._position, len(self.text)):
+            char = self.text[position]
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"' and self._depth > 0:
+                self._in_string = True
+            elif char == "{":
+                if self._depth == 0:
+                    self._start = position
+                self._depth += 1
+            elif char == "}" and self._depth > 0:
+                self._depth -= 1
+                if self._depth == 0:
+                    objects.append(self.text[self._start : position + 1])
+
+        self._position = len(self.text)
+        return objects
+
+
+def parse_llm_json_stream(
+    chunks: Iterable[str],
+    typedDict: type[T] | None = None,
+    early_result: Callable[[str], T | None] | None = None,
+    schema: dict | None = None,
+) -> tuple[T, str]:
+    """Parse a streamed LLM JSON response, and stop consuming the stream as soon as
+    a JSON object that can be coerced to the given TypedDict instance is complete.
+    The stream is closed when stopping early, which stops the generation.
+
+    Args:
+        chunks (Iterable[str]): The LLM response text chunks.
+        typedDict (TypedDict | None): The TypedDict instance to which the response should be coerced. \
+If None, no validation is performed.
+        early_result (Callable[[str], T | None] | None): Optional function called on the text received so far, \
+which returns a result to stop on before the JSON object is complete (or None to keep reading).
+        schema (dict | None): Optional `json_schema` schema that the JSON object must also match.
+
+    Returns:
+        The parsed response, and the text received until it was parsed.
+
+    Throws:
+        ValueError: If the stream ends without a valid JSON object.
+    """
+
+    scanner = _JSONObjectScanner()
+    iterator = iter(chunks)
+
+    try:
+        for chunk in iterator:
+            # Like `extract_json`, prefer the last object when a chunk completes several
+            for candidate in reversed(scanner.feed(chunk)):
+                try:
+                    data = json.loads(candidate)
+                except json.JSONDecodeError:
+                    continue
+                if (typedDict is None or _matches(data, typedDict)) and (
+                    schema is None or validate_json_schema(data, schema)
+                ):
+                    return data, scanner.text
+
+            if early_result is not None:
+                result = early_result(scanner.text)
+                if result is not None:
+                    return result, scanner.text
+    finally:
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            close()
+
+    # Let the usual parsing report what is wrong with the full response
+    return parse_llm_json(scanner.text, typedDict), scanner.text
+
+
+def _matches(data: object, typedDict) -> bool:
+    """Silent shallow validation of a JSON object against a TypedDict instance."""
+
+    return isinstance(data, dict) and all(
+        key in data and isinstance(data[key], expected_type_hint)
+        for key, expected_type_hint in typedDict.__annotations__.items()
+    )
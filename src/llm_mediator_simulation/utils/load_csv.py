@@ -1,11 +1,12 @@
 """Helper to load data from a CSV file"""
 
+import functools
 import json
 import re
 from collections import defaultdict
 from datetime import datetime
 from enum import Enum
-from typing import TypeVar
+from typing import Literal, TypeVar
 
 import polars as pd
 
@@ -449,3 +450,40 @@ def load_deliberate_lab_csv_chat(
     ]
 
     return list(debaters.values()), interventions, None
+
+
+def load_csv_chat(
+    path: str,
+    app: Literal["deliberate-lab", "reddit"] = "deliberate-lab",
+    truncated_num: int | None = 2,
+    force_truncated_order: bool | None = None,
+    load_debater_profiles: bool = False,
+    debater_profiles_path: str | None = None,
+    statement: str | None = None,
+    prune_debaters: bool = True,
+) -> tuple[list[DebaterConfig], list[Intervention], list[str] | None]:
+    """Extract a list of debater configs, interventions and forced debater order from a chat CSV file
+    exported from the given app. The other arguments only apply to Reddit conversations, see `load_reddit_csv_conv`.
+    `force_truncated_order` defaults to whether messages are truncated."""
+
+    if force_truncated_order is None:
+        force_truncated_order = bool(truncated_num)
+
+    if app == "deliberate-lab":
+        load = load_deliberate_lab_csv_chat
+    elif app == "reddit":
+        load = functools.partial(
+            load_reddit_csv_conv,
+            truncated_num=truncated_num,
+            force_truncated_order=force_truncated_order,
+            load_debater_profiles=load_debater_profiles,
+            debater_profiles_path=debater_profiles_path,
+            statement=statement,
+            prune_debaters=prune_debaters,
+        )
+    else:
+        raise ValueError(
+            f"Unknown app {app}. Supported apps are: 'deliberate-lab', 'reddit'."
+        )
+
+    return load(path)
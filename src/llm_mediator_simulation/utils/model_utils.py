@@ -6,12 +6,15 @@ from llm_mediator_simulation.models.language_model import (
     AsyncLanguageModel,
     LanguageModel,
 )
+from llm_mediator_simulation.models.routed_model import tag_purpose
+from llm_mediator_simulation.utils.token_budget import PromptSection, TokenBudget
 
 ###################################################################################################
 #                                         SUMMARIZATION                                           #
 ###################################################################################################
 
 
+@tag_purpose("summary")
 def summarize_message(model: LanguageModel, message: str) -> str:
     """Generate a summary of the given message."""
 
@@ -23,6 +26,7 @@ def summarize_message(model: LanguageModel, message: str) -> str:
     return model.sample(prompt)
 
 
+@tag_purpose("summary")
 def summarize_conversation(model: LanguageModel, conversation: list[str]) -> str:
     """Generate a summary of the given conversation."""
 
@@ -35,26 +39,44 @@ def summarize_conversation(model: LanguageModel, conversation: list[str]) -> str
     return model.sample(prompt)
 
 
-def summarize_conversation_with_last_messages(
-    model: LanguageModel,
-    previous_summary: str,
-    latest_messages: list[str],
-    seed: int | None = None,
+def summary_update_prompt(
+    budget: TokenBudget, previous_summary: str, latest_messages: list[str]
 ) -> str:
-    """Generate a summary of the given conversation, with an emphasis on the latest messages."""
+    """Build the prompt to update a conversation summary with the latest messages.
+    The oldest messages are left out if the prompt exceeds the token budget."""
 
     separator = "\n\n"
-    prompt = f"""Conversation summary: {previous_summary}
+
+    def build(messages: list[str]) -> str:
+        return f"""Conversation summary: {previous_summary}
 
     Latest messages:
-    {separator.join(latest_messages)}
+    {separator.join(messages)}
 
     Summarize the conversation above, with an emphasis on the latest messages.
     """
 
+    return budget.fit(build, [PromptSection("messages", latest_messages)])
+
+
+@tag_purpose("summary")
+def summarize_conversation_with_last_messages(
+    model: LanguageModel,
+    previous_summary: str,
+    latest_messages: list[str],
+    seed: int | None = None,
+) -> str:
+    """Generate a summary of the given conversation, with an emphasis on the latest messages.
+    The oldest messages are left out if the prompt exceeds the model token budget."""
+
+    prompt = summary_update_prompt(
+        TokenBudget.for_model(model), previous_summary, latest_messages
+    )
+
     return model.sample(prompt, seed)
 
 
+@tag_purpose("summary")
 async def summarize_conversation_with_last_messages_async(
     model: AsyncLanguageModel,
     previous_summaries: list[str],
@@ -63,18 +85,11 @@ async def summarize_conversation_with_last_messages_async(
 ) -> list[str]:
     """Generate summaries of the given conversations, with an emphasis on the latest messages, asynchronously."""
 
-    separator = "\n\n"
-    prompts: list[str] = []
-
-    for previous_summary, messages in zip(previous_summaries, latest_messages):
-        prompt = f"""Conversation summary: {previous_summary}
-
-Latest messages:
-{separator.join(messages)}
-
-Summarize the conversation above, with an emphasis on the latest messages.
-"""
-        prompts.append(prompt)
+    budget = TokenBudget.for_model(model)
+    prompts = [
+        summary_update_prompt(budget, previous_summary, messages)
+        for previous_summary, messages in zip(previous_summaries, latest_messages)
+    ]
 
     return await model.sample(prompts, seed=seed)
 
@@ -0,0 +1,162 @@
+"""Token-budgeted prompt assembly: trim the least important parts of a prompt
+so that it fits in the context window of a model."""
+
+import weakref
+from dataclasses import dataclass, field
+from typing import Any, Callable, Literal
+
+
+@dataclass
+class PromptSection:
+    """A trimmable part of a prompt, as a list of items (few-shot examples, messages...).
+
+    Attributes:
+        name: The name of the section, which is also the keyword argument of the prompt builder.
+        items: The items of the section.
+        trim_from: Which end of the section is trimmed first: "start" for the oldest items, "end" for the last ones.
+        render: The text of an item, to count its tokens.
+    """
+
+    name: str
+    items: list[Any]
+    trim_from: Literal["start", "end"] = "start"
+    render: Callable[[Any], str] = str
+
+
+@dataclass
+class TrimReport:
+    """How a prompt was fitted to the token budget.
+
+    Attributes:
+        budget: The maximum number of prompt tokens.
+        prompt_tokens: The number of tokens of the final prompt.
+        trimmed: The number of items trimmed from each section.
+        trimmed_tokens: The number of tokens saved by trimming.
+    """
+
+    budget: int
+    prompt_tokens: int
+    trimmed: dict[str, int] = field(default_factory=dict)
+    trimmed_tokens: int = 0
+
+    @property
+    def fits(self) -> bool:
+        return self.prompt_tokens <= self.budget
+
+
+class TokenBudget:
+    """Token budget of the prompts sent to a model.
+
+    Prompts are built by a function taking the items of each section as keyword arguments.
+    When a prompt exceeds the budget, the items of its sections are trimmed one by one,
+    section after section in the given priority order, until it fits."""
+
+    def __init__(
+        self, *, max_prompt_tokens: int | None, count_tokens: Callable[[str], int]
+    ) -> None:
+        """Initialize the token budget.
+
+        Args:
+            max_prompt_tokens: The maximum number of prompt tokens. None disables trimming.
+            count_tokens: The function counting the tokens of a text.
+        """
+
+        self.max_prompt_tokens = max_prompt_tokens
+        self.count_tokens = count_tokens
+
+        self.last_report: TrimReport | None = None
+
+        # Counters
+        self.calls = 0
+        self.trimmed_calls = 0
+        self.trimmed_tokens = 0
+
+    def fit(self, build: Callable[..., str], sections: list[PromptSection]) -> str:
+        """Build a prompt that fits in the budget, trimming its sections in the given order.
+        The report of the call is stored in `last_report`."""
+
+        items = {section.name: list(section.items) for section in sections}
+        prompt = build(**items)
+        self.calls += 1
+
+        if self.max_prompt_tokens is None:
+            self.last_report = None
+            return prompt
+
+        tokens = self.count_tokens(prompt)
+        report = TrimReport(budget=self.max_prompt_tokens, prompt_tokens=tokens)
+        self.last_report = report
+
+        while tokens > self.max_prompt_tokens:
+            # Remove items according to their own token counts, then rebuild and recount once
+            estimate = tokens
+            for section in sections:
+                remaining = items[section.name]
+                while estimate > self.max_prompt_tokens and remaining:
+                    item = remaining.pop(0 if section.trim_from == "start" else -1)
+                    estimate -= self.count_tokens(section.render(item))
+                    report.trimmed[section.name] = (
+                        report.trimmed.get(section.name, 0) + 1
+                    )
+
+            if estimate == tokens:
+                break  # Nothing left to trim
+
+            prompt = build(**items)
+            tokens = self.count_tokens(prompt)
+
+        report.trimmed_tokens = report.prompt_tokens - tokens
+        report.prompt_tokens = tokens
+
+        if report.trimmed:
+            self.trimmed_calls += 1
+            self.trimmed_tokens += report.trimmed_tokens
+
+        return prompt
+
+    @staticmethod
+    def for_model(model: Any) -> "TokenBudget":
+        """The token budget of a model, created on first use.
+
+        The budget is the `max_prompt_tokens` attribute of the model, or of the model it wraps
+        (unlimited if there is none). Tokens are counted with the model tokenizer if it has one,
+        else estimated with tiktoken."""
+
+        budget = _BUDGETS.get(model)
+        if budget is None:
+            budget = _BUDGETS[model] = _model_budget(model)
+        return budget
+
+
+_BUDGETS: "weakref.WeakKeyDictionary[Any, TokenBudget]" = weakref.WeakKeyDictionary()
+
+
+def _model_budget(model: Any) -> TokenBudget:
+    """Find the budget and tokenizer of a model, looking through model wrappers."""
+
+    model_name = getattr(model, "model_name", type(model).__name__)
+    max_prompt_tokens: int | None = None
+    tokenizer = None
+
+    # Wrappers keep the model they wrap in their `model` attribute
+    wrapped = model
+    while wrapped is not None and tokenizer is None:
+        if max_prompt_tokens is None:
+            max_prompt_tokens = getattr(wrapped, "max_prompt_tokens", None)
+        tokenizer = getattr(wrapped, "tokenizer", None)
+        wrapped = getattr(wrapped, "model", None)
+
+    if tokenizer is not None:
+        encode = tokenizer.encode
+        return TokenBudget(
+            max_prompt_tokens=max_prompt_tokens,
+            count_tokens=lambda text: len(encode(text)),
+        )
+
+    # Imported here, as the rate limiter pulls in asyncio
+    from llm_mediator_simulation.models.rate_limiter import estimate_tokens
+
+    return TokenBudget(
+        max_prompt_tokens=max_prompt_tokens,
+        count_tokens=lambda text: estimate_tokens(text, model_name),
+    )
@@ -0,0 +1,81 @@
+"""Stand-in HTTP servers for the model client tests."""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable
+
+
+class FakeServer:
+    """Threaded HTTP/1.1 server answering POST requests with a handler function,
+    and GET requests with a health status.
+
+    Records the received JSON payloads, the client ports (one per TCP connection)
+    and the maximum number of requests handled concurrently."""
+
+    def __init__(
+        self,
+        respond: Callable[[str, dict[str, Any]], tuple[int, dict[str, str], str]],
+        delay: float = 0.0,
+    ):
+        self.respond = respond
+        self.delay = delay
+        self.healthy = True
+        self.payloads: list[dict[str, Any]] = []
+        self.client_ports: set[int] = set()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+
+                with fake.lock:
+                    fake.payloads.append(payload)
+                    fake.client_ports.add(self.client_address[1])
+                    fake.in_flight += 1
+                    fake.max_in_flight = max(fake.max_in_flight, fake.in_flight)
+
+                time.sleep(fake.delay)
+                status, headers, body = fake.respond(self.path, payload)
+
+                with fake.lock:
+                    fake.in_flight -= 1
+
+                encoded = body.encode()
+                self.send_response(status)
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.send_header("Content-Length", str(len(encoded)))
+                self.end_headers()
+                self.wfile.write(encoded)
+
+            def do_GET(self):
+                body = b"Local LLM Server"
+                self.send_response(200 if fake.healthy else 503)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("localhost", 0), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self) -> "FakeServer":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.server.shutdown()
+        self.server.server_close()
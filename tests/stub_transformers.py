@@ -0,0 +1,123 @@
+"""Stand-ins for torch, transformers and peft, to test the bookkeeping of the local
+HuggingFace model wrappers without the heavy dependencies."""
+
+import contextlib
+import importlib
+import sys
+import types
+from types import SimpleNamespace
+from typing import Any, Iterator
+from unittest import mock
+
+import numpy as np
+
+PAD_TOKEN_ID = 0
+EOS_TOKEN_ID = 1
+
+
+class StubTensor(np.ndarray):
+    """Array with the `to(device)` method of torch tensors."""
+
+    def to(self, device: Any) -> "StubTensor":
+        return self
+
+
+class StubTokenizer:
+    """Character-level tokenizer, padding on the left."""
+
+    pad_token = "<pad>"
+    eos_token = "</s>"
+    pad_token_id = PAD_TOKEN_ID
+    eos_token_id = EOS_TOKEN_ID
+    model_max_length = 2048
+
+    def __init__(self) -> None:
+        self.padding_side = "right"
+
+    def __call__(
+        self,
+        prompts: list[str],
+        return_tensors: str | None = None,
+        padding: bool = False,
+        add_special_tokens: bool = True,
+    ) -> SimpleNamespace:
+        ids = [[ord(char) for char in prompt] for prompt in prompts]
+        if not padding:
+            return SimpleNamespace(input_ids=ids)
+
+        length = max(len(row) for row in ids)
+        input_ids = np.array(
+            [[PAD_TOKEN_ID] * (length - len(row)) + row for row in ids]
+        )
+        return SimpleNamespace(
+            input_ids=input_ids.view(StubTensor),
+            attention_mask=(input_ids != PAD_TOKEN_ID).view(StubTensor),
+        )
+
+    def get_vocab(self) -> dict[str, int]:
+        return {}
+
+    def batch_decode(self, rows: Any, skip_special_tokens: bool = True) -> list[str]:
+        return [
+            "".join(chr(token) for token in row if token > EOS_TOKEN_ID) for row in rows
+        ]
+
+
+class StubModel:
+    """Causal model that completes every prompt with the same text, and records
+    the keyword arguments of its `generate` calls."""
+
+    device = "cpu"
+
+    def __init__(self, completion: str = " OK") -> None:
+        self.completion = completion
+        self.generate_kwargs: list[dict[str, Any]] = []
+
+    def generate(self, input_ids: StubTensor, **kwargs: Any) -> StubTensor:
+        self.generate_kwargs.append(kwargs)
+        new_tokens = np.array(
+            [[ord(char) for char in self.completion]] * len(input_ids)
+        )
+        return np.concatenate([input_ids, new_tokens], axis=1).view(StubTensor)
+
+    def register_forward_hook(self, hook: Any) -> None:
+        pass
+
+
+def _stub_modules() -> dict[str, Any]:
+    transformers = mock.MagicMock()
+    # Base classes subclassed at import time, and plain lists
+    transformers.LogitsProcessor = type("LogitsProcessor", (), {})
+    transformers.StoppingCriteria = type("StoppingCriteria", (), {})
+    transformers.LogitsProcessorList = list
+    transformers.StoppingCriteriaList = list
+    transformers.AutoTokenizer.from_pretrained.side_effect = lambda *_, **__: (
+        StubTokenizer()
+    )
+    transformers.AutoModelForCausalLM.from_pretrained.side_effect = (
+        lambda *_, **__: StubModel()
+    )
+
+    peft = mock.MagicMock()
+    peft.PeftModel = type("PeftModel", (), {})
+
+    torch = mock.MagicMock()
+    torch.no_grad = contextlib.nullcontext
+
+    return {"torch": torch, "transformers": transformers, "peft": peft}
+
+
+@contextlib.contextmanager
+def stub_hf_local_model() -> Iterator[types.ModuleType]:
+    """Import a fresh `hf_local_model` module running on the stand-ins.
+    The real modules (if any) are restored on exit."""
+
+    names = [
+        "llm_mediator_simulation.models.hf_local_model",
+        "llm_mediator_simulation.models.constrained_decoding",
+        "llm_mediator_simulation.utils.reproducibility",
+    ]
+    with mock.patch.dict(sys.modules, _stub_modules()):
+        for name in names:
+            sys.modules.pop(name, None)
+        yield importlib.import_module(names[0])
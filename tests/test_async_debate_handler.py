@@ -0,0 +1,340 @@
+import asyncio
+import hashlib
+import os
+import re
+import tempfile
+import unittest
+from datetime import datetime
+from typing import Any
+
+from llm_mediator_simulation.models.language_model import (
+    AsyncLanguageModel,
+    LanguageModel,
+)
+from llm_mediator_simulation.simulation.debate.async_handler import AsyncDebateHandler
+from llm_mediator_simulation.simulation.debate.config import DebateConfig, DebateSlot
+from llm_mediator_simulation.simulation.debate.handler import DebateHandler
+from llm_mediator_simulation.simulation.debater.config import DebaterConfig
+from llm_mediator_simulation.simulation.mediator.config import MediatorConfig
+from llm_mediator_simulation.simulation.summary.config import SummaryConfig
+from llm_mediator_simulation.utils.types import Intervention
+
+STATEMENT = "Cats are better than dogs."
+
+FEW_SHOT_SAMPLES = [
+    {
+        "statement": "Pineapple belongs on pizza.",
+        "penultimate_utterance": {"userid": "carol", "text": "It does not."},
+        "last_utterance": {"userid": "dave", "text": "It does, it is delicious."},
+    }
+]
+
+CSV_CHAT = """User ID,User Name,Text,Timestamp
+alice,alice,Cats are independent.,1700000000
+bob,bob,Dogs are loyal.,1700000060
+alice,alice,Cats are cleaner.,1700000120
+bob,bob,Dogs go on walks with you.,1700000180
+alice,alice,Cats do not bark.,1700000240
+"""
+
+
+def digest(prompt: str) -> str:
+    # Ignore the timestamps of the raw message history, which change with the wall clock
+    prompt = re.sub(r"\[\d{4}-\d{2}-\d{2} [^\]]*\]", "", prompt)
+    return hashlib.sha256(prompt.encode()).hexdigest()[:8]
+
+
+class HashModel(LanguageModel):
+    """Answer deterministically from the prompt."""
+
+    def sample(self, prompt: str, seed: int | None = None, **kwargs: Any) -> str:
+        if kwargs.get("json_format"):
+            # Skip a turn now and then
+            do_write = "true" if digest(prompt) >= "6" else "false"
+            return (
+                f'{{"do_write": {do_write}, "justification": "Because {digest(prompt)}", '
+                f'"text": "{f"Message {digest(prompt)}" if do_write == "true" else ""}"}}'
+            )
+        if kwargs.get("json") is False:
+            return f"Message {digest(prompt)}"
+        return f"Summary {digest(prompt)}"
+
+
+class AsyncHashModel(AsyncLanguageModel):
+    """Answer deterministically from the prompts, like `HashModel`."""
+
+    def __init__(self) -> None:
+        self.model = HashModel()
+        self.batch_sizes: list[int] = []
+
+    async def sample(
+        self, prompts: list[str], seed: int | None = None, **kwargs: Any
+    ) -> list[str]:
+        self.batch_sizes.append(len(prompts))
+        await asyncio.sleep(0)
+        return [self.model.sample(prompt, seed, **kwargs) for prompt in prompts]
+
+
+def sync_debate(**kwargs: Any) -> DebateHandler:
+    return DebateHandler(
+        debater_model=HashModel(),
+        mediator_model=HashModel(),
+        debaters=[DebaterConfig(name="alice"), DebaterConfig(name="bob")],
+        config=DebateConfig(statement=STATEMENT),
+        summary_config=SummaryConfig(),
+        seed=42,
+        background_metrics=False,
+        **kwargs,
+    )
+
+
+def async_debate(**kwargs: Any) -> AsyncDebateHandler:
+    return AsyncDebateHandler(
+        debater_model=AsyncHashModel(),
+        mediator_model=AsyncHashModel(),
+        debaters=[DebaterConfig(name="alice"), DebaterConfig(name="bob")],
+        config=DebateConfig(statement=STATEMENT),
+        summary_config=SummaryConfig(),
+        seed=42,
+        **kwargs,
+    )
+
+
+def transcript(interventions) -> list[tuple[str | None, str | None, str]]:
+    return [
+        (
+            intervention.debater.name if intervention.debater else None,
+            intervention.text,
+            intervention.prompt,
+        )
+        for intervention in interventions
+    ]
+
+
+class TestAsyncDebateHandlerParity(unittest.TestCase):
+    def assert_same_debates(self, sync: DebateHandler, parallel: AsyncDebateHandler):
+        # The first parallel debate follows the debater order of the sync debate
+        self.assertEqual(
+            transcript(parallel.interventions[0]), transcript(sync.interventions)
+        )
+        self.assertEqual(
+            parallel.summary_handler.summaries[0], sync.summary_handler.summary
+        )
+
+    def test_same_transcripts_as_sync(self):
+        sync = sync_debate()
+        sync.run(rounds=4)
+
+        parallel = async_debate(parallel_debates=3)
+        asyncio.run(parallel.run(rounds=4))
+
+        self.assertEqual(len(sync.interventions), 8)
+        self.assertIn(
+            None, [intervention.text or None for intervention in sync.interventions]
+        )
+        self.assert_same_debates(sync, parallel)
+
+    def test_same_transcripts_without_json_and_with_few_shot_samples(self):
+        options = dict(json_debater_reponse=False, few_shot_samples=FEW_SHOT_SAMPLES)
+
+        sync = sync_debate(**options)
+        sync.run(rounds=2)
+
+        parallel = async_debate(**options)
+        asyncio.run(parallel.run(rounds=2))
+
+        self.assert_same_debates(sync, parallel)
+        self.assertIn("EXAMPLE:", sync.interventions[0].prompt)
+        self.assertIn("Message", sync.interventions[0].text or "")
+
+    def test_same_transcripts_from_reddit_csv(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "chat.csv")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(CSV_CHAT)
+
+            sync = sync_debate()
+            sync.preload_csv_chat(path, app="reddit", truncated_num=2)
+            sync.run(rounds=2)
+
+            parallel = async_debate(parallel_debates=2)
+            asyncio.run(parallel.preload_csv_chat(path, app="reddit", truncated_num=2))
+            asyncio.run(parallel.run(rounds=2))
+
+        self.assert_same_debates(sync, parallel)
+        self.assertIsNone(parallel.debater_order)
+
+        # The forced order of the truncated messages is followed in the first round
+        replayed = parallel.interventions[0][3:5]
+        self.assertEqual(
+            [
+                intervention.debater and intervention.debater.name
+                for intervention in replayed
+            ],
+            ["bob", "alice"],
+        )
+
+    def test_speculative_summaries_with_mediator(self):
+        debates: dict[bool, AsyncDebateHandler] = {}
+        for speculative_summary in (False, True):
+            debates[speculative_summary] = AsyncDebateHandler(
+                debater_model=AsyncHashModel(),
+                mediator_model=AsyncHashModel(),
+                mediator_config=MediatorConfig(),
+                summary_config=SummaryConfig(),
+                seed=42,
+                speculative_summary=speculative_summary,
+                slots=slots(),
+            )
+            asyncio.run(debates[speculative_summary].run(rounds=2))
+
+        sequential, speculative = debates[False], debates[True]
+
+        # The mediator both intervenes and stays silent
+        mediator_texts = [
+            intervention.text
+            for interventions in sequential.interventions
+            for intervention in interventions
+            if intervention.debater is None
+        ]
+        self.assertIn(None, [text or None for text in mediator_texts])
+        self.assertTrue(any(mediator_texts))
+
+        # The mediator prompts contain timestamps: compare the authors and texts
+        self.assertEqual(
+            [
+                [(name, text) for name, text, _ in transcript(interventions)]
+                for interventions in speculative.interventions
+            ],
+            [
+                [(name, text) for name, text, _ in transcript(interventions)]
+                for interventions in sequential.interventions
+            ],
+        )
+        self.assertEqual(
+            speculative.summary_handler.summaries, sequential.summary_handler.summaries
+        )
+
+    def test_forced_order_with_unknown_debater(self):
+        parallel = async_debate()
+        parallel.debater_order = ["alice", "carol"]
+
+        with self.assertRaises(ValueError):
+            asyncio.run(parallel.run(rounds=1))
+
+
+def slots() -> list[DebateSlot]:
+    preloaded = [
+        Intervention(
+            debater=DebaterConfig(name=name),
+            text=text,
+            prompt="",
+            justification="",
+            timestamp=datetime(2024, 1, 1),
+        )
+        for name, text in [("carol", "Tabs are clearer."), ("dan", "Spaces align.")]
+    ]
+
+    return [
+        DebateSlot(
+            DebateConfig(statement=STATEMENT),
+            [DebaterConfig(name="alice"), DebaterConfig(name="bob")],
+        ),
+        DebateSlot(
+            DebateConfig(statement="Tabs are better than spaces."),
+            [
+                DebaterConfig(name="carol"),
+                DebaterConfig(name="dan"),
+                DebaterConfig(name="erin"),
+            ],
+            interventions=preloaded,
+            debater_order=["erin", "carol", "dan"],
+        ),
+        DebateSlot(
+            DebateConfig(statement="Winter is the best season."),
+            [DebaterConfig(name="frank")],
+        ),
+    ]
+
+
+class TestHeterogeneousSlots(unittest.TestCase):
+    def test_different_debates_share_batches(self):
+        debater_model = AsyncHashModel()
+        parallel = AsyncDebateHandler(
+            debater_model=debater_model,
+            mediator_model=AsyncHashModel(),
+            summary_config=SummaryConfig(),
+            seed=42,
+            slots=slots(),
+        )
+        asyncio.run(parallel.run(rounds=2))
+
+        # One batch per debater turn, covering the debates that have a debater at this turn
+        self.assertEqual(debater_model.batch_sizes, [3, 2, 1, 3, 2, 1])
+
+        # The first debate is the same as when run alone
+        sync = sync_debate()
+        sync.run(rounds=2)
+        self.assertEqual(
+            transcript(parallel.interventions[0]), transcript(sync.interventions)
+        )
+
+        # Every debate keeps its own statement, debaters and chat
+        for interventions, slot in zip(parallel.interventions, slots()):
+            self.assertEqual(
+                {intervention.debater.name for intervention in interventions},  # type: ignore
+                {debater.name for debater in slot.debaters},
+            )
+            for intervention in interventions[len(slot.interventions) :]:
+                self.assertIn(slot.config.statement, intervention.prompt)
+
+        self.assertEqual(
+            [intervention.text for intervention in parallel.interventions[1][:2]],
+            ["Tabs are clearer.", "Spaces align."],
+        )
+        self.assertEqual(
+            [
+                intervention.debater and intervention.debater.name
+                for intervention in parallel.interventions[1][2:5]
+            ],
+            ["erin", "carol", "dan"],
+        )
+        self.assertEqual(len(parallel.interventions[2]), 2)
+
+        pickles = parallel.to_debate_pickles()
+        self.assertEqual(
+            [debate.config.statement for debate in pickles],
+            [slot.config.statement for slot in slots()],
+        )
+        self.assertEqual(
+            [debater.name for debater in pickles[1].debaters], ["carol", "dan", "erin"]
+        )
+
+    def test_mediator_follows_every_debate(self):
+        parallel = AsyncDebateHandler(
+            debater_model=AsyncHashModel(),
+            mediator_model=AsyncHashModel(),
+            mediator_config=MediatorConfig(),
+            summary_config=SummaryConfig(),
+            seed=42,
+            slots=slots(),
+        )
+        asyncio.run(parallel.run(rounds=1))
+
+        mediator_prompts = [
+            [
+                intervention.prompt
+                for intervention in interventions
+                if intervention.debater is None
+            ]
+            for interventions in parallel.interventions
+        ]
+        self.assertEqual(len(mediator_prompts[1]), 2)
+
+        for prompts, slot in zip(mediator_prompts, slots()):
+            for prompt in prompts:
+                self.assertIn(slot.config.statement, prompt)
+
+
+if __name__ == "__main__":
+    unittest.main()
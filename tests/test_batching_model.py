@@ -0,0 +1,82 @@
+import asyncio
+import unittest
+from typing import Any
+
+from llm_mediator_simulation.models.batching_model import BatchingAsyncLanguageModel
+from llm_mediator_simulation.models.language_model import AsyncLanguageModel
+
+
+class SlowEchoModel(AsyncLanguageModel):
+    def __init__(self, fail: bool = False):
+        self.batches: list[list[str]] = []
+        self.fail = fail
+
+    async def sample(
+        self, prompts: list[str], seed: int | None = None, **kwargs: Any
+    ) -> list[str]:
+        self.batches.append(prompts)
+        await asyncio.sleep(0.05)
+        if self.fail:
+            raise RuntimeError("Server error")
+        return [f"{prompt} ({seed})" for prompt in prompts]
+
+
+class TestBatchingAsyncLanguageModel(unittest.TestCase):
+    def test_concurrent_calls_share_batches(self):
+        backend = SlowEchoModel()
+        model = BatchingAsyncLanguageModel(model=backend)
+
+        async def run():
+            return await asyncio.gather(
+                model.sample(["a", "b"], seed=1),
+                model.sample(["c"], seed=1),
+                model.sample(["d"], seed=2),
+                model.sample([], seed=1),
+            )
+
+        results = asyncio.run(run())
+
+        self.assertEqual(results, [["a (1)", "b (1)"], ["c (1)"], ["d (2)"], []])
+        self.assertEqual(backend.batches, [["a", "b", "c"], ["d"]])
+        self.assertEqual(model.stats.batches, 2)
+        self.assertEqual(model.stats.mean_batch_size, 2)
+
+    def test_full_batches_are_sent_early(self):
+        backend = SlowEchoModel()
+        model = BatchingAsyncLanguageModel(model=backend, max_batch_size=2, max_wait=10)
+
+        async def run():
+            return await asyncio.wait_for(
+                asyncio.gather(model.sample(["a"]), model.sample(["b"])), timeout=1
+            )
+
+        self.assertEqual(asyncio.run(run()), [["a (None)"], ["b (None)"]])
+        self.assertEqual(backend.batches, [["a", "b"]])
+
+    def test_errors_reach_every_caller(self):
+        model = BatchingAsyncLanguageModel(model=SlowEchoModel(fail=True))
+
+        async def run():
+            return await asyncio.gather(
+                model.sample(["a"]), model.sample(["b"]), return_exceptions=True
+            )
+
+        for result in asyncio.run(run()):
+            self.assertIsInstance(result, RuntimeError)
+
+    def test_json_calls_are_batched_apart(self):
+        backend = SlowEchoModel()
+        model = BatchingAsyncLanguageModel(model=backend)
+
+        async def run():
+            return await asyncio.gather(
+                model.sample(["a"]), model.sample_json(["b"], {"text": "a string"})
+            )
+
+        asyncio.run(run())
+
+        self.assertEqual(sorted(backend.batches), [["a"], ["b"]])
+
+
+if __name__ == "__main__":
+    unittest.main()
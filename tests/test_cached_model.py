@@ -0,0 +1,148 @@
+import asyncio
+import os
+import sqlite3
+import stat
+import tempfile
+import unittest
+from typing import Any
+
+from llm_mediator_simulation.models.cached_model import (
+    CachedAsyncLanguageModel,
+    CachedLanguageModel,
+)
+from llm_mediator_simulation.models.dedup_model import DeduplicatingAsyncLanguageModel
+from llm_mediator_simulation.models.language_model import (
+    AsyncLanguageModel,
+    LanguageModel,
+)
+
+
+class CountingModel(LanguageModel):
+    model_name = "counting"
+
+    def __init__(self):
+        self.calls = 0
+
+    def sample(self, prompt: str, seed: int | None = None, **kwargs: Any) -> str:
+        self.calls += 1
+        return f"{prompt} #{self.calls}"
+
+
+class CountingAsyncModel(AsyncLanguageModel):
+    model_name = "counting"
+
+    def __init__(self):
+        self.prompts: list[str] = []
+
+    async def sample(
+        self, prompts: list[str], seed: int | None = None, **kwargs: Any
+    ) -> list[str]:
+        self.prompts.extend(prompts)
+        return [prompt.upper() for prompt in prompts]
+
+
+class UnnamedAsyncModel(CountingAsyncModel):
+    """Backend without a model identity, like a local server."""
+
+    model_name = None
+
+
+class TestCachedLanguageModel(unittest.TestCase):
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), "cache.sqlite")
+
+    def test_modes(self):
+        model = CountingModel()
+        cached = CachedLanguageModel(model=model, path=self.path)
+
+        self.assertEqual(cached.sample("a", seed=1), "a #1")
+        self.assertEqual(cached.sample("a", seed=1), "a #1")
+        # The seed and kwargs are part of the key
+        self.assertEqual(cached.sample("a", seed=2), "a #2")
+        self.assertEqual(cached.sample("a", seed=1, json=True), "a #3")
+        # Unseeded calls are not cached
+        self.assertEqual(cached.sample("a"), "a #4")
+        self.assertEqual((cached.hits, model.calls), (1, 4))
+
+        refreshed = CachedLanguageModel(model=model, path=self.path, mode="refresh")
+        self.assertEqual(refreshed.sample("a", seed=1), "a #5")
+
+        read_only = CachedLanguageModel(model=model, path=self.path, mode="read_only")
+        self.assertEqual(read_only.sample("a", seed=1), "a #5")
+        self.assertEqual(read_only.sample("b", seed=1), "b #6")
+        self.assertEqual(len(read_only.cache), 3)
+
+    def test_read_only_mode_does_not_write(self):
+        cached = CachedLanguageModel(model=CountingModel(), path=self.path)
+        cached.sample("a", seed=1)
+        cached.cache.close()
+        # Leave no WAL files behind, then forbid writes
+        sqlite3.connect(self.path).execute(
+            "PRAGMA journal_mode=DELETE"
+        ).connection.close()
+        with open(self.path, "rb") as file:
+            content = file.read()
+        os.chmod(self.path, stat.S_IRUSR)
+
+        read_only = CachedLanguageModel(
+            model=CountingModel(), path=self.path, mode="read_only"
+        )
+        self.assertEqual(read_only.sample("a", seed=1), "a #1")
+        self.assertEqual(read_only.sample("b", seed=1), "b #1")
+        read_only.cache.close()
+
+        with open(self.path, "rb") as file:
+            self.assertEqual(file.read(), content)
+
+        with self.assertRaises(FileNotFoundError):
+            CachedLanguageModel(
+                model=CountingModel(), path=self.path + ".missing", mode="read_only"
+            )
+
+    def test_eviction(self):
+        cached = CachedLanguageModel(
+            model=CountingModel(), path=self.path, max_entries=2
+        )
+        for prompt in ["a", "b", "c"]:
+            cached.sample(prompt, seed=0)
+
+        self.assertEqual(len(cached.cache), 2)
+        self.assertEqual(cached.sample("c", seed=0), "c #3")
+        self.assertEqual(cached.sample("a", seed=0), "a #4")
+
+    def test_async_only_sends_missing_prompts(self):
+        model = CountingAsyncModel()
+        cached = CachedAsyncLanguageModel(model=model, path=self.path)
+
+        asyncio.run(cached.sample(["a", "b"], seed=0))
+        results = asyncio.run(cached.sample(["b", "c", "a"], seed=0))
+
+        self.assertEqual(results, ["B", "C", "A"])
+        self.assertEqual(model.prompts, ["a", "b", "c"])
+
+    def test_models_without_a_name_need_an_explicit_one(self):
+        for model in [
+            UnnamedAsyncModel(),
+            DeduplicatingAsyncLanguageModel(model=UnnamedAsyncModel()),
+        ]:
+            with self.assertRaises(ValueError):
+                CachedAsyncLanguageModel(model=model, path=self.path)
+
+        first = UnnamedAsyncModel()
+        second = UnnamedAsyncModel()
+        asyncio.run(
+            CachedAsyncLanguageModel(
+                model=first, path=self.path, model_name="server-a"
+            ).sample(["a"], seed=0)
+        )
+        asyncio.run(
+            CachedAsyncLanguageModel(
+                model=second, path=self.path, model_name="server-b"
+            ).sample(["a"], seed=0)
+        )
+        # Each server got its own cache entry
+        self.assertEqual((first.prompts, second.prompts), (["a"], ["a"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
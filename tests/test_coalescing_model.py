@@ -0,0 +1,78 @@
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from llm_mediator_simulation.models.coalescing_model import CoalescingHFLocalModel
+
+
+class RecordingBatchModel:
+    """Stand-in for HFLocalModel that records the batches it receives."""
+
+    model_name = "recording"
+
+    def __init__(self):
+        self.batches: list[tuple[list[str], int | None, dict]] = []
+        self.lock = threading.Lock()
+
+    def sample_batch(self, prompts, seed=None, **kwargs):
+        with self.lock:
+            self.batches.append((list(prompts), seed, kwargs))
+        return [f"{prompt} -> {kwargs.get('max_new_tokens')}" for prompt in prompts]
+
+
+class TestCoalescingHFLocalModel(unittest.TestCase):
+    def test_concurrent_calls_are_batched(self):
+        model = RecordingBatchModel()
+        coalescer = CoalescingHFLocalModel(model=model, max_batch_size=4, max_wait=1)  # type: ignore
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(
+                executor.map(
+                    lambda i: coalescer.sample(f"prompt {i}", seed=1, max_new_tokens=5),
+                    range(4),
+                )
+            )
+        coalescer.close()
+
+        # Every caller gets its own completion back
+        self.assertEqual(results, [f"prompt {i} -> 5" for i in range(4)])
+        self.assertEqual(len(model.batches), 1)
+        self.assertEqual(coalescer.stats().batch_sizes, {4: 1})
+        self.assertEqual(coalescer.stats().requests, 4)
+
+    def test_calls_are_grouped_by_generation_kwargs(self):
+        model = RecordingBatchModel()
+        coalescer = CoalescingHFLocalModel(model=model, max_batch_size=8, max_wait=0.2)  # type: ignore
+
+        futures = [
+            coalescer.submit("a", max_new_tokens=5),
+            coalescer.submit("b", max_new_tokens=10),
+            coalescer.submit("c", max_new_tokens=5),
+            coalescer.submit("d", max_new_tokens=5, stop_strings=["\n"]),
+        ]
+        results = [future.result() for future in futures]
+        coalescer.close()
+
+        self.assertEqual(results, ["a -> 5", "b -> 10", "c -> 5", "d -> 5"])
+        self.assertEqual(
+            sorted(prompts for prompts, *_ in model.batches),
+            [["a", "c"], ["b"], ["d"]],
+        )
+        self.assertEqual(sum(coalescer.stats().queue_depths.values()), 4)
+
+    def test_batches_are_capped(self):
+        model = RecordingBatchModel()
+        coalescer = CoalescingHFLocalModel(model=model, max_batch_size=2, max_wait=0.2)  # type: ignore
+
+        futures = [coalescer.submit(str(i)) for i in range(5)]
+        self.assertEqual(
+            [future.result() for future in futures], [f"{i} -> None" for i in range(5)]
+        )
+        coalescer.close()
+
+        self.assertTrue(all(len(prompts) <= 2 for prompts, *_ in model.batches))
+        self.assertEqual(coalescer.stats().requests, 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
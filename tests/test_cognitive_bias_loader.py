@@ -1,5 +1,8 @@
 import csv
 import os
+import subprocess
+import sys
+import tempfile
 import unittest
 from tempfile import NamedTemporaryFile
 
@@ -67,6 +70,24 @@ class TestCognitiveBiasLoading(unittest.TestCase):
             "The inclination to presume the purposeful intervention of a sentient or intelligent agent.",
         )
 
+    def test_load_outside_the_repository(self):
+        # The catalogs are package data, independent of the working directory
+        with tempfile.TemporaryDirectory() as directory:
+            result = subprocess.run(
+                [
+                    sys.executable,
+                    "-c",
+                    "from llm_mediator_simulation.personalities.cognitive_biases import CognitiveBias; "
+                    "print(CognitiveBias.AGENT_DETECTION.value.name)",
+                ],
+                cwd=directory,
+                capture_output=True,
+                text=True,
+            )
+
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.strip(), "Agent detection")
+
 
 if __name__ == "__main__":
     unittest.main()
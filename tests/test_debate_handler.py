@@ -0,0 +1,248 @@
+import hashlib
+import os
+import pickle
+import re
+import tempfile
+import threading
+import time
+import unittest
+from typing import Any
+
+from llm_mediator_simulation.metrics.criteria import ArgumentQuality
+from llm_mediator_simulation.metrics.metrics_handler import MetricsHandler
+from llm_mediator_simulation.models.dummy_model import DummyModel
+from llm_mediator_simulation.models.language_model import LanguageModel
+from llm_mediator_simulation.simulation.debate.config import DebateConfig
+from llm_mediator_simulation.simulation.debate.handler import DebateHandler
+from llm_mediator_simulation.simulation.debater.config import DebaterConfig
+from llm_mediator_simulation.simulation.mediator.config import MediatorConfig
+from llm_mediator_simulation.utils.model_utils import Agreement
+
+MEDIATOR_DELAY = 0.2
+
+
+class GatedScoringModel(LanguageModel):
+    """Score every argument quality once released, and count the scorings in progress."""
+
+    def __init__(self) -> None:
+        self.in_flight = 0
+        self.changed = threading.Condition()
+        self.released = threading.Event()
+
+    def sample(self, prompt: str, seed: int | None = None, **kwargs: Any) -> str:
+        with self.changed:
+            self.in_flight += 1
+            self.changed.notify_all()
+        self.released.wait(timeout=10)
+        with self.changed:
+            self.in_flight -= 1
+        return '{"CLARITY": 2}'
+
+
+class BatchScoringModel(LanguageModel):
+    """Score every argument quality, and record the size of each `sample_many` batch."""
+
+    def __init__(self) -> None:
+        self.batch_sizes: list[int] = []
+
+    def sample(self, prompt: str, seed: int | None = None, **kwargs: Any) -> str:
+        return '{"CLARITY": 2}'
+
+    def sample_many(
+        self, prompts: list[str], seed: int | None = None, **kwargs: Any
+    ) -> list[str]:
+        self.batch_sizes.append(len(prompts))
+        return [self.sample(prompt, seed, **kwargs) for prompt in prompts]
+
+
+class SilentMediatorModel(LanguageModel):
+    """Never intervene, and summarize with a delay."""
+
+    def __init__(self) -> None:
+        self.summaries = 0
+
+    def sample(self, prompt: str, seed: int | None = None, **kwargs: Any) -> str:
+        time.sleep(MEDIATOR_DELAY)
+        if "do_intervene" in prompt:
+            return '{"do_intervene": 0.0, "justification": "All good", "text": ""}'
+
+        self.summaries += 1
+        return f"Summary {self.summaries}"
+
+
+class CrashingHashModel(LanguageModel):
+    """Answer deterministically from the prompt (ignoring timestamps), and fail after a given number of calls."""
+
+    def __init__(self, crash_after: int | None = None) -> None:
+        self.calls = 0
+        self.crash_after = crash_after
+
+    def sample(self, prompt: str, seed: int | None = None, **kwargs: Any) -> str:
+        self.calls += 1
+        if self.crash_after is not None and self.calls > self.crash_after:
+            raise ConnectionError("Backend unreachable")
+
+        prompt = re.sub(r"\[\d{4}-\d{2}-\d{2} [^\]]*\]", "", prompt)
+        digest = hashlib.sha256(prompt.encode()).hexdigest()[:8]
+        if "do_intervene" in prompt:
+            do_intervene = "1.0" if digest >= "c" else "0.0"
+            return (
+                f'{{"do_intervene": {do_intervene}, "justification": "Because {digest}", '
+                f'"text": "Calm down {digest}"}}'
+            )
+        if kwargs.get("json_format"):
+            return (
+                f'{{"do_write": true, "justification": "", "text": "Message {digest}"}}'
+            )
+        return f"Summary {digest}"
+
+
+def make_debate(**kwargs: Any) -> DebateHandler:
+    model = DummyModel()
+    return DebateHandler(
+        debater_model=model,
+        mediator_model=model,
+        debaters=[DebaterConfig(name="Alice"), DebaterConfig(name="Bob")],
+        config=DebateConfig(statement="Cats are better than dogs."),
+        seed=42,
+        **kwargs,
+    )
+
+
+class TestBackgroundMetrics(unittest.TestCase):
+    def test_metrics_do_not_block_the_debate(self):
+        model = GatedScoringModel()
+        metrics = MetricsHandler(
+            model=model, argument_qualities=[ArgumentQuality.CLARITY]
+        )
+        debate = make_debate(metrics_handler=metrics, background_metrics=True)
+        wait_for_metrics = debate.wait_for_metrics
+
+        def release_and_wait() -> None:
+            # The whole debate ran while no score could complete
+            self.assertEqual(len(debate.interventions), 6)
+            for intervention in debate.interventions:
+                self.assertIsNone(intervention.metrics)
+            # The 4 workers score concurrently
+            with model.changed:
+                self.assertTrue(
+                    model.changed.wait_for(lambda: model.in_flight == 4, timeout=10)
+                )
+            model.released.set()
+            wait_for_metrics()
+
+        debate.wait_for_metrics = release_and_wait  # type: ignore
+        debate.run(rounds=3)
+
+        for intervention in debate.interventions:
+            assert intervention.metrics is not None
+            self.assertEqual(
+                intervention.metrics.argument_qualities,
+                {ArgumentQuality.CLARITY: Agreement.NEUTRAL},
+            )
+
+    def test_inline_metrics(self):
+        model = BatchScoringModel()
+        metrics = MetricsHandler(
+            model=model, argument_qualities=[ArgumentQuality.CLARITY]
+        )
+        debate = make_debate(metrics_handler=metrics)
+
+        debate.run(rounds=2)
+
+        for intervention in debate.interventions:
+            self.assertIsNotNone(intervention.metrics)
+        self.assertEqual(metrics._pending, [])
+        # The interventions of each round are scored together
+        self.assertEqual(model.batch_sizes, [2, 2])
+
+
+class TestSpeculativeSummary(unittest.TestCase):
+    def run_debate(self, speculative_summary: bool) -> tuple[DebateHandler, float]:
+        debate = DebateHandler(
+            debater_model=DummyModel(),
+            mediator_model=SilentMediatorModel(),
+            debaters=[DebaterConfig(name="Alice"), DebaterConfig(name="Bob")],
+            config=DebateConfig(statement="Cats are better than dogs."),
+            mediator_config=MediatorConfig(),
+            seed=42,
+            speculative_summary=speculative_summary,
+        )
+
+        start = time.perf_counter()
+        debate.run(rounds=2)
+        return debate, time.perf_counter() - start
+
+    def test_same_debate_with_one_round_trip_less(self):
+        sequential, sequential_time = self.run_debate(speculative_summary=False)
+        speculative, speculative_time = self.run_debate(speculative_summary=True)
+
+        self.assertEqual(
+            [intervention.text for intervention in speculative.interventions],
+            [intervention.text for intervention in sequential.interventions],
+        )
+        self.assertEqual(
+            speculative.summary_handler.summary, sequential.summary_handler.summary
+        )
+
+        # 4 debater turns: 4 mediator + summary latencies instead of 8
+        self.assertLess(speculative_time, 6 * MEDIATOR_DELAY)
+        self.assertGreater(sequential_time, 8 * MEDIATOR_DELAY)
+
+
+class TestCheckpoint(unittest.TestCase):
+    def make_debate(self, debater_model: LanguageModel) -> DebateHandler:
+        return DebateHandler(
+            debater_model=debater_model,
+            mediator_model=CrashingHashModel(),
+            debaters=[
+                DebaterConfig(name="Alice"),
+                DebaterConfig(name="Bob"),
+                DebaterConfig(name="Carol"),
+            ],
+            config=DebateConfig(statement="Cats are better than dogs."),
+            mediator_config=MediatorConfig(),
+            seed=42,
+        )
+
+    def test_resumed_debate_matches_uninterrupted_run(self):
+        uninterrupted = self.make_debate(CrashingHashModel())
+        uninterrupted.run(rounds=4)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "debate")
+
+            # The backend goes down during the second round
+            crashing = self.make_debate(CrashingHashModel(crash_after=5))
+            with self.assertRaises(RuntimeError):
+                crashing.run(rounds=4, checkpoint=path)
+
+            with open(f"{path}.ckpt", "rb") as file:
+                self.assertEqual(pickle.load(file).completed_rounds, 1)
+
+            resumed = DebateHandler.resume(
+                path,
+                debater_model=CrashingHashModel(),
+                mediator_model=CrashingHashModel(),
+            )
+
+            with open(f"{path}.ckpt", "rb") as file:
+                self.assertEqual(pickle.load(file).completed_rounds, 4)
+
+        self.assertEqual(
+            [
+                (intervention.debater and intervention.debater.name, intervention.text)
+                for intervention in resumed.interventions
+            ],
+            [
+                (intervention.debater and intervention.debater.name, intervention.text)
+                for intervention in uninterrupted.interventions
+            ],
+        )
+        self.assertEqual(
+            resumed.summary_handler.summary, uninterrupted.summary_handler.summary
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
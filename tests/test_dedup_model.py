@@ -0,0 +1,52 @@
+import asyncio
+import unittest
+from typing import Any
+
+from llm_mediator_simulation.models.dedup_model import DeduplicatingAsyncLanguageModel
+from llm_mediator_simulation.models.language_model import AsyncLanguageModel
+
+
+class SlowEchoModel(AsyncLanguageModel):
+    def __init__(self):
+        self.batches: list[list[str]] = []
+
+    async def sample(
+        self, prompts: list[str], seed: int | None = None, **kwargs: Any
+    ) -> list[str]:
+        self.batches.append(prompts)
+        await asyncio.sleep(0.05)
+        return [f"{prompt} ({seed})" for prompt in prompts]
+
+
+class TestDeduplicatingAsyncLanguageModel(unittest.TestCase):
+    def test_identical_prompts_are_sent_once(self):
+        backend = SlowEchoModel()
+        model = DeduplicatingAsyncLanguageModel(model=backend)
+
+        async def run():
+            return await asyncio.gather(
+                model.sample(["a", "b", "a"], seed=1),
+                model.sample(["b", "c"], seed=1),
+                model.sample(["a"], seed=2),
+            )
+
+        results = asyncio.run(run())
+
+        self.assertEqual(
+            results, [["a (1)", "b (1)", "a (1)"], ["b (1)", "c (1)"], ["a (2)"]]
+        )
+        self.assertEqual(backend.batches, [["a", "b"], ["c"], ["a"]])
+        self.assertEqual(model.saved_calls, 2)
+
+    def test_unseeded_calls_are_not_deduplicated(self):
+        backend = SlowEchoModel()
+        model = DeduplicatingAsyncLanguageModel(model=backend)
+
+        asyncio.run(model.sample(["a", "a"]))
+
+        self.assertEqual(backend.batches, [["a", "a"]])
+        self.assertEqual(model.saved_calls, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
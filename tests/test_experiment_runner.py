@@ -0,0 +1,166 @@
+import asyncio
+import hashlib
+import os
+import tempfile
+import unittest
+from typing import Any
+
+from llm_mediator_simulation.models.language_model import AsyncLanguageModel
+from llm_mediator_simulation.simulation.debate.async_handler import AsyncDebateHandler
+from llm_mediator_simulation.simulation.debate.config import DebateConfig
+from llm_mediator_simulation.simulation.debater.config import DebaterConfig
+from llm_mediator_simulation.simulation.experiment.config import DebateJob
+from llm_mediator_simulation.simulation.experiment.runner import ExperimentRunner
+
+
+class CountingHashModel(AsyncLanguageModel):
+    """Answer deterministically from the prompts, and count the batches."""
+
+    def __init__(self) -> None:
+        self.batches = 0
+
+    async def sample(
+        self, prompts: list[str], seed: int | None = None, **kwargs: Any
+    ) -> list[str]:
+        self.batches += 1
+        await asyncio.sleep(0.01)
+        digests = [
+            hashlib.sha256(prompt.encode()).hexdigest()[:8] for prompt in prompts
+        ]
+        if kwargs.get("json_format"):
+            return [
+                f'{{"do_write": true, "justification": "", "text": "Message {digest}"}}'
+                for digest in digests
+            ]
+        return [f"Summary {digest}" for digest in digests]
+
+
+def make_job(index: int) -> DebateJob:
+    return DebateJob(
+        name=f"debate_{index}",
+        config=DebateConfig(statement=f"Statement number {index}."),
+        debaters=[
+            DebaterConfig(name=f"alice_{index}"),
+            DebaterConfig(name=f"bob_{index}"),
+        ],
+    )
+
+
+class TestExperimentRunner(unittest.TestCase):
+    def test_debates_share_batches(self):
+        model = CountingHashModel()
+        runner = ExperimentRunner(
+            debater_model=model, mediator_model=model, seed=42, max_in_flight=10
+        )
+
+        results = asyncio.run(runner.run([make_job(i) for i in range(10)], rounds=2))
+
+        self.assertEqual(len(results), 10)
+        # 2 rounds of 2 debater turns, each with a debater and a summary call
+        self.assertEqual(model.batches, 8)
+        self.assertEqual(runner.debater_model.stats.mean_batch_size, 10)
+
+        # Same debates as when run alone
+        alone = CountingHashModel()
+        job = make_job(3)
+        debate = AsyncDebateHandler(
+            debater_model=alone,
+            mediator_model=alone,
+            debaters=job.debaters,
+            config=job.config,
+            seed=42,
+        )
+        asyncio.run(debate.run(rounds=2))
+
+        self.assertEqual(
+            [intervention.text for intervention in results["debate_3"].interventions],
+            [intervention.text for intervention in debate.interventions[0]],
+        )
+
+    def test_in_flight_debates_are_capped(self):
+        model = CountingHashModel()
+        runner = ExperimentRunner(
+            debater_model=model, mediator_model=model, seed=42, max_in_flight=2
+        )
+
+        asyncio.run(runner.run([make_job(i) for i in range(6)], rounds=1))
+
+        self.assertEqual(runner.debater_model.stats.batch_sizes, {2: 12})
+
+    def test_results_are_written_and_failures_isolated(self):
+        model = CountingHashModel()
+        failing = make_job(1)
+        failing.debater_order = ["carol"]
+
+        with tempfile.TemporaryDirectory() as directory:
+            runner = ExperimentRunner(
+                debater_model=model, mediator_model=model, output_dir=directory
+            )
+            results = asyncio.run(runner.run([make_job(0), failing], rounds=1))
+
+            self.assertEqual(list(results), ["debate_0"])
+            self.assertIsInstance(runner.failures["debate_1"], ValueError)
+            self.assertEqual(
+                sorted(os.listdir(os.path.join(directory, "debates"))),
+                ["debate_0.pkl"],
+            )
+            self.assertEqual(
+                sorted(os.listdir(os.path.join(directory, "transcripts"))),
+                ["debate_0.txt"],
+            )
+
+    def test_restarted_sweep_skips_finished_debates(self):
+        with tempfile.TemporaryDirectory() as directory:
+            # Every launch writes to its own directory, and shares the manifest
+            manifest_path = os.path.join(directory, "manifest.json")
+
+            first = ExperimentRunner(
+                debater_model=CountingHashModel(),
+                mediator_model=CountingHashModel(),
+                seed=42,
+                output_dir=os.path.join(directory, "first"),
+                manifest_path=manifest_path,
+            )
+            finished = asyncio.run(first.run([make_job(0), make_job(1)], rounds=1))
+
+            # The result file of a finished debate was lost
+            os.remove(os.path.join(directory, "first", "debates", "debate_1.pkl"))
+
+            model = CountingHashModel()
+            restarted = ExperimentRunner(
+                debater_model=model,
+                mediator_model=model,
+                seed=42,
+                output_dir=os.path.join(directory, "restarted"),
+                manifest_path=manifest_path,
+            )
+            results = asyncio.run(
+                restarted.run([make_job(i) for i in range(3)], rounds=1)
+            )
+
+            # Only the last 2 debates run, together: 2 debater turns, each with a debater and a summary call
+            self.assertEqual(model.batches, 4)
+            self.assertEqual(
+                sorted(os.listdir(os.path.join(directory, "restarted", "debates"))),
+                ["debate_1.pkl", "debate_2.pkl"],
+            )
+            self.assertEqual(sorted(results), ["debate_0", "debate_1", "debate_2"])
+            self.assertEqual(
+                [
+                    intervention.text
+                    for intervention in results["debate_0"].interventions
+                ],
+                [
+                    intervention.text
+                    for intervention in finished["debate_0"].interventions
+                ],
+            )
+            assert restarted.manifest is not None
+            self.assertEqual(
+                sorted(restarted.manifest.finished),
+                ["debate_0", "debate_1", "debate_2"],
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,8 @@
 import unittest
 import os
+import subprocess
+import sys
+import tempfile
 from tempfile import NamedTemporaryFile
 
 from llm_mediator_simulation.personalities.fallacies import Fallacy
@@ -50,6 +53,24 @@ class TestFallacyLoading(unittest.TestCase):
             "A categorical syllogism has a positive conclusion, but at least one negative premise.",
         )
 
+    def test_load_outside_the_repository(self):
+        # The catalogs are package data, independent of the working directory
+        with tempfile.TemporaryDirectory() as directory:
+            result = subprocess.run(
+                [
+                    sys.executable,
+                    "-c",
+                    "from llm_mediator_simulation.personalities.fallacies import Fallacy; "
+                    "print(Fallacy.AD_HOMINEM.value.name)",
+                ],
+                cwd=directory,
+                capture_output=True,
+                text=True,
+            )
+
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.strip(), "Ad Hominem")
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,155 @@
+import asyncio
+import json
+import threading
+import unittest
+
+from openai import APIStatusError
+
+from llm_mediator_simulation.models.gpt_models import REQUEST_FAILED, AsyncGPTModel
+from llm_mediator_simulation.models.rate_limiter import TokenBucketRateLimiter
+from tests.fake_servers import FakeServer
+
+
+class FakeOpenAI:
+    """OpenAI-compatible chat completion endpoint that rate limits the first requests
+    and always fails on prompts containing "fail" (500) or "denied" (401)."""
+
+    def __init__(self, rate_limited_requests: int):
+        self.rate_limited_requests = rate_limited_requests
+        self.lock = threading.Lock()
+
+    def __call__(self, path, payload):
+        prompt = payload["messages"][0]["content"]
+
+        with self.lock:
+            if self.rate_limited_requests > 0:
+                self.rate_limited_requests -= 1
+                return 429, {"Retry-After": "0"}, json.dumps({"error": {}})
+
+        if "denied" in prompt:
+            return 401, {}, json.dumps({"error": {"message": "Invalid API key"}})
+
+        if "fail" in prompt:
+            return 500, {}, json.dumps({"error": {"message": "Server error"}})
+
+        completion = {
+            "id": "chatcmpl-0",
+            "object": "chat.completion",
+            "created": 0,
+            "model": payload["model"],
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": prompt.upper()},
+                    "finish_reason": "stop",
+                }
+            ],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+        }
+        return 200, {"Content-Type": "application/json"}, json.dumps(completion)
+
+
+class TestAsyncGPTModel(unittest.TestCase):
+    def test_retries_rate_limited_requests(self):
+        fake_openai = FakeOpenAI(rate_limited_requests=3)
+        with FakeServer(fake_openai) as server:
+            model = AsyncGPTModel(
+                api_key="test",
+                model_name="gpt-4o",
+                base_url=f"http://localhost:{server.port}/v1",
+                max_retries=3,
+                backoff_base=0.01,
+            )
+            results = asyncio.run(model.sample(["hello", "world"]))
+
+        # Rate-limited requests were retried
+        self.assertEqual(fake_openai.rate_limited_requests, 0)
+        self.assertEqual(results, ["HELLO", "WORLD"])
+
+    def test_gives_up_per_request(self):
+        with FakeServer(FakeOpenAI(rate_limited_requests=0)) as server:
+            model = AsyncGPTModel(
+                api_key="test",
+                model_name="gpt-4o",
+                base_url=f"http://localhost:{server.port}/v1",
+                max_retries=3,
+                backoff_base=0.01,
+            )
+            results = asyncio.run(model.sample(["hello", "please fail", "world"]))
+
+        # The failing request does not abort the others, and is told apart from an empty answer
+        self.assertEqual(results, ["HELLO", REQUEST_FAILED, "WORLD"])
+        # The failing request was retried until the retry limit
+        prompts = [payload["messages"][0]["content"] for payload in server.payloads]
+        self.assertEqual(prompts.count("please fail"), 4)
+
+    def test_raises_non_retryable_errors(self):
+        with FakeServer(FakeOpenAI(rate_limited_requests=0)) as server:
+            model = AsyncGPTModel(
+                api_key="test",
+                model_name="gpt-4o",
+                base_url=f"http://localhost:{server.port}/v1",
+                max_retries=3,
+                backoff_base=0.01,
+            )
+
+            async def sample_both() -> None:
+                with self.assertRaises(APIStatusError) as context:
+                    await model.sample(["access denied"])
+                self.assertEqual(context.exception.status_code, 401)
+                with self.assertRaises(APIStatusError):
+                    await model.sample_json(["access denied"], {"text": "the text."})
+
+            asyncio.run(sample_both())
+
+        # The requests were not retried
+        self.assertEqual(len(server.payloads), 2)
+
+    def test_structured_output(self):
+        with FakeServer(FakeOpenAI(rate_limited_requests=0)) as server:
+            model = AsyncGPTModel(
+                api_key="test",
+                model_name="gpt-4o",
+                base_url=f"http://localhost:{server.port}/v1",
+                max_retries=0,
+            )
+            # The fake endpoint answers with the upper-cased prompt
+            results = asyncio.run(
+                model.sample_json(
+                    ['{"text": "hello"}', "please fail"], {"text": "the text."}
+                )
+            )
+
+        # The request that failed after all retries is None, for the caller to retry it
+        self.assertEqual(results, [{"TEXT": "HELLO"}, None])
+        response_format = server.payloads[0]["response_format"]
+        self.assertEqual(response_format["type"], "json_schema")
+        self.assertEqual(
+            response_format["json_schema"]["schema"]["properties"],
+            {"text": {"type": "string"}},
+        )
+
+    def test_rate_limiter_is_shared(self):
+        parameters = dict(
+            api_key="test", model_name="gpt-4o", base_url="http://localhost:1/v1"
+        )
+        self.assertIs(
+            AsyncGPTModel(**parameters).rate_limiter,  # type: ignore
+            AsyncGPTModel(**parameters).rate_limiter,  # type: ignore
+        )
+
+
+class TestTokenBucketRateLimiter(unittest.TestCase):
+    def test_token_and_request_limits(self):
+        limiter = TokenBucketRateLimiter(requests_per_minute=2, tokens_per_minute=600)
+
+        self.assertEqual(limiter.try_acquire(500), 0)
+        # Not enough tokens left: 400 more tokens take 40 seconds to refill
+        self.assertAlmostEqual(limiter.try_acquire(500), 40, delta=0.1)
+        self.assertEqual(limiter.try_acquire(100), 0)
+        # No request left: one request takes 30 seconds to refill
+        self.assertAlmostEqual(limiter.try_acquire(0), 30, delta=0.1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,271 @@
+import asyncio
+import importlib.util
+import unittest
+from unittest import mock
+
+from llm_mediator_simulation.models.prefix_cache import PrefixKVCache
+from tests.stub_transformers import stub_hf_local_model
+from tests.tiny_checkpoints import make_tiny_checkpoint
+
+HAS_TORCH = all(
+    importlib.util.find_spec(name) is not None
+    for name in ["torch", "transformers", "peft", "accelerate"]
+)
+
+
+class TestGenerateWithStubs(unittest.TestCase):
+    """Generation bookkeeping, on stand-ins for torch and transformers."""
+
+    def test_generation_without_draft_model(self):
+        with stub_hf_local_model() as hf_local_model:
+            model = hf_local_model.HFLocalModel(model_name="stub", do_sample=False)
+
+            self.assertEqual(model.sample("Hi"), "Hi OK")
+            self.assertEqual(model.sample_many(["a", "bc"]), ["a OK", "bc OK"])
+
+        self.assertNotIn("assistant_model", model.model.generate_kwargs[0])
+        self.assertEqual(model.assisted_stats.calls, 0)
+        self.assertEqual(model.generated_tokens, 9)
+
+    def test_constrained_generation_is_not_assisted(self):
+        with stub_hf_local_model() as hf_local_model:
+            model = hf_local_model.HFLocalModel(
+                model_name="stub", draft_model_name="draft", do_sample=False
+            )
+            # The token vocabulary is only read once generation starts
+            model._vocabulary = object()
+
+            model._generate(
+                ["Hi"],
+                [None],
+                json_schema={"type": "object"},
+                max_new_tokens=4,
+                num_return_sequences=1,
+            )
+            model._generate(["Hi"], [None], max_new_tokens=4, num_return_sequences=1)
+
+        constrained, free = model.model.generate_kwargs
+        self.assertNotIn("assistant_model", constrained)
+        self.assertIs(free["assistant_model"], model.draft_model)
+        self.assertEqual(model.assisted_stats.calls, 1)
+
+
+@unittest.skipUnless(HAS_TORCH, "torch, transformers, peft and accelerate are required")
+class TestBatchedHFLocalModel(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        from llm_mediator_simulation.models.hf_local_model import (
+            BatchedHFLocalModel,
+            HFLocalModel,
+        )
+
+        path = make_tiny_checkpoint()
+        parameters = dict(model_name=path, max_new_tokens=12, do_sample=False)
+        cls.model = HFLocalModel(**parameters)
+        cls.batched_model = BatchedHFLocalModel(max_batch_tokens=64, **parameters)
+        cls.bounded_model = HFLocalModel(max_batch_tokens=64, **parameters)
+
+    def test_ragged_prompts_match_unbatched_generation(self):
+        prompts = ["Hi", "A much longer prompt than the first one", "Medium prompt"]
+
+        expected = [self.model.sample(prompt)[len(prompt) :] for prompt in prompts]
+        completions = asyncio.run(self.batched_model.sample(prompts))
+
+        # Only the new tokens are returned, in the order of the prompts
+        self.assertEqual(completions, expected)
+
+    def test_token_budget_batches(self):
+        prompts = ["a" * 30, "b" * 2, "c" * 20, "d" * 3]
+
+        batches = self.batched_model.token_budget_batches(prompts, max_new_tokens=12)
+
+        self.assertEqual(sorted(i for batch in batches for i in batch), [0, 1, 2, 3])
+        for batch in batches:
+            longest = max(len(prompts[i]) for i in batch)
+            self.assertTrue(
+                len(batch) == 1 or len(batch) * (longest + 12) <= 64,
+                f"Batch {batch} exceeds the token budget",
+            )
+
+    def test_sample_many_is_split_in_token_budget_batches(self):
+        prompts = ["Hi", "A much longer prompt than the first one", "Medium prompt"]
+
+        with mock.patch.object(
+            self.bounded_model,
+            "sample_batch",
+            wraps=self.bounded_model.sample_batch,
+        ) as sample_batch:
+            texts = self.bounded_model.sample_many(prompts)
+
+        # The longest prompt does not fit in the budget with another one
+        self.assertEqual(sample_batch.call_count, 2)
+        self.assertEqual(texts, [self.model.sample(prompt) for prompt in prompts])
+
+    def test_per_prompt_stop_strings(self):
+        prompts = ["Hello", "World"]
+        free = asyncio.run(self.batched_model.sample(prompts))
+        stops = [[free[0][2]], None]
+
+        completions = asyncio.run(
+            self.batched_model.sample(prompts, stop_strings=stops)
+        )
+
+        self.assertEqual(completions[0], free[0][: free[0].index(free[0][2]) + 1])
+        self.assertEqual(completions[1], free[1])
+
+    def test_stream_matches_sample(self):
+        prompt = "Stream this"
+
+        chunks = list(self.model.sample_stream(prompt))
+
+        self.assertEqual("".join(chunks), self.model.sample(prompt)[len(prompt) :])
+
+    def test_closing_the_stream_stops_generation(self):
+        generated_tokens = self.model.generated_tokens
+        # Streamed text is flushed on spaces: favor them, and never end on our own
+        space = self.model.tokenizer.convert_tokens_to_ids(" ")
+        stream = self.model.sample_stream(
+            "Stop early",
+            max_new_tokens=200,
+            sequence_bias={(space,): 10.0},
+            suppress_tokens=[self.model.tokenizer.eos_token_id],
+        )
+
+        next(stream)
+        stream.close()
+
+        self.assertLess(self.model.generated_tokens - generated_tokens, 10)
+
+
+class TestPrefixKVCache(unittest.TestCase):
+    def test_eviction_bounds_cached_tokens(self):
+        cache = PrefixKVCache(max_tokens=16, block_size=4)
+        for first in range(3):
+            # Stand-in for the attention states of the prefix
+            cache.store([first] * 8, past_key_values=f"states {first}")
+
+        self.assertEqual(cache.cached_tokens, 16)
+        self.assertEqual(len(cache), 2)
+        # The least recently used prefix was evicted
+        self.assertEqual(cache.lookup([0] * 8), (0, None))
+        self.assertEqual(cache.lookup([2] * 8 + [5]), (8, "states 2"))
+
+
+@unittest.skipUnless(HAS_TORCH, "torch, transformers, peft and accelerate are required")
+class TestPrefixCache(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        from llm_mediator_simulation.models.hf_local_model import HFLocalModel
+
+        path = make_tiny_checkpoint()
+        parameters = dict(model_name=path, max_new_tokens=12, do_sample=False)
+        cls.model = HFLocalModel(**parameters)
+        cls.cached_model = HFLocalModel(
+            prefix_cache_tokens=1024, prefix_block_size=8, **parameters
+        )
+
+    def test_cached_prefix_does_not_change_generation(self):
+        shared = "Few-shot examples and persona shared by every prompt. "
+        prompts = [shared + tail for tail in ["First turn", "Second turn", "Third"]]
+
+        for prompt in prompts:
+            self.assertEqual(
+                self.cached_model.sample(prompt), self.model.sample(prompt)
+            )
+
+        cache = self.cached_model.prefix_cache
+        assert cache is not None
+        self.assertEqual(cache.misses, 1)
+        self.assertEqual(cache.hits, 2)
+        self.assertGreaterEqual(cache.reused_tokens, 2 * (len(shared) // 8) * 8)
+
+
+@unittest.skipUnless(HAS_TORCH, "torch, transformers, peft and accelerate are required")
+class TestConstrainedJSON(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        from llm_mediator_simulation.models.hf_local_model import HFLocalModel
+
+        cls.model = HFLocalModel(
+            model_name=make_tiny_checkpoint(),
+            max_new_tokens=200,
+            temperature=2.0,
+            constrained_json=True,
+        )
+
+    def test_random_model_generates_valid_json(self):
+        from llm_mediator_simulation.utils.json import parse_llm_json
+
+        json_format = {
+            "do_write": "bool",
+            "probability": "a float probability",
+            "update": 'a string ("more", "less", or "same") to update this trait',
+            "text": "the text of your message.",
+        }
+
+        # Help the random model close its free text string within the token budget
+        quote = tuple(self.model.tokenizer.encode('"', add_special_tokens=False))
+
+        for seed in range(3):
+            response = self.model.sample(
+                "Answer in JSON.",
+                seed=seed,
+                json_format=json_format,
+                sequence_bias={quote: 3.0},
+            )
+            data = parse_llm_json(response)
+
+            self.assertEqual(list(data), list(json_format))
+            self.assertIsInstance(data["do_write"], bool)
+            self.assertIsInstance(data["probability"], float)
+            self.assertIn(data["update"], ["more", "less", "same"])
+            self.assertIsInstance(data["text"], str)
+
+
+@unittest.skipUnless(HAS_TORCH, "torch, transformers, peft and accelerate are required")
+class TestAssistedDecoding(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        from llm_mediator_simulation.models.hf_local_model import HFLocalModel
+
+        path = make_tiny_checkpoint(num_hidden_layers=2)
+        cls.model = HFLocalModel(model_name=path, max_new_tokens=24, do_sample=False)
+        cls.assisted_model = HFLocalModel(
+            model_name=path,
+            max_new_tokens=24,
+            do_sample=False,
+            draft_model_name=make_tiny_checkpoint(num_hidden_layers=1, seed=1),
+        )
+        # A draft identical to the main model proposes the exact greedy tokens
+        cls.self_assisted_model = HFLocalModel(
+            model_name=path, max_new_tokens=24, do_sample=False, draft_model_name=path
+        )
+
+    def test_greedy_output_matches_unassisted_generation(self):
+        for prompt in ["Hello", "A longer prompt for the draft", "Speculate"]:
+            expected = self.model.sample(prompt)
+            self.assertEqual(self.assisted_model.sample(prompt), expected)
+            self.assertEqual(self.self_assisted_model.sample(prompt), expected)
+
+        stats = self.assisted_model.assisted_stats
+        self.assertEqual(stats.calls, 3)
+        self.assertGreater(stats.drafted_tokens, 0)
+        self.assertLessEqual(stats.accepted_tokens, stats.drafted_tokens)
+        self.assertGreater(stats.tokens_per_second, 0)
+
+    def test_acceptance_rate_of_an_identical_draft(self):
+        before = self.self_assisted_model.assisted_stats.summary()
+
+        self.self_assisted_model.sample("All drafted tokens are accepted")
+
+        stats = self.self_assisted_model.assisted_stats
+        drafted = stats.drafted_tokens - before["drafted_tokens"]
+        accepted = stats.accepted_tokens - before["accepted_tokens"]
+        self.assertGreater(drafted, 0)
+        # Drafts past the last generated token are wasted, but all others are accepted
+        self.assertGreaterEqual(accepted, drafted - 1)
+        self.assertLess(stats.rounds, stats.generated_tokens)
+
+
+if __name__ == "__main__":
+    unittest.main()
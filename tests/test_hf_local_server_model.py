@@ -0,0 +1,86 @@
+import asyncio
+import json
+import unittest
+
+from llm_mediator_simulation.models.hf_local_server_model import (
+    AsyncHFLocalServerModel,
+    HFLocalServerModel,
+)
+from tests.fake_servers import FakeServer
+
+
+def echo(path, payload):
+    return 200, {}, f"{payload['text']} -> {payload.get('max_new_tokens')}"
+
+
+class TestHFLocalServerModel(unittest.TestCase):
+    def test_connection_is_reused(self):
+        with FakeServer(echo) as server:
+            model = HFLocalServerModel(port=server.port, max_new_tokens=10)
+            results = [model.sample(f"prompt {i}", seed=i) for i in range(3)]
+            model.close()
+
+        self.assertEqual(results, [f"prompt {i} -> 10" for i in range(3)])
+        self.assertEqual(len(server.client_ports), 1)
+        # Client settings are not forwarded as generation parameters
+        self.assertEqual(
+            server.payloads[0], {"text": "prompt 0", "seed": 0, "max_new_tokens": 10}
+        )
+
+    def test_sample_many_sends_one_batch_request(self):
+        def batch_echo(path, payload):
+            return 200, {}, json.dumps([f"{path} {text}" for text in payload["texts"]])
+
+        with FakeServer(batch_echo) as server:
+            model = HFLocalServerModel(port=server.port, max_new_tokens=10)
+            results = model.sample_many(["a", "b", "c"], seed=1)
+            model.close()
+
+        self.assertEqual(results, ["/call_batch a", "/call_batch b", "/call_batch c"])
+        self.assertEqual(
+            server.payloads,
+            [{"texts": ["a", "b", "c"], "seed": 1, "max_new_tokens": 10}],
+        )
+
+    def test_async_concurrency_is_bounded(self):
+        async def run(model):
+            results = await model.sample([f"prompt {i}" for i in range(6)], seed=1)
+            await model.aclose()
+            return results
+
+        with FakeServer(echo, delay=0.1) as server:
+            model = AsyncHFLocalServerModel(port=server.port, max_concurrency=2)
+            results = asyncio.run(run(model))
+
+        self.assertEqual(results, [f"prompt {i} -> None" for i in range(6)])
+        self.assertEqual(server.max_in_flight, 2)
+        self.assertLessEqual(len(server.client_ports), 2)
+
+    def test_each_event_loop_has_its_own_pool(self):
+        async def run(model):
+            results = await model.sample(["prompt"])
+            client, _ = model._pool()
+            await model.aclose()
+            return results, client
+
+        with FakeServer(echo) as server:
+            model = AsyncHFLocalServerModel(port=server.port)
+            first, first_client = asyncio.run(run(model))
+            second, second_client = asyncio.run(run(model))
+
+        self.assertEqual(first, second)
+        self.assertIsNot(first_client, second_client)
+        # Both pools were closed from their own loop
+        self.assertTrue(first_client.is_closed)
+        self.assertTrue(second_client.is_closed)
+        self.assertEqual(len(model._pools), 0)
+
+    def test_server_not_running(self):
+        model = AsyncHFLocalServerModel(port=1)
+        self.assertEqual(
+            asyncio.run(model.sample(["prompt"])), ["Local server not running."]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
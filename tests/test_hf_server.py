@@ -0,0 +1,53 @@
+import importlib.util
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from tests.test_coalescing_model import RecordingBatchModel
+
+HAS_FLASK = importlib.util.find_spec("flask") is not None
+
+
+@unittest.skipUnless(HAS_FLASK, "flask is required")
+class TestHFServer(unittest.TestCase):
+    def setUp(self):
+        from scripts.hf_server import create_app
+
+        self.model = RecordingBatchModel()
+        self.model.model_path = "recording"  # type: ignore
+        self.model.quantization = "no quantization"  # type: ignore
+        self.client = create_app(
+            self.model, max_batch_size=4, max_wait=0.5
+        ).test_client()
+
+    def test_existing_routes(self):
+        response = self.client.post("/call", json={"text": "Hello", "seed": 1})
+        self.assertEqual(response.text, "Hello -> None")
+        self.assertEqual(self.client.get("/model_name").text, "recording")
+        self.assertEqual(self.client.get("/model_quantization").text, "no quantization")
+
+    def test_concurrent_calls_are_batched(self):
+        def call(i):
+            return self.client.post(
+                "/call", json={"text": str(i), "seed": 1, "max_new_tokens": 5}
+            ).text
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(call, range(4)))
+
+        self.assertEqual(results, [f"{i} -> 5" for i in range(4)])
+        self.assertEqual(len(self.model.batches), 1)
+
+    def test_call_batch_and_stats(self):
+        response = self.client.post(
+            "/call_batch", json={"texts": ["a", "b", "c"], "max_new_tokens": 3}
+        )
+        self.assertEqual(response.json, ["a -> 3", "b -> 3", "c -> 3"])
+
+        stats = self.client.get("/stats").json
+        self.assertEqual(stats["queue_depth"], 0)
+        self.assertEqual(stats["requests"], 3)
+        self.assertEqual(stats["batch_sizes"], {"3": 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
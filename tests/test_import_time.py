@@ -0,0 +1,69 @@
+import subprocess
+import sys
+import unittest
+
+# Modules used to analyze and display debates, without running models
+LIGHT_MODULES = [
+    "llm_mediator_simulation.utils.analysis",
+    "llm_mediator_simulation.visualization.transcript",
+    "llm_mediator_simulation.simulation.debate.config",
+    "llm_mediator_simulation.simulation.debate.handler",
+    "llm_mediator_simulation.models.registry",
+]
+
+HEAVY_DEPENDENCIES = ["torch", "transformers", "openai", "perspective", "polars"]
+
+# Generous, to stay stable on slow machines: heavy dependencies alone take several seconds
+IMPORT_TIME_BUDGET_US = 2_000_000
+
+
+def import_times(modules: list[str]) -> dict[str, tuple[int, int]]:
+    """Self and cumulative import times (in microseconds) of every module imported
+    by a fresh interpreter importing the given modules."""
+
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {', '.join(modules)}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    times: dict[str, tuple[int, int]] = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_time, cumulative, name = line.removeprefix("import time:").split("|")
+        times[name.strip()] = (int(self_time), int(cumulative))
+    return times
+
+
+class TestImportTime(unittest.TestCase):
+    def test_light_modules_skip_heavy_dependencies(self):
+        times = import_times(LIGHT_MODULES)
+
+        for module in LIGHT_MODULES:
+            self.assertIn(module, times)
+
+        imported_roots = {name.split(".")[0] for name in times}
+        for dependency in HEAVY_DEPENDENCIES:
+            self.assertNotIn(dependency, imported_roots)
+
+        total = sum(self_time for self_time, _ in times.values())
+        self.assertLess(total, IMPORT_TIME_BUDGET_US)
+
+    def test_registry_resolves_backends_lazily(self):
+        from llm_mediator_simulation.models.dummy_model import DummyModel
+        from llm_mediator_simulation.models.registry import (
+            create_model,
+            get_model_class,
+        )
+
+        self.assertIs(get_model_class("dummy"), DummyModel)
+        self.assertIsInstance(create_model("dummy"), DummyModel)
+
+        with self.assertRaises(ValueError):
+            get_model_class("unknown")
+
+
+if __name__ == "__main__":
+    unittest.main()
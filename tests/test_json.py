@@ -0,0 +1,96 @@
+import unittest
+
+from llm_mediator_simulation.simulation.prompt import (
+    LLM_PROBA_RESPONSE_FORMAT,
+    declined_message,
+)
+from llm_mediator_simulation.utils.json import (
+    json_schema,
+    parse_llm_json_stream,
+    validate_json_schema,
+)
+from llm_mediator_simulation.utils.types import LLMMessage
+
+
+def chunked(text: str, consumed: list[str], size: int = 3):
+    for i in range(0, len(text), size):
+        consumed.append(text[i : i + size])
+        yield text[i : i + size]
+
+
+class TestParseLLMJSONStream(unittest.TestCase):
+    def test_stops_on_complete_object(self):
+        response = (
+            'Thinking {not json}... ```json\n{"do_write": true, "justification": '
+            '"A {brace} and a \\"quote\\"", "text": "Hello"}\n``` and more tokens'
+        )
+        consumed: list[str] = []
+
+        parsed, text = parse_llm_json_stream(chunked(response, consumed), LLMMessage)
+
+        self.assertEqual(
+            parsed,
+            {
+                "do_write": True,
+                "justification": 'A {brace} and a "quote"',
+                "text": "Hello",
+            },
+        )
+        self.assertNotIn("more tokens", text)
+        self.assertNotIn("more tokens", "".join(consumed))
+
+    def test_stops_early_when_declining(self):
+        response = '{"do_write": false, "justification": "No need", "text": "Long..."}'
+        consumed: list[str] = []
+
+        parsed, _ = parse_llm_json_stream(
+            chunked(response, consumed), LLMMessage, early_result=declined_message
+        )
+
+        self.assertEqual(
+            parsed, {"do_write": False, "justification": "No need", "text": ""}
+        )
+        self.assertNotIn("Long", "".join(consumed))
+
+    def test_invalid_stream(self):
+        with self.assertRaises(ValueError):
+            parse_llm_json_stream(iter(['{"do_write": "maybe"}']), LLMMessage)
+
+
+class TestJSONSchema(unittest.TestCase):
+    def test_schema_from_format(self):
+        schema = json_schema(
+            {
+                **LLM_PROBA_RESPONSE_FORMAT,
+                "update": 'a string ("more", "less", or "same") to update this trait',
+            }
+        )
+
+        self.assertEqual(
+            schema["properties"],
+            {
+                "do_intervene": {"type": "number"},
+                "justification": {"type": "string"},
+                "text": {"type": "string"},
+                "update": {"type": "string", "enum": ["more", "less", "same"]},
+            },
+        )
+        self.assertEqual(
+            schema["required"], ["do_intervene", "justification", "text", "update"]
+        )
+
+    def test_validation(self):
+        schema = json_schema({"do_write": "bool", "update": 'a string ("yes" or "no")'})
+
+        self.assertTrue(
+            validate_json_schema({"do_write": True, "update": "no"}, schema)
+        )
+        self.assertFalse(validate_json_schema({"do_write": 1, "update": "no"}, schema))
+        self.assertFalse(
+            validate_json_schema({"do_write": True, "update": "maybe"}, schema)
+        )
+        self.assertFalse(validate_json_schema({"do_write": True}, schema))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import threading
+import time
+import unittest
+from datetime import datetime
+from typing import Any
+
+from llm_mediator_simulation.metrics.criteria import ArgumentQuality
+from llm_mediator_simulation.metrics.metrics_handler import MetricsHandler
+from llm_mediator_simulation.models.language_model import LanguageModel
+from llm_mediator_simulation.models.routed_model import (
+    RoutedLanguageModel,
+    call_purpose,
+    current_purpose,
+)
+from llm_mediator_simulation.utils.types import Intervention
+
+
+class SlowModel(LanguageModel):
+    """Answer after a delay with the prompt and the call purpose, tracking concurrent calls."""
+
+    def __init__(self, delay: float = 0.1):
+        self.delay = delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def sample(self, prompt: str, seed: int | None = None, **kwargs: Any) -> str:
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(self.delay)
+        with self._lock:
+            self.in_flight -= 1
+        return f"{prompt} ({current_purpose()})"
+
+
+class ScoringModel(LanguageModel):
+    """Score every argument quality with the length of the judged text."""
+
+    def sample(self, prompt: str, seed: int | None = None, **kwargs: Any) -> str:
+        score = min(len(prompt.split("\n")[0]), 4)
+        return '{"CLARITY": %d, "CREDIBILITY": %d}' % (score, score)
+
+
+class TestSampleMany(unittest.TestCase):
+    def test_prompts_are_sampled_concurrently_in_order(self):
+        model = SlowModel()
+        model.max_parallel_calls = 4
+        prompts = [f"prompt {i}" for i in range(8)]
+
+        start = time.perf_counter()
+        with call_purpose("summary"):
+            results = model.sample_many(prompts)
+        elapsed = time.perf_counter() - start
+
+        # The call purpose follows the calls into the worker threads
+        self.assertEqual(results, [f"{prompt} (summary)" for prompt in prompts])
+        self.assertEqual(model.max_in_flight, 4)
+        self.assertLess(elapsed, 0.6)
+
+    def test_routed_sample_many(self):
+        small, large = SlowModel(delay=0), SlowModel(delay=0)
+        model = RoutedLanguageModel(default=large, routes={"summary": small})
+
+        with call_purpose("summary"):
+            self.assertEqual(
+                model.sample_many(["a", "b"]), ["a (summary)", "b (summary)"]
+            )
+        self.assertEqual(model.stats()["summary"]["calls"], 1)
+
+    def test_metrics_of_several_interventions(self):
+        handler = MetricsHandler(
+            model=ScoringModel(),
+            argument_qualities=[ArgumentQuality.CLARITY, ArgumentQuality.CREDIBILITY],
+        )
+        interventions = [
+            Intervention(
+                debater=None,
+                text=text,
+                prompt="",
+                justification="",
+                timestamp=datetime.now(),
+            )
+            for text in ["ab", "abcdef"]
+        ]
+
+        handler.inject_metrics_many(interventions)
+
+        qualities = [
+            intervention.metrics.argument_qualities  # type: ignore
+            for intervention in interventions
+        ]
+        self.assertEqual(
+            [quality[ArgumentQuality.CLARITY].value for quality in qualities], [2, 4]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+import asyncio
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from llm_mediator_simulation.models.model_pool import AsyncModelPool, ModelPool
+from tests.fake_servers import FakeServer
+
+
+class FlakyEcho:
+    """Echo the prompt, or fail with a server error while `failing` is set."""
+
+    def __init__(self):
+        self.failing = False
+
+    def __call__(self, path, payload):
+        if self.failing:
+            return 500, {}, "Internal Server Error"
+        return 200, {}, payload["text"]
+
+
+class TestModelPool(unittest.TestCase):
+    def test_requests_are_spread_and_capped(self):
+        with (
+            FakeServer(FlakyEcho(), delay=0.1) as first,
+            FakeServer(FlakyEcho(), delay=0.1) as second,
+        ):
+            pool = ModelPool(
+                urls=[
+                    f"http://localhost:{first.port}",
+                    f"http://localhost:{second.port}",
+                ],
+                max_concurrency_per_replica=2,
+            )
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                results = list(executor.map(pool.sample, [f"p{i}" for i in range(8)]))
+            pool.close()
+
+        self.assertEqual(results, [f"p{i}" for i in range(8)])
+        # Both replicas served requests, never more than 2 at once
+        self.assertEqual(len(first.payloads) + len(second.payloads), 8)
+        self.assertGreaterEqual(len(first.payloads), 2)
+        self.assertGreaterEqual(len(second.payloads), 2)
+        self.assertLessEqual(first.max_in_flight, 2)
+        self.assertLessEqual(second.max_in_flight, 2)
+
+    def test_unhealthy_replica_is_ejected_and_readmitted(self):
+        flaky = FlakyEcho()
+        flaky.failing = True
+
+        with FakeServer(flaky) as first, FakeServer(FlakyEcho()) as second:
+            pool = ModelPool(
+                urls=[
+                    f"http://localhost:{first.port}",
+                    f"http://localhost:{second.port}",
+                ],
+                # Health checks only run when forced in this test
+                health_check_interval=3600,
+            )
+
+            # The failed request is sent again to the other replica
+            self.assertEqual(
+                [pool.sample(f"p{i}") for i in range(3)], ["p0", "p1", "p2"]
+            )
+            self.assertEqual(len(first.payloads), 1)
+            self.assertFalse(pool.stats()[0]["healthy"])
+
+            # Not due for a health check yet
+            pool.check_health()
+            self.assertFalse(pool.stats()[0]["healthy"])
+
+            # Still failing the health check
+            first.healthy = False
+            pool.check_health(force=True)
+            self.assertFalse(pool.stats()[0]["healthy"])
+
+            flaky.failing = False
+            first.healthy = True
+            pool.check_health(force=True)
+            self.assertTrue(pool.stats()[0]["healthy"])
+            pool.close()
+
+
+class TestAsyncModelPool(unittest.TestCase):
+    def test_async_requests_are_spread_and_capped(self):
+        async def run(pool):
+            results = await pool.sample([f"p{i}" for i in range(6)], seed=1)
+            await pool.aclose()
+            return results
+
+        with (
+            FakeServer(FlakyEcho(), delay=0.1) as first,
+            FakeServer(FlakyEcho(), delay=0.1) as second,
+        ):
+            pool = AsyncModelPool(
+                urls=[
+                    f"http://localhost:{first.port}",
+                    f"http://localhost:{second.port}",
+                ],
+                max_concurrency_per_replica=1,
+            )
+            results = asyncio.run(run(pool))
+
+        self.assertEqual(results, [f"p{i}" for i in range(6)])
+        self.assertGreaterEqual(len(first.payloads), 1)
+        self.assertGreaterEqual(len(second.payloads), 1)
+        self.assertEqual(first.max_in_flight, 1)
+        self.assertEqual(second.max_in_flight, 1)
+
+    def test_no_replica_running(self):
+        pool = AsyncModelPool(urls=["http://localhost:1", "http://localhost:2"])
+        self.assertEqual(
+            asyncio.run(pool.sample(["prompt"])), ["Local server not running."]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+import asyncio
+import json
+import unittest
+
+from llm_mediator_simulation.models.ollama_local_server_model import (
+    AsyncOllamaLocalModel,
+)
+from tests.fake_servers import FakeServer
+
+
+def fake_ollama(path, payload):
+    """Ollama generate endpoint answering with the upper-cased prompt."""
+
+    response = {
+        "model": payload["model"],
+        "created_at": "2025-01-01T00:00:00Z",
+        "response": payload["prompt"].upper(),
+        "done": True,
+    }
+    return 200, {"Content-Type": "application/json"}, json.dumps(response)
+
+
+class TestAsyncOllamaLocalModel(unittest.TestCase):
+    def test_options_and_bounded_concurrency(self):
+        with FakeServer(fake_ollama, delay=0.05) as server:
+            model = AsyncOllamaLocalModel(
+                model_name="mistral-nemo",
+                host=f"http://localhost:{server.port}",
+                max_concurrency=2,
+                num_predict=50,
+                stop=["\n\n"],
+            )
+            results = asyncio.run(model.sample([f"p{i}" for i in range(6)], seed=3))
+
+        self.assertEqual(results, [f"P{i}" for i in range(6)])
+        self.assertEqual(server.max_in_flight, 2)
+
+        # The model was loaded with an empty prompt at initialization
+        warm_up, *calls = server.payloads
+        self.assertEqual(warm_up["prompt"], "")
+        self.assertEqual(warm_up["keep_alive"], "30m")
+
+        self.assertEqual(
+            calls[0]["options"], {"seed": 3, "num_predict": 50, "stop": ["\n\n"]}
+        )
+        self.assertEqual(calls[0]["keep_alive"], "30m")
+        self.assertEqual(model.stats()["calls"], 6)
+
+    def test_warm_up_without_server(self):
+        model = AsyncOllamaLocalModel(host="http://localhost:1")
+        self.assertEqual(model.stats(), {"calls": 0, "errors": 0})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,37 @@
+import pickle
+import sys
+import types
+import unittest
+from unittest import mock
+
+
+class FakePerspectiveAPI:
+    """Perspective API client that scores every text as non-toxic."""
+
+    def __init__(self, api_key: str):
+        self.api_key = api_key
+
+    def score(self, text: str) -> dict[str, float]:
+        return {"TOXICITY": 0.0}
+
+
+class TestPerspectiveScorer(unittest.TestCase):
+    def test_scorer_can_be_sent_to_worker_processes(self):
+        perspective = types.ModuleType("perspective")
+        perspective.PerspectiveAPI = FakePerspectiveAPI  # type: ignore
+        with mock.patch.dict(sys.modules, {"perspective": perspective}):
+            sys.modules.pop("llm_mediator_simulation.metrics.perspective_api", None)
+            from llm_mediator_simulation.metrics.perspective_api import (
+                PerspectiveScorer,
+            )
+
+            scorer = PerspectiveScorer(api_key="test", rate_limit=None)
+            copy = pickle.loads(pickle.dumps(scorer))
+
+        self.assertEqual(copy.client.api_key, "test")
+        self.assertEqual(copy.score("Hello"), 0.0)
+        self.assertIsNot(copy._lock, scorer._lock)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import asyncio
+import unittest
+from typing import Any
+
+from llm_mediator_simulation.models.language_model import (
+    AsyncLanguageModel,
+    LanguageModel,
+)
+from llm_mediator_simulation.models.routed_model import (
+    AsyncRoutedLanguageModel,
+    RoutedLanguageModel,
+    call_purpose,
+)
+from llm_mediator_simulation.utils.model_utils import (
+    summarize_conversation,
+    summarize_conversation_with_last_messages_async,
+)
+
+
+class NamedModel(LanguageModel):
+    """Answer with its own name."""
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def sample(self, prompt: str, seed: int | None = None, **kwargs: Any) -> str:
+        return self.name
+
+
+class AsyncNamedModel(AsyncLanguageModel):
+    """Answer with its own name, after yielding to the other tasks."""
+
+    def __init__(self, name: str):
+        self.name = name
+
+    async def sample(
+        self, prompts: list[str], seed: int | None = None, **kwargs: Any
+    ) -> list[str]:
+        await asyncio.sleep(0.01)
+        return [self.name] * len(prompts)
+
+
+class TestRoutedModel(unittest.TestCase):
+    def test_calls_follow_their_purpose(self):
+        model = RoutedLanguageModel(
+            default=NamedModel("large"), routes={"summary": NamedModel("small")}
+        )
+
+        self.assertEqual(summarize_conversation(model, ["Hello", "Hi"]), "small")
+        with call_purpose("mediator"):
+            self.assertEqual(model.sample("Intervene?"), "large")
+        self.assertEqual(model.sample("Untagged"), "large")
+
+        stats = model.stats()
+        self.assertEqual(set(stats), {"summary", "mediator", "untagged"})
+        self.assertEqual(stats["summary"]["calls"], 1)
+        self.assertGreaterEqual(stats["summary"]["max"], 0)
+
+    def test_concurrent_tasks_keep_their_purpose(self):
+        model = AsyncRoutedLanguageModel(
+            default=AsyncNamedModel("large"),
+            routes={"summary": AsyncNamedModel("small")},
+        )
+
+        async def mediator() -> list[str]:
+            with call_purpose("mediator"):
+                return await model.sample(["Intervene?"])
+
+        async def run() -> list[Any]:
+            return await asyncio.gather(
+                summarize_conversation_with_last_messages_async(
+                    model, ["Summary"], [["Hello"]]
+                ),
+                mediator(),
+            )
+
+        summaries, decisions = asyncio.run(run())
+
+        self.assertEqual(summaries, ["small"])
+        self.assertEqual(decisions, ["large"])
+        self.assertEqual(model.stats()["mediator"]["calls"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+
+from llm_mediator_simulation.models.dummy_model import DummyModel
+from llm_mediator_simulation.utils.token_budget import PromptSection, TokenBudget
+
+
+def build(examples: list[str], messages: list[str], persona: list[str]) -> str:
+    return " ".join(["Instructions:", *examples, *persona, *messages])
+
+
+def sections() -> list[PromptSection]:
+    return [
+        PromptSection("examples", ["e1", "e2", "e3"]),
+        PromptSection("messages", ["m1", "m2", "m3"]),
+        PromptSection("persona", ["p1", "p2"], trim_from="end"),
+    ]
+
+
+class TestTokenBudget(unittest.TestCase):
+    def test_trims_in_priority_order(self):
+        # One token per word
+        budget = TokenBudget(
+            max_prompt_tokens=5, count_tokens=lambda text: len(text.split())
+        )
+
+        prompt = budget.fit(build, sections())
+
+        self.assertEqual(prompt, "Instructions: p1 p2 m2 m3")
+        assert budget.last_report is not None
+        self.assertEqual(budget.last_report.trimmed, {"examples": 3, "messages": 1})
+        self.assertEqual(budget.last_report.trimmed_tokens, 4)
+        self.assertTrue(budget.last_report.fits)
+
+        # Persona details are trimmed last, from the end
+        budget.max_prompt_tokens = 2
+        self.assertEqual(budget.fit(build, sections()), "Instructions: p1")
+        self.assertEqual(budget.trimmed_calls, 2)
+
+    def test_prompt_within_budget_is_untouched(self):
+        budget = TokenBudget(
+            max_prompt_tokens=100, count_tokens=lambda text: len(text.split())
+        )
+
+        prompt = budget.fit(build, sections())
+
+        self.assertEqual(prompt, "Instructions: e1 e2 e3 p1 p2 m1 m2 m3")
+        assert budget.last_report is not None
+        self.assertEqual(budget.last_report.trimmed, {})
+
+    def test_budget_per_model(self):
+        model = DummyModel()
+        # Models without a context limit are not trimmed
+        self.assertIsNone(TokenBudget.for_model(model).max_prompt_tokens)
+        self.assertIs(TokenBudget.for_model(model), TokenBudget.for_model(model))
+
+
+if __name__ == "__main__":
+    unittest.main()
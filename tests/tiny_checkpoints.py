@@ -0,0 +1,53 @@
+"""Tiny randomly initialized HuggingFace checkpoints for CPU tests, built offline."""
+
+import string
+import tempfile
+
+
+def make_tiny_checkpoint(num_hidden_layers: int = 2, seed: int = 0) -> str:
+    """Save a tiny Llama checkpoint with a character-level tokenizer into a temporary directory.
+
+    Returns:
+        The path to the checkpoint directory.
+    """
+    import torch
+    from tokenizers import Tokenizer, decoders, models, pre_tokenizers
+    from transformers import LlamaConfig, LlamaForCausalLM, PreTrainedTokenizerFast
+
+    path = tempfile.mkdtemp(prefix="tiny_checkpoint_")
+
+    vocab = {"<pad>": 0, "<s>": 1, "</s>": 2, "<unk>": 3}
+    for char in string.printable:
+        vocab.setdefault(char, len(vocab))
+
+    tokenizer = Tokenizer(
+        models.WordPiece(vocab, unk_token="<unk>", max_input_chars_per_word=10_000)
+    )
+    tokenizer.pre_tokenizer = pre_tokenizers.Split("", "isolated")  # type: ignore
+    tokenizer.decoder = decoders.Fuse()  # type: ignore
+
+    PreTrainedTokenizerFast(
+        tokenizer_object=tokenizer,
+        bos_token="<s>",
+        eos_token="</s>",
+        unk_token="<unk>",
+        pad_token="<pad>",
+        model_max_length=2048,
+    ).save_pretrained(path)
+
+    torch.manual_seed(seed)
+    config = LlamaConfig(
+        vocab_size=len(vocab),
+        hidden_size=32,
+        intermediate_size=64,
+        num_hidden_layers=num_hidden_layers,
+        num_attention_heads=4,
+        num_key_value_heads=4,
+        max_position_embeddings=2048,
+        bos_token_id=1,
+        eos_token_id=2,
+        pad_token_id=0,
+    )
+    LlamaForCausalLM(config).save_pretrained(path)
+
+    return path